@@ -1,15 +1,29 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional
-from fastapi import Depends, HTTPException, status
+from typing import Dict, Optional, Tuple
+from fastapi import Depends, Header, HTTPException, Request, status
+from fastapi.requests import HTTPConnection
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
-from .config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRE_DAYS
+from .config import (
+    JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRE_DAYS, TOKEN_CACHE_ENABLED, TOKEN_CACHE_MAX_SIZE, TOKEN_CACHE_TTL_S,
+    BCRYPT_ROUNDS, PASSWORD_WORKERS, PASSWORD_MAX_PENDING, ADMIN_TOKEN,
+)
 from .models import AuthUser
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a few threads keep hashing off the event loop
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_pending = 0
 
 # Security scheme
 security = HTTPBearer()
@@ -25,28 +39,172 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordPoolBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+
+async def _run_password_work(func, *args):
+    global _password_executor, _password_pending
+    if PASSWORD_WORKERS <= 0:
+        return func(*args)
+    if _password_pending >= PASSWORD_MAX_PENDING:
+        raise PasswordPoolBusy()
+    if _password_executor is None:
+        _password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+    
+    _password_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password in the password executor; raises PasswordPoolBusy when saturated."""
+    return await _run_password_work(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password in the password executor; raises PasswordPoolBusy when saturated."""
+    return await _run_password_work(verify_password, plain_password, hashed_password)
+
+
+def password_pool_stats() -> dict:
+    return {
+        "workers": PASSWORD_WORKERS,
+        "pending": _password_pending,
+        "maxPending": PASSWORD_MAX_PENDING,
+        "rounds": BCRYPT_ROUNDS,
+    }
+
+
+def close_password_executor():
+    """Shut down the password executor (app shutdown)."""
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=False, cancel_futures=True)
+        _password_executor = None
+
+
 def create_access_token(user_id: int, email: str) -> str:
     """Create a JWT access token."""
-    expire = datetime.now(timezone.utc) + timedelta(days=JWT_EXPIRE_DAYS)
+    now = datetime.now(timezone.utc)
     to_encode = {
         "sub": str(user_id),
         "email": email,
-        "exp": expire,
+        "iat": now,
+        "exp": now + timedelta(days=JWT_EXPIRE_DAYS),
     }
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
+class TokenCache:
+    """Bounded LRU of verified tokens, keyed by their SHA-256 digest.
+
+    An entry lives until the token's own `exp` or `ttl` seconds, whichever
+    comes first, so a cached token is never accepted after it expires.
+    Only valid tokens are cached. It also remembers when each user's tokens
+    were last invalidated, so decode_token refuses tokens issued before that.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_MAX_SIZE, ttl: float = TOKEN_CACHE_TTL_S):
+        self.max_size = max_size
+        self.ttl = ttl
+        # digest -> (user, expires_at as a unix timestamp)
+        self._entries: "OrderedDict[bytes, Tuple[AuthUser, float]]" = OrderedDict()
+        # user id -> unix time of the last invalidate_user
+        self._revoked: Dict[int, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[AuthUser]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, token: str, user: AuthUser, exp: Optional[float]):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        key = self._key(token)
+        self._entries[key] = (user, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        """Forget one token (e.g. on logout)."""
+        self._entries.pop(self._key(token), None)
+
+    def invalidate_user(self, user_id: int):
+        """Forget every cached token of a user and refuse the ones issued so far
+        (e.g. after a password change)."""
+        for key in [k for k, (user, _) in self._entries.items() if user.id == user_id]:
+            del self._entries[key]
+        now = time.time()
+        # Tokens issued before an older revocation have expired by now
+        oldest = now - JWT_EXPIRE_DAYS * 86400
+        for uid in [u for u, revoked_at in self._revoked.items() if revoked_at < oldest]:
+            del self._revoked[uid]
+        self._revoked[user_id] = now
+
+    def revoked(self, user_id: int, issued_at: Optional[float]) -> bool:
+        """Whether a token of the user issued at `issued_at` predates invalidate_user."""
+        revoked_at = self._revoked.get(user_id)
+        # iat has one second resolution, so tokens from the revocation's own second go too
+        return revoked_at is not None and (issued_at or 0) <= revoked_at
+
+    def clear(self):
+        self._entries.clear()
+        self._revoked.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global verified-token cache (None when TOKEN_CACHE_ENABLED is false)
+token_cache: Optional[TokenCache] = TokenCache() if TOKEN_CACHE_ENABLED else None
+
+
 def decode_token(token: str) -> Optional[AuthUser]:
     """Decode and verify a JWT token."""
+    if token_cache is not None:
+        user = token_cache.get(token)
+        if user is not None:
+            return user
+    
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get("sub")
         email = payload.get("email")
         if user_id is None or email is None:
             return None
-        return AuthUser(id=int(user_id), email=email)
-    except JWTError:
+        user = AuthUser(id=int(user_id), email=email)
+    except (JWTError, ValueError):
         return None
+    
+    if token_cache is not None:
+        if token_cache.revoked(user.id, payload.get("iat")):
+            return None
+        token_cache.put(token, user, payload.get("exp"))
+    return user
 
 
 async def get_current_user(
@@ -64,3 +222,35 @@ async def get_current_user(
         raise credentials_exception
     
     return user
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency guarding the /admin endpoints with the ADMIN_TOKEN secret.
+
+    They don't exist (404) unless ADMIN_TOKEN is set.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "not_found"})
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail={"error": "forbidden"})
+
+
+def token_from_connection(connection: HTTPConnection) -> Optional[str]:
+    """Bearer token from the Authorization header, or ?token= for clients that
+    can't set headers (browser EventSource and WebSocket)."""
+    header = connection.headers.get("authorization", "")
+    if header.lower().startswith("bearer "):
+        return header[7:]
+    return connection.query_params.get("token")
+
+
+async def get_stream_user(request: Request) -> AuthUser:
+    """Like get_current_user, but also accepts the token as a query parameter."""
+    user = decode_token(token_from_connection(request) or "")
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail={"error": "invalid_token"},
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
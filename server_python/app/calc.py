@@ -1,8 +1,18 @@
 import math
-from typing import Optional
+from typing import List, Optional, Sequence
 import aiosqlite
+from .metrics import timed
 from .models import FuelStats
 
+# NumPy powers the batch distance kernels; fall back to the scalar loop without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+EARTH_RADIUS_KM = 6371
+
 
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate the Haversine distance between two points in kilometers."""
@@ -22,6 +32,57 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return R * c
 
 
+def bearing_deg(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Initial bearing from the first point to the second, in degrees [0, 360)."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_lon = math.radians(lon2 - lon1)
+    
+    y = math.sin(d_lon) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(d_lon)
+    return (math.degrees(math.atan2(y, x)) + 360) % 360
+
+
+def segment_distances_km(lats: Sequence[float], lngs: Sequence[float]) -> List[float]:
+    """Haversine distance of every consecutive pair of points, in kilometers.
+
+    Returns one value per segment (len(lats) - 1 values).
+    """
+    if len(lats) < 2:
+        return []
+    if not NUMPY_AVAILABLE:
+        return [
+            haversine_km(lats[i], lngs[i], lats[i + 1], lngs[i + 1])
+            for i in range(len(lats) - 1)
+        ]
+    
+    lat = np.asarray(lats, dtype=np.float64)
+    lng = np.asarray(lngs, dtype=np.float64)
+    d_lat = np.radians(np.diff(lat))
+    d_lng = np.radians(np.diff(lng))
+    lat_rad = np.radians(lat)
+    
+    a = (np.sin(d_lat / 2) ** 2 +
+         np.cos(lat_rad[:-1]) * np.cos(lat_rad[1:]) *
+         np.sin(d_lng / 2) ** 2)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return (EARTH_RADIUS_KM * c).tolist()
+
+
+def cumulative_distances_km(lats: Sequence[float], lngs: Sequence[float]) -> List[float]:
+    """Distance travelled up to each point, starting at 0 for the first one."""
+    if not lats:
+        return []
+    segments = segment_distances_km(lats, lngs)
+    if NUMPY_AVAILABLE:
+        return np.concatenate(([0.0], np.cumsum(segments))).tolist()
+    
+    cumulative = [0.0]
+    for d in segments:
+        cumulative.append(cumulative[-1] + d)
+    return cumulative
+
+
 def safe_divide(a: float, b: float) -> Optional[float]:
     """Safely divide two numbers, returning None if division is not possible."""
     if not math.isfinite(a) or not math.isfinite(b) or b == 0:
@@ -29,30 +90,79 @@ def safe_divide(a: float, b: float) -> Optional[float]:
     return a / b
 
 
+@timed("get_current_fuel")
 async def get_current_fuel(db: aiosqlite.Connection, user_id: int) -> Optional[float]:
     """Get the most recent fuel snapshot for a user."""
     async with db.execute(
-        "SELECT fuel_liters FROM fuel_snapshots WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1",
+        "SELECT fuel_liters FROM fuel_snapshots WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1",
         (user_id,)
     ) as cursor:
         row = await cursor.fetchone()
         return float(row["fuel_liters"]) if row else None
 
 
+# Number of most recent finished trips the consumption stats are based on
+STATS_WINDOW = 20
+
+# Finished trips that carry enough data to count as a consumption sample
+_SAMPLE_TRIPS_WHERE = """user_id = ? AND ended_at IS NOT NULL
+             AND initial_fuel_liters IS NOT NULL
+             AND final_fuel_liters IS NOT NULL
+             AND total_distance_km > 0"""
+
+# Per-trip contribution to the running sums; trips that did not consume fuel
+# still count as samples but add nothing. Duration falls back to dist / 500.
+_CONTRIBUTION_COLUMNS = """
+    CASE WHEN initial_fuel_liters - final_fuel_liters > 0 THEN total_distance_km ELSE 0 END AS distance_km,
+    MAX(initial_fuel_liters - final_fuel_liters, 0) AS fuel_consumed_liters,
+    CASE WHEN initial_fuel_liters - final_fuel_liters > 0
+         THEN MAX(julianday(ended_at) - julianday(started_at), total_distance_km / 500.0)
+         ELSE 0 END AS duration_days"""
+
+
+def stats_from_totals(
+    current_fuel_liters: Optional[float],
+    total_distance: float,
+    total_fuel_consumed: float,
+    total_days: float,
+    samples: int,
+) -> FuelStats:
+    """Build FuelStats from the summed distance, fuel and duration of the sample trips."""
+    liters_per_km = safe_divide(total_fuel_consumed, total_distance)
+    avg_liters_per_100km = liters_per_km * 100 if liters_per_km is not None else None
+    avg_km_per_day = safe_divide(total_distance, total_days)
+    
+    projected_range_km = None
+    if liters_per_km is not None and current_fuel_liters is not None:
+        projected_range_km = current_fuel_liters / liters_per_km
+    
+    avg_fuel_per_day = safe_divide(total_fuel_consumed, total_days)
+    projected_days_left = None
+    if avg_fuel_per_day is not None and current_fuel_liters is not None:
+        projected_days_left = current_fuel_liters / avg_fuel_per_day
+    
+    return FuelStats(
+        currentFuelLiters=current_fuel_liters,
+        avgLitersPer100Km=avg_liters_per_100km,
+        avgKmPerDay=avg_km_per_day,
+        projectedRangeKm=projected_range_km,
+        projectedDaysLeft=projected_days_left,
+        samples=samples,
+    )
+
+
+@timed("compute_consumption_stats")
 async def compute_consumption_stats(db: aiosqlite.Connection, user_id: int) -> FuelStats:
-    """Compute fuel consumption statistics for a user."""
+    """Compute fuel consumption statistics for a user by scanning their recent trips."""
     current_fuel_liters = await get_current_fuel(db, user_id)
     
     # Pull last 20 finished trips with fuel data
     async with db.execute(
-        """SELECT id, initial_fuel_liters, final_fuel_liters, total_distance_km, started_at, ended_at
+        f"""SELECT id, initial_fuel_liters, final_fuel_liters, total_distance_km, started_at, ended_at
            FROM trips
-           WHERE user_id = ? AND ended_at IS NOT NULL 
-             AND initial_fuel_liters IS NOT NULL 
-             AND final_fuel_liters IS NOT NULL 
-             AND total_distance_km > 0
-           ORDER BY ended_at DESC LIMIT 20""",
-        (user_id,)
+           WHERE {_SAMPLE_TRIPS_WHERE}
+           ORDER BY ended_at DESC, id DESC LIMIT ?""",
+        (user_id, STATS_WINDOW)
     ) as cursor:
         trips = await cursor.fetchall()
     
@@ -79,34 +189,125 @@ async def compute_consumption_stats(db: aiosqlite.Connection, user_id: int) -> F
         dur_days = (end - start).total_seconds() / (60 * 60 * 24)
         total_days += max(dur_days, dist / 500)  # fallback minimal duration
     
-    samples = len(trips)
-    liters_per_km = safe_divide(total_fuel_consumed, total_distance)
-    avg_liters_per_100km = liters_per_km * 100 if liters_per_km is not None else None
-    avg_km_per_day = safe_divide(total_distance, total_days)
+    return stats_from_totals(
+        current_fuel_liters, total_distance, total_fuel_consumed, total_days, len(trips)
+    )
+
+
+@timed("get_consumption_stats")
+async def get_consumption_stats(db: aiosqlite.Connection, user_id: int) -> FuelStats:
+    """Get fuel consumption statistics from the materialized user_fuel_stats row."""
+    async with db.execute(
+        "SELECT * FROM user_fuel_stats WHERE user_id = ?",
+        (user_id,)
+    ) as cursor:
+        row = await cursor.fetchone()
     
-    projected_range_km = None
-    if liters_per_km is not None and current_fuel_liters is not None:
-        projected_range_km = current_fuel_liters / liters_per_km
+    if row is None:
+        row = await rebuild_fuel_stats(db, user_id)
+        await db.commit()
     
-    avg_fuel_per_day = safe_divide(total_fuel_consumed, total_days)
-    projected_days_left = None
-    if avg_fuel_per_day is not None and current_fuel_liters is not None:
-        projected_days_left = current_fuel_liters / avg_fuel_per_day
+    return stats_from_totals(
+        row["current_fuel_liters"],
+        row["distance_km"],
+        row["fuel_consumed_liters"],
+        row["duration_days"],
+        row["window_trips"],
+    )
+
+
+@timed("rebuild_fuel_stats")
+async def rebuild_fuel_stats(db: aiosqlite.Connection, user_id: int):
+    """Recompute a user's user_fuel_stats row from their trip history (does not commit)."""
+    async with db.execute(
+        f"""INSERT INTO user_fuel_stats
+               (user_id, window_trips, distance_km, fuel_consumed_liters, duration_days, current_fuel_liters)
+           SELECT ?, COUNT(*), COALESCE(SUM(distance_km), 0), COALESCE(SUM(fuel_consumed_liters), 0),
+                  COALESCE(SUM(duration_days), 0),
+                  (SELECT fuel_liters FROM fuel_snapshots WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1)
+           FROM (
+               SELECT {_CONTRIBUTION_COLUMNS}
+               FROM trips
+               WHERE {_SAMPLE_TRIPS_WHERE}
+               ORDER BY ended_at DESC, id DESC LIMIT ?
+           ) WHERE true
+           ON CONFLICT(user_id) DO UPDATE SET
+               window_trips = excluded.window_trips,
+               distance_km = excluded.distance_km,
+               fuel_consumed_liters = excluded.fuel_consumed_liters,
+               duration_days = excluded.duration_days,
+               current_fuel_liters = excluded.current_fuel_liters,
+               updated_at = CURRENT_TIMESTAMP
+           RETURNING *""",
+        (user_id, user_id, user_id, STATS_WINDOW)
+    ) as cursor:
+        return await cursor.fetchone()
+
+
+@timed("apply_finished_trip")
+async def apply_finished_trip(db: aiosqlite.Connection, user_id: int, trip_id: int):
+    """Slide a just-stopped trip into the user's stats window (does not commit)."""
+    async with db.execute(
+        f"SELECT {_CONTRIBUTION_COLUMNS} FROM trips WHERE id = ? AND {_SAMPLE_TRIPS_WHERE}",
+        (trip_id, user_id)
+    ) as cursor:
+        added = await cursor.fetchone()
+    if added is None:
+        return  # not a consumption sample
     
-    return FuelStats(
-        currentFuelLiters=current_fuel_liters,
-        avgLitersPer100Km=avg_liters_per_100km,
-        avgKmPerDay=avg_km_per_day,
-        projectedRangeKm=projected_range_km,
-        projectedDaysLeft=projected_days_left,
-        samples=samples,
+    async with db.execute(
+        """UPDATE user_fuel_stats SET
+               window_trips = window_trips + 1,
+               distance_km = distance_km + ?,
+               fuel_consumed_liters = fuel_consumed_liters + ?,
+               duration_days = duration_days + ?,
+               updated_at = CURRENT_TIMESTAMP
+           WHERE user_id = ?
+           RETURNING window_trips""",
+        (added["distance_km"], added["fuel_consumed_liters"], added["duration_days"], user_id)
+    ) as cursor:
+        row = await cursor.fetchone()
+    if row is None:
+        # No materialized row yet: build it from history, which already includes this trip
+        await rebuild_fuel_stats(db, user_id)
+        return
+    if row["window_trips"] <= STATS_WINDOW:
+        return
+    
+    # The window is full: subtract the trip that just slid out of it
+    async with db.execute(
+        f"""SELECT {_CONTRIBUTION_COLUMNS}
+           FROM trips
+           WHERE {_SAMPLE_TRIPS_WHERE}
+           ORDER BY ended_at DESC, id DESC LIMIT 1 OFFSET ?""",
+        (user_id, STATS_WINDOW)
+    ) as cursor:
+        evicted = await cursor.fetchone()
+    if evicted is None:
+        await rebuild_fuel_stats(db, user_id)
+        return
+    await db.execute(
+        """UPDATE user_fuel_stats SET
+               window_trips = ?,
+               distance_km = distance_km - ?,
+               fuel_consumed_liters = fuel_consumed_liters - ?,
+               duration_days = duration_days - ?
+           WHERE user_id = ?""",
+        (STATS_WINDOW, evicted["distance_km"], evicted["fuel_consumed_liters"], evicted["duration_days"], user_id)
     )
 
 
+@timed("record_fuel_snapshot")
 async def record_fuel_snapshot(db: aiosqlite.Connection, user_id: int, fuel_liters: float):
     """Record a new fuel snapshot for a user."""
     await db.execute(
         "INSERT INTO fuel_snapshots (user_id, fuel_liters) VALUES (?, ?)",
         (user_id, fuel_liters)
     )
+    cursor = await db.execute(
+        "UPDATE user_fuel_stats SET current_fuel_liters = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?",
+        (fuel_liters, user_id)
+    )
+    if cursor.rowcount == 0:
+        await rebuild_fuel_stats(db, user_id)
     await db.commit()
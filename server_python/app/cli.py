@@ -0,0 +1,251 @@
+"""
+Maintenance commands for the Gas Tracker database.
+
+Usage (from server_python):
+    python -m app.cli rebuild-stats [--user USER_ID]
+    python -m app.cli recompute-distances [--trip TRIP_ID] [--dry-run]
+    python -m app.cli compact-trips [--trip TRIP_ID] [--vacuum]
+    python -m app.cli simplify-trips [--trip TRIP_ID] [--workers N]
+    python -m app.cli reindex-points [--trip TRIP_ID]
+    python -m app.cli build-heatmap [--rebuild]
+    python -m app.cli seed [--users N] [--trips-per-user N] [--points-per-trip N] [--snapshots-per-user N] [--seed N]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from .calc import rebuild_fuel_stats
+from .database import connect, init_database, get_db_path, set_db_path
+from .heatmap import add_trip_to_heatmap
+from .seed import SEED_PASSWORD, seed_database
+from .simplify import simplify_levels, store_trip_levels
+from .spatial import rebuild_spatial_index
+from .tracks import compact_trip
+from .trips import recompute_trip_distance, recompute_all_trip_distances, load_trip_coordinates
+
+
+async def rebuild_stats(user_id: Optional[int] = None):
+    """Recompute the materialized fuel stats of one user or every user."""
+    db = await connect()
+    try:
+        if user_id is not None:
+            user_ids = [user_id]
+        else:
+            async with db.execute("SELECT id FROM users ORDER BY id") as cursor:
+                user_ids = [row["id"] for row in await cursor.fetchall()]
+        
+        for uid in user_ids:
+            await rebuild_fuel_stats(db, uid)
+        await db.commit()
+    finally:
+        await db.close()
+    
+    print(f"Rebuilt fuel stats for {len(user_ids)} user(s)")
+
+
+async def recompute_distances(trip_id: Optional[int] = None, dry_run: bool = False):
+    """Reconcile stored trip totals against their points."""
+    db = await connect()
+    try:
+        if trip_id is not None:
+            result = await recompute_trip_distance(db, trip_id, dry_run=dry_run)
+            await db.commit()
+            if result is None:
+                print(f"Trip {trip_id} not found")
+            else:
+                print(f"Trip {trip_id}: stored {result[0]:.3f} km, computed {result[1]:.3f} km")
+            return
+        
+        checked, mismatched = await recompute_all_trip_distances(db, dry_run=dry_run)
+    finally:
+        await db.close()
+    
+    action = "would fix" if dry_run else "fixed"
+    print(f"Checked {checked} trip(s), {action} {mismatched}")
+
+
+async def compact_trips(trip_id: Optional[int] = None, vacuum: bool = False):
+    """Compact finished trips whose points are still stored as rows."""
+    db = await connect()
+    try:
+        if trip_id is not None:
+            trip_ids = [trip_id]
+        else:
+            async with db.execute(
+                """SELECT id FROM trips
+                   WHERE ended_at IS NOT NULL
+                     AND EXISTS (SELECT 1 FROM trip_points WHERE trip_id = trips.id)
+                   ORDER BY id"""
+            ) as cursor:
+                trip_ids = [row["id"] for row in await cursor.fetchall()]
+        
+        points = 0
+        for tid in trip_ids:
+            points += await compact_trip(db, tid)
+            await db.commit()
+        
+        if vacuum:
+            await db.execute("VACUUM")
+    finally:
+        await db.close()
+    
+    print(f"Compacted {points} point(s) from {len(trip_ids)} trip(s)")
+
+
+async def simplify_trips(trip_id: Optional[int] = None, workers: Optional[int] = None):
+    """Store simplified geometries for finished trips, fanning the math out to a process pool."""
+    db = await connect()
+    loop = asyncio.get_running_loop()
+    try:
+        if trip_id is not None:
+            trip_ids = [trip_id]
+        else:
+            async with db.execute(
+                "SELECT id FROM trips WHERE ended_at IS NOT NULL ORDER BY id"
+            ) as cursor:
+                trip_ids = [row["id"] for row in await cursor.fetchall()]
+        
+        workers = workers or os.cpu_count() or 1
+        points = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Bound the trips in flight so memory stays flat on large histories
+            in_flight = workers * 2
+            pending = []
+            for index, tid in enumerate(trip_ids):
+                lats, lngs = await load_trip_coordinates(db, tid)
+                if lats:
+                    points += len(lats)
+                    pending.append((tid, loop.run_in_executor(pool, simplify_levels, lats, lngs)))
+                if len(pending) >= in_flight or index == len(trip_ids) - 1:
+                    for pending_id, future in pending:
+                        await store_trip_levels(db, pending_id, await future)
+                    await db.commit()
+                    pending = []
+    finally:
+        await db.close()
+    
+    print(f"Simplified {points} point(s) from {len(trip_ids)} trip(s)")
+
+
+async def reindex_points(trip_id: Optional[int] = None):
+    """Rebuild the spatial index from point rows and compacted tracks."""
+    db = await connect()
+    try:
+        indexed = await rebuild_spatial_index(db, trip_id)
+        await db.commit()
+    finally:
+        await db.close()
+    
+    print(f"Indexed {indexed} trip(s)")
+
+
+async def build_heatmap(rebuild: bool = False):
+    """Add finished trips missing from the heatmap, or recount it from scratch."""
+    db = await connect()
+    try:
+        if rebuild:
+            await db.execute("DELETE FROM heatmap_cells")
+            await db.execute("DELETE FROM heatmap_trips")
+        async with db.execute(
+            """SELECT id FROM trips
+               WHERE ended_at IS NOT NULL AND id NOT IN (SELECT trip_id FROM heatmap_trips)
+               ORDER BY id"""
+        ) as cursor:
+            trip_ids = [row["id"] for row in await cursor.fetchall()]
+        
+        points = 0
+        for tid in trip_ids:
+            points += await add_trip_to_heatmap(db, tid)
+            await db.commit()
+    finally:
+        await db.close()
+    
+    print(f"Added {points} point(s) from {len(trip_ids)} trip(s) to the heatmap")
+
+
+async def seed(
+    users: int, trips_per_user: int, points_per_trip: int, snapshots_per_user: int,
+    seed_value: int, spatial_index: bool,
+):
+    """Bulk-load a synthetic dataset, then materialize the new users' fuel stats."""
+    start = time.perf_counter()
+    counts = await asyncio.to_thread(
+        seed_database, get_db_path(), users, trips_per_user, points_per_trip, snapshots_per_user,
+        seed_value, spatial_index=spatial_index,
+    )
+    await rebuild_stats()
+    
+    print(f"Seeded {counts['users']} user(s), {counts['trips']} trip(s), {counts['points']} point(s) "
+          f"and {counts['snapshots']} fuel snapshot(s) in {time.perf_counter() - start:.1f}s")
+    print(f"Users user{counts['firstUser']}@seed.example and up, password {SEED_PASSWORD!r}")
+    if not spatial_index:
+        print("Spatial index skipped: run reindex-points before searching")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Gas Tracker maintenance commands")
+    parser.add_argument("--db", help=f"database path (default: {get_db_path()})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    rebuild = commands.add_parser("rebuild-stats", help="recompute user_fuel_stats from trip history")
+    rebuild.add_argument("--user", type=int, help="only rebuild this user id")
+    
+    recompute = commands.add_parser("recompute-distances", help="reconcile trip totals against trip_points")
+    recompute.add_argument("--trip", type=int, help="only recompute this trip id")
+    recompute.add_argument("--dry-run", action="store_true", help="report mismatches without fixing them")
+    
+    compact = commands.add_parser("compact-trips", help="move finished trips' points into compressed tracks")
+    compact.add_argument("--trip", type=int, help="only compact this trip id")
+    compact.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the database file")
+    
+    simplify = commands.add_parser("simplify-trips", help="store Douglas-Peucker levels for finished trips")
+    simplify.add_argument("--trip", type=int, help="only simplify this trip id")
+    simplify.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    
+    reindex = commands.add_parser("reindex-points", help="rebuild the trip_bounds spatial index")
+    reindex.add_argument("--trip", type=int, help="only reindex this trip id")
+    
+    heatmap = commands.add_parser("build-heatmap", help="add finished trips to the heatmap cells")
+    heatmap.add_argument("--rebuild", action="store_true", help="clear the heatmap and recount every trip")
+    
+    seeder = commands.add_parser("seed", help="bulk-load a synthetic dataset for scale testing")
+    seeder.add_argument("--users", type=int, default=100)
+    seeder.add_argument("--trips-per-user", type=int, default=50)
+    seeder.add_argument("--points-per-trip", type=int, default=500, help="fixes per trip, 5 s apart")
+    seeder.add_argument("--snapshots-per-user", type=int, default=10)
+    seeder.add_argument("--seed", type=int, default=1, help="random seed; the same seed yields the same data")
+    seeder.add_argument("--no-spatial-index", action="store_true", help="skip the trip_bounds boxes (reindex-points later)")
+    
+    args = parser.parse_args(argv)
+    if args.db:
+        set_db_path(args.db)
+    
+    async def run():
+        await init_database()
+        if args.command == "rebuild-stats":
+            await rebuild_stats(args.user)
+        elif args.command == "recompute-distances":
+            await recompute_distances(args.trip, args.dry_run)
+        elif args.command == "compact-trips":
+            await compact_trips(args.trip, args.vacuum)
+        elif args.command == "simplify-trips":
+            await simplify_trips(args.trip, args.workers)
+        elif args.command == "reindex-points":
+            await reindex_points(args.trip)
+        elif args.command == "build-heatmap":
+            await build_heatmap(args.rebuild)
+        elif args.command == "seed":
+            await seed(
+                args.users, args.trips_per_user, args.points_per_trip, args.snapshots_per_user,
+                args.seed, not args.no_spatial_index,
+            )
+    
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -12,5 +12,121 @@ JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRE_DAYS = 7
 
+# Password hashing: bcrypt cost, and the threads that run it off the event loop
+# (0 workers hashes inline). Requests beyond max pending get 429.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "16"))
+
+# Verified-token cache in front of jwt.decode
+TOKEN_CACHE_ENABLED = os.getenv("TOKEN_CACHE_ENABLED", "true").lower() == "true"
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "10000"))
+TOKEN_CACHE_TTL_S = float(os.getenv("TOKEN_CACHE_TTL_S", "300"))
+
 # Database settings
 DB_PATH = os.getenv("DB_PATH", "./data/gastracker.db")
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # seconds to wait for a free connection
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "30"))  # seconds idle before re-check
+
+# SQLite PRAGMAs applied to every connection
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))  # negative = KiB
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Trip ingestion settings
+MAX_POINTS_PER_BATCH = int(os.getenv("MAX_POINTS_PER_BATCH", "1000"))
+
+# "direct" commits each point in its request; "queued" hands points to a
+# single writer task that group-commits them
+INGEST_MODE = os.getenv("INGEST_MODE", "direct")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100"))
+INGEST_MAX_LATENCY_MS = float(os.getenv("INGEST_MAX_LATENCY_MS", "50"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "1000"))
+INGEST_SUBMIT_TIMEOUT = float(os.getenv("INGEST_SUBMIT_TIMEOUT", "1"))  # seconds to wait on a full queue
+
+# In-memory cache of active trips; assumes a single server process
+LIVE_CACHE_ENABLED = os.getenv("LIVE_CACHE_ENABLED", "true").lower() == "true"
+LIVE_CACHE_MAX_USERS = int(os.getenv("LIVE_CACHE_MAX_USERS", "10000"))
+LIVE_RECENT_POINTS = int(os.getenv("LIVE_RECENT_POINTS", "50"))
+
+# Trip history page sizes
+TRIPS_PAGE_DEFAULT = int(os.getenv("TRIPS_PAGE_DEFAULT", "20"))
+TRIPS_PAGE_MAX = int(os.getenv("TRIPS_PAGE_MAX", "100"))
+
+# Rows fetched per page when streaming the CSV export
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+
+# Compact a trip's points into a single track blob once it stops
+COMPACT_ON_STOP = os.getenv("COMPACT_ON_STOP", "true").lower() == "true"
+
+# Ingest-time point thinning: drop fixes that barely moved, or that continue in a
+# straight line, unless max_gap seconds passed since the last stored fix
+POINT_FILTER_ENABLED = os.getenv("POINT_FILTER_ENABLED", "false").lower() == "true"
+POINT_FILTER_MIN_DISTANCE_M = float(os.getenv("POINT_FILTER_MIN_DISTANCE_M", "10"))
+POINT_FILTER_MIN_HEADING_DEG = float(os.getenv("POINT_FILTER_MIN_HEADING_DEG", "10"))
+POINT_FILTER_MAX_GAP_S = float(os.getenv("POINT_FILTER_MAX_GAP_S", "60"))
+
+# Douglas-Peucker levels stored for finished trips, in meters
+SIMPLIFY_ON_STOP = os.getenv("SIMPLIFY_ON_STOP", "true").lower() == "true"
+SIMPLIFY_TOLERANCES_M = tuple(
+    float(v) for v in os.getenv("SIMPLIFY_TOLERANCES_M", "2,10,50,250").split(",") if v.strip()
+)
+
+# Location search over trip points (GET /trips/search)
+SEARCH_MAX_TRIPS = int(os.getenv("SEARCH_MAX_TRIPS", "100"))
+SEARCH_MAX_RADIUS_M = float(os.getenv("SEARCH_MAX_RADIUS_M", "50000"))
+# Points decoded and scanned per search; older candidate trips past it are skipped
+SEARCH_MAX_POINTS = int(os.getenv("SEARCH_MAX_POINTS", "200000"))
+
+# Usage heatmap: per-user point counts in 2^CELL_BITS x 2^CELL_BITS cells per tile
+HEATMAP_ON_STOP = os.getenv("HEATMAP_ON_STOP", "true").lower() == "true"
+HEATMAP_MIN_ZOOM = int(os.getenv("HEATMAP_MIN_ZOOM", "3"))
+HEATMAP_MAX_ZOOM = int(os.getenv("HEATMAP_MAX_ZOOM", "16"))
+HEATMAP_CELL_BITS = int(os.getenv("HEATMAP_CELL_BITS", "6"))
+HEATMAP_CACHE_MAX_AGE = int(os.getenv("HEATMAP_CACHE_MAX_AGE", "300"))
+
+# WebSocket point stream (/trips/stream)
+STREAM_MAX_CONNECTIONS = int(os.getenv("STREAM_MAX_CONNECTIONS", "500"))
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "32"))
+
+# Live trip events for SSE watchers (/trips/active/events)
+EVENTS_ENABLED = os.getenv("EVENTS_ENABLED", "true").lower() == "true"
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_HEARTBEAT_S = float(os.getenv("EVENTS_HEARTBEAT_S", "15"))
+
+# Per-user token buckets per route class, as "class=rate_per_second:burst,...".
+# Classes missing from RATE_LIMITS keep their default budget.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMITS = {
+    name.strip(): (float(budget.split(":")[0]), float(budget.split(":")[1]))
+    for spec in ("ingest=2:30,read=5:30,tiles=20:100,stats=1:10,export=0.1:3", os.getenv("RATE_LIMITS", ""))
+    for name, budget in (item.split("=") for item in spec.split(",") if item.strip())
+}
+RATE_LIMIT_MAX_USERS = int(os.getenv("RATE_LIMIT_MAX_USERS", "100000"))
+
+# Admission control: shed export/stats (then reads) while ingest p95 is over target
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_TARGET_MS = float(os.getenv("ADMISSION_TARGET_MS", "250"))
+ADMISSION_WINDOW_S = float(os.getenv("ADMISSION_WINDOW_S", "10"))
+ADMISSION_RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER_S", "5"))
+
+# Prometheus-style metrics at GET /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Slow-query log: statements over SLOW_QUERY_MS are logged with their query plan
+# and aggregated for GET /admin/slow-queries (negative disables)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "50"))
+SLOW_QUERY_MAX_ENTRIES = int(os.getenv("SLOW_QUERY_MAX_ENTRIES", "200"))
+
+# Token for the /admin endpoints (sent as X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# On-demand sampling profiler (POST /admin/profile); disabled removes its middleware
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "true").lower() == "true"
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+PROFILER_MAX_STACK = int(os.getenv("PROFILER_MAX_STACK", "64"))
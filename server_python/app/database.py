@@ -1,11 +1,26 @@
-import os
+import asyncio
+import sqlite3
+import time
 import aiosqlite
+from aiosqlite.context import contextmanager
+from contextlib import asynccontextmanager
+from functools import partial
 from pathlib import Path
-from .config import DB_PATH
+from typing import Optional
+from fastapi import HTTPException, status
+from .config import (
+    DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_HEALTH_CHECK_INTERVAL,
+    DB_SYNCHRONOUS, DB_CACHE_SIZE, DB_MMAP_SIZE, DB_BUSY_TIMEOUT_MS, METRICS_ENABLED,
+)
+from .metrics import db_commits
+from .slowlog import slow_queries, normalize_sql, params_shape, is_explainable
 
 # Global connection variable
 _db_path: str = DB_PATH
 
+# Global connection pool (opened in the app lifespan)
+_pool: Optional["ConnectionPool"] = None
+
 
 def get_db_path() -> str:
     return _db_path
@@ -16,15 +31,253 @@ def set_db_path(path: str):
     _db_path = path
 
 
-async def get_db():
-    """Get a database connection."""
-    db = await aiosqlite.connect(get_db_path())
+class TrackedConnection(aiosqlite.Connection):
+    """aiosqlite connection that counts commits and rollbacks for /metrics and
+    times statements for the slow-query log.
+
+    For a SELECT the time covers running it up to its first row, which is
+    where SQLite sorts or scans when no index fits.
+    """
+
+    @contextmanager
+    async def execute(self, sql: str, parameters=None) -> aiosqlite.Cursor:
+        if slow_queries is None:
+            return await super().execute(sql, parameters)
+        start = time.perf_counter()
+        cursor = await super().execute(sql, parameters)
+        await self._check_slow(sql, parameters, time.perf_counter() - start, many=False)
+        return cursor
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters) -> aiosqlite.Cursor:
+        if slow_queries is None:
+            return await super().executemany(sql, parameters)
+        if not isinstance(parameters, (list, tuple)):
+            # Keep a generator's rows around for params_shape
+            parameters = list(parameters)
+        start = time.perf_counter()
+        cursor = await super().executemany(sql, parameters)
+        await self._check_slow(sql, parameters, time.perf_counter() - start, many=True)
+        return cursor
+
+    async def _check_slow(self, sql: str, parameters, duration: float, many: bool):
+        if duration < slow_queries.threshold:
+            return
+        normalized = normalize_sql(sql)
+        plan = None
+        if not slow_queries.has_plan(normalized) and is_explainable(sql):
+            try:
+                params = (parameters[0] if parameters else ()) if many else (parameters or ())
+                async with super().execute(f"EXPLAIN QUERY PLAN {sql}", params) as cursor:
+                    plan = [row[3] for row in await cursor.fetchall()]
+            except sqlite3.Error as e:
+                plan = [f"unavailable: {e}"]
+        slow_queries.record(normalized, params_shape(parameters, many), duration, plan)
+
+    async def commit(self) -> None:
+        await super().commit()
+        db_commits.inc("commit")
+
+    async def rollback(self) -> None:
+        await super().rollback()
+        db_commits.inc("rollback")
+
+
+async def connect(db_path: Optional[str] = None) -> aiosqlite.Connection:
+    """Open a new connection with the standard PRAGMAs applied."""
+    tracked = METRICS_ENABLED or slow_queries is not None
+    connection_class = TrackedConnection if tracked else aiosqlite.Connection
+    # Same as aiosqlite.connect(), but with our connection class
+    db = await connection_class(partial(sqlite3.connect, db_path or get_db_path()), 64)
     db.row_factory = aiosqlite.Row
     await db.execute("PRAGMA foreign_keys = ON;")
+    await db.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS};")
+    await db.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS};")
+    await db.execute(f"PRAGMA cache_size = {DB_CACHE_SIZE};")
+    await db.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE};")
+    return db
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free in time."""
+
+
+class ConnectionPool:
+    """Bounded pool of pre-configured aiosqlite connections."""
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = DB_POOL_SIZE,
+        timeout: float = DB_POOL_TIMEOUT,
+        health_check_interval: float = DB_HEALTH_CHECK_INTERVAL,
+    ):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle: asyncio.LifoQueue = asyncio.LifoQueue()
+        self._last_used: dict = {}
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+
+        # Usage metrics
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+        self.health_check_failures = 0
+        self.discarded = 0
+
+    async def acquire(self) -> aiosqlite.Connection:
+        """Check out a connection, waiting up to `timeout` seconds for one to free up."""
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+
+        while True:
+            db = None
+            if not self._idle.empty():
+                db = self._idle.get_nowait()
+            elif self._created < self.size:
+                self._created += 1
+                try:
+                    db = await connect(self.db_path)
+                except Exception:
+                    self._created -= 1
+                    raise
+                self._last_used[id(db)] = time.monotonic()
+            else:
+                self.waits += 1
+                start = time.perf_counter()
+                try:
+                    db = await asyncio.wait_for(self._idle.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"no database connection free after {self.timeout}s")
+                finally:
+                    waited = time.perf_counter() - start
+                    self.wait_time_total += waited
+                    self.wait_time_max = max(self.wait_time_max, waited)
+
+            if await self._is_healthy(db):
+                break
+            await self._discard(db)
+
+        self._in_use += 1
+        self.checkouts += 1
+        return db
+
+    async def release(self, db: aiosqlite.Connection):
+        """Return a connection to the pool, rolling back any unfinished transaction."""
+        self._in_use -= 1
+        if self._closed:
+            await self._discard(db)
+            return
+        try:
+            if db.in_transaction:
+                await db.rollback()
+        except Exception:
+            await self._discard(db)
+            return
+        self._last_used[id(db)] = time.monotonic()
+        self._idle.put_nowait(db)
+
+    async def close(self):
+        """Close every idle connection; in-use ones are closed when released."""
+        self._closed = True
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
+
+    async def _is_healthy(self, db: aiosqlite.Connection) -> bool:
+        last_used = self._last_used.get(id(db), 0.0)
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            await db.execute("SELECT 1")
+            return True
+        except Exception:
+            self.health_check_failures += 1
+            return False
+
+    async def _discard(self, db: aiosqlite.Connection):
+        self._created -= 1
+        self.discarded += 1
+        self._last_used.pop(id(db), None)
+        try:
+            await db.close()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        """Pool usage and wait metrics."""
+        return {
+            "size": self._created,
+            "maxSize": self.size,
+            "inUse": self._in_use,
+            "idle": self._idle.qsize(),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "waitTimeTotalMs": round(self.wait_time_total * 1000, 3),
+            "waitTimeMaxMs": round(self.wait_time_max * 1000, 3),
+            "timeouts": self.timeouts,
+            "healthCheckFailures": self.health_check_failures,
+            "discarded": self.discarded,
+        }
+
+
+def get_pool() -> Optional[ConnectionPool]:
+    return _pool
+
+
+async def open_pool(size: int = DB_POOL_SIZE) -> ConnectionPool:
+    """Create the global connection pool for the current database path."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+    _pool = ConnectionPool(get_db_path(), size=size)
+    return _pool
+
+
+async def close_pool():
+    """Close the global connection pool."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+@asynccontextmanager
+async def db_connection():
+    """Borrow a pooled connection, or open a dedicated one if no pool is open."""
+    pool = _pool
+    if pool is None:
+        db = await connect()
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+
+    db = await pool.acquire()
     try:
         yield db
     finally:
-        await db.close()
+        await pool.release(db)
+
+
+async def get_db():
+    """Get a database connection."""
+    try:
+        async with db_connection() as db:
+            yield db
+    except PoolTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"error": "db_busy"},
+            headers={"Retry-After": "1"},
+        )
 
 
 async def init_database():
@@ -38,6 +291,8 @@ async def init_database():
     
     async with aiosqlite.connect(db_path) as db:
         await db.execute("PRAGMA foreign_keys = ON;")
+        # WAL is persistent per database file, so it only needs setting once
+        await db.execute("PRAGMA journal_mode = WAL;")
         
         await db.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -82,13 +337,115 @@ async def init_database():
             );
         """)
         
+        # Compacted points of finished trips (see tracks.py)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS trip_tracks (
+                trip_id INTEGER PRIMARY KEY,
+                point_count INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                FOREIGN KEY(trip_id) REFERENCES trips(id) ON DELETE CASCADE
+            );
+        """)
+        
+        # Douglas-Peucker simplified geometries of finished trips (see simplify.py)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS trip_simplified (
+                trip_id INTEGER NOT NULL,
+                tolerance_m REAL NOT NULL,
+                point_count INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY(trip_id, tolerance_m),
+                FOREIGN KEY(trip_id) REFERENCES trips(id) ON DELETE CASCADE
+            );
+        """)
+        
+        # Bounding box of each trip's points, searched per user before any
+        # point is read (see spatial.py). One row per trip, so it survives
+        # compaction at no per-point cost, and it goes away with its trip.
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS trip_bounds (
+                trip_id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                min_lat REAL NOT NULL,
+                max_lat REAL NOT NULL,
+                min_lng REAL NOT NULL,
+                max_lng REAL NOT NULL,
+                FOREIGN KEY(trip_id) REFERENCES trips(id) ON DELETE CASCADE
+            );
+        """)
+        # Grow the box as points arrive; points already inside it write nothing
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trip_bounds_insert AFTER INSERT ON trip_points
+            BEGIN
+                INSERT INTO trip_bounds (trip_id, user_id, min_lat, max_lat, min_lng, max_lng)
+                SELECT id, user_id, NEW.lat, NEW.lat, NEW.lng, NEW.lng FROM trips WHERE id = NEW.trip_id
+                ON CONFLICT(trip_id) DO UPDATE SET
+                    min_lat = MIN(min_lat, excluded.min_lat), max_lat = MAX(max_lat, excluded.max_lat),
+                    min_lng = MIN(min_lng, excluded.min_lng), max_lng = MAX(max_lng, excluded.max_lng)
+                WHERE excluded.min_lat < min_lat OR excluded.max_lat > max_lat
+                   OR excluded.min_lng < min_lng OR excluded.max_lng > max_lng;
+            END;
+        """)
+        # The per-point R*Tree it replaces kept one entry per point forever
+        await db.execute("DROP TRIGGER IF EXISTS trip_points_rtree_insert;")
+        await db.execute("DROP TRIGGER IF EXISTS trips_rtree_delete;")
+        await db.execute("DROP TABLE IF EXISTS trip_points_rtree;")
+        
+        # Usage heatmap cells per user and zoom (see heatmap.py), and the trips
+        # already counted in them
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS heatmap_cells (
+                user_id INTEGER NOT NULL,
+                z INTEGER NOT NULL,
+                x INTEGER NOT NULL,
+                y INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY(user_id, z, x, y),
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) WITHOUT ROWID;
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS heatmap_trips (
+                trip_id INTEGER PRIMARY KEY,
+                FOREIGN KEY(trip_id) REFERENCES trips(id) ON DELETE CASCADE
+            );
+        """)
+        
+        # Materialized consumption stats over each user's last finished trips
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS user_fuel_stats (
+                user_id INTEGER PRIMARY KEY,
+                window_trips INTEGER NOT NULL DEFAULT 0,
+                distance_km REAL NOT NULL DEFAULT 0,
+                fuel_consumed_liters REAL NOT NULL DEFAULT 0,
+                duration_days REAL NOT NULL DEFAULT 0,
+                current_fuel_liters REAL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+        """)
+        
         # Create indexes
+        # Last-point lookups and ordered track loads read this index in order
+        # instead of sorting the whole trip. It also serves every trip_id
+        # lookup, so the plain trip_id index is dropped.
         await db.execute(
-            "CREATE INDEX IF NOT EXISTS idx_trip_points_trip_id ON trip_points(trip_id);"
+            "CREATE INDEX IF NOT EXISTS idx_trip_points_trip_timestamp ON trip_points(trip_id, timestamp, id);"
         )
+        await db.execute("DROP INDEX IF EXISTS idx_trip_points_trip_id;")
         await db.execute(
             "CREATE INDEX IF NOT EXISTS idx_fuel_snapshots_user_id ON fuel_snapshots(user_id);"
         )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_trips_user_ended_at ON trips(user_id, ended_at);"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_trips_user_started_at ON trips(user_id, started_at, id);"
+        )
+        # Covers the per-user box search without touching the table
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_trip_bounds_user ON trip_bounds(user_id, min_lat, max_lat, min_lng, max_lng);"
+        )
         
         await db.commit()
         
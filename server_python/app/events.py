@@ -0,0 +1,84 @@
+"""
+In-process pub/sub of live trip events, feeding GET /trips/active/events.
+
+Publishers (trip start/stop and the ingest path) call `publish`, which is a
+dictionary lookup when nobody is watching the user. Each subscriber gets a
+bounded queue; one that falls a full queue behind is dropped and its stream
+ends, so the client reconnects and resyncs instead of slowing publishers.
+Only valid while a single process serves every request, like the live cache.
+"""
+
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+from .config import EVENTS_ENABLED, EVENTS_QUEUE_SIZE
+
+
+class Subscription:
+    """One watcher's queue of (event, data) pairs."""
+
+    def __init__(self, user_id: int, size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.lagged = False
+
+    async def get(self) -> Optional[Tuple[str, dict]]:
+        """Next event, or None once the subscription was dropped for lagging."""
+        if self.lagged:
+            return None
+        item = await self.queue.get()
+        return None if self.lagged else item
+
+
+class TripEventHub:
+    """Fan-out of trip events to the subscribers of each user."""
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.user_id]
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subscribers
+
+    def publish(self, user_id: int, event: str, data: dict):
+        """Queue an event for every subscriber of the user, dropping the ones that lag."""
+        subscribers = self._subscribers.get(user_id)
+        if not subscribers:
+            return
+        self.published += 1
+        for subscription in list(subscribers):
+            try:
+                subscription.queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                self.dropped += 1
+                subscription.lagged = True
+                self.unsubscribe(subscription)
+                # Wake the reader so its stream ends now
+                subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+trip_events: Optional[TripEventHub] = TripEventHub() if EVENTS_ENABLED else None
@@ -0,0 +1,107 @@
+"""
+Per-user usage heatmap, pre-aggregated into Web Mercator tile cells.
+
+Each tile z/x/y is split into a 2^HEATMAP_CELL_BITS square grid and
+heatmap_cells keeps a point count per user and cell for every zoom between
+HEATMAP_MIN_ZOOM and HEATMAP_MAX_ZOOM. Points are projected once at the finest
+cell zoom; coarser cells are the same coordinates shifted right, so binning a
+trip costs one projection plus a count per level.
+"""
+
+import math
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+import aiosqlite
+
+from .calc import NUMPY_AVAILABLE
+from .config import HEATMAP_MIN_ZOOM, HEATMAP_MAX_ZOOM, HEATMAP_CELL_BITS
+from .metrics import timed
+from .trips import load_trip_coordinates
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+# Web Mercator is undefined at the poles
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def _project(lats: Sequence[float], lngs: Sequence[float], zoom: int):
+    """Integer tile coordinates of points at a zoom level."""
+    n = 2 ** zoom
+    if NUMPY_AVAILABLE:
+        lat = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+        lng = np.asarray(lngs, dtype=np.float64)
+        x = np.floor((lng + 180.0) / 360.0 * n).astype(np.int64)
+        y = np.floor((1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0 * n).astype(np.int64)
+        return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+    xs, ys = [], []
+    for lat, lng in zip(lats, lngs):
+        lat = math.radians(min(max(lat, -MAX_MERCATOR_LAT), MAX_MERCATOR_LAT))
+        xs.append(min(max(int((lng + 180.0) / 360.0 * n), 0), n - 1))
+        ys.append(min(max(int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n), 0), n - 1))
+    return xs, ys
+
+
+def bin_points(lats: Sequence[float], lngs: Sequence[float]) -> Dict[Tuple[int, int, int], int]:
+    """Count points per (tile zoom, cell x, cell y) at every heatmap zoom."""
+    if not lats:
+        return {}
+    finest = HEATMAP_MAX_ZOOM + HEATMAP_CELL_BITS
+    x, y = _project(lats, lngs, finest)
+
+    counts: Dict[Tuple[int, int, int], int] = {}
+    for z in range(HEATMAP_MIN_ZOOM, HEATMAP_MAX_ZOOM + 1):
+        shift = HEATMAP_MAX_ZOOM - z
+        if NUMPY_AVAILABLE:
+            cells, n = np.unique(np.stack([x >> shift, y >> shift]), axis=1, return_counts=True)
+            for cx, cy, c in zip(cells[0].tolist(), cells[1].tolist(), n.tolist()):
+                counts[(z, cx, cy)] = c
+        else:
+            for (cx, cy), c in Counter(zip((v >> shift for v in x), (v >> shift for v in y))).items():
+                counts[(z, cx, cy)] = c
+    return counts
+
+
+@timed("add_trip_to_heatmap")
+async def add_trip_to_heatmap(db: aiosqlite.Connection, trip_id: int) -> int:
+    """Add a finished trip's points to its user's heatmap (does not commit).
+
+    Each trip is counted at most once. Returns the number of points added.
+    """
+    cursor = await db.execute(
+        """INSERT OR IGNORE INTO heatmap_trips (trip_id)
+           SELECT id FROM trips WHERE id = ? AND ended_at IS NOT NULL""",
+        (trip_id,)
+    )
+    if cursor.rowcount == 0:
+        return 0
+
+    async with db.execute("SELECT user_id FROM trips WHERE id = ?", (trip_id,)) as cursor:
+        user_id = (await cursor.fetchone())["user_id"]
+    lats, lngs = await load_trip_coordinates(db, trip_id)
+    await db.executemany(
+        """INSERT INTO heatmap_cells (user_id, z, x, y, count) VALUES (?, ?, ?, ?, ?)
+           ON CONFLICT(user_id, z, x, y) DO UPDATE SET count = count + excluded.count""",
+        [(user_id, z, cx, cy, c) for (z, cx, cy), c in bin_points(lats, lngs).items()]
+    )
+    return len(lats)
+
+
+@timed("get_heatmap_tile")
+async def get_heatmap_tile(db: aiosqlite.Connection, user_id: int, z: int, x: int, y: int) -> List[int]:
+    """A tile's non-empty cells as a flat [x, y, count, ...] list, x/y relative to the tile."""
+    x0, y0 = x << HEATMAP_CELL_BITS, y << HEATMAP_CELL_BITS
+    size = 1 << HEATMAP_CELL_BITS
+    async with db.execute(
+        """SELECT x, y, count FROM heatmap_cells
+           WHERE user_id = ? AND z = ? AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?
+           ORDER BY x, y""",
+        (user_id, z, x0, x0 + size - 1, y0, y0 + size - 1)
+    ) as cursor:
+        rows = await cursor.fetchall()
+
+    cells = []
+    for row in rows:
+        cells.extend((row["x"] - x0, row["y"] - y0, row["count"]))
+    return cells
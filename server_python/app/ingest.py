@@ -0,0 +1,304 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+import aiosqlite
+
+from .config import (
+    INGEST_BATCH_SIZE, INGEST_MAX_LATENCY_MS, INGEST_QUEUE_SIZE, INGEST_SUBMIT_TIMEOUT,
+)
+from .database import connect, db_connection
+from .events import trip_events
+from .live import live_trips
+from .models import TripPoint
+from .thinning import point_filter
+from .trips import (
+    add_point, add_points, format_timestamp, get_last_point, get_trip_total, insert_point, list_trip_points,
+)
+
+# Sentinel that tells the writer to flush and exit
+_STOP = object()
+
+# Global writer (started in the app lifespan when INGEST_MODE is "queued")
+_writer: Optional["PointWriter"] = None
+
+
+class IngestQueueFull(Exception):
+    """Raised when a point cannot be queued before the submit timeout."""
+
+
+class IngestWriterStopped(IngestQueueFull):
+    """Raised for points queued to, or submitted after, a writer task that has exited."""
+
+
+class PointWriter:
+    """Single writer task that drains queued trip points and commits them in groups."""
+
+    def __init__(
+        self,
+        batch_size: int = INGEST_BATCH_SIZE,
+        max_latency_ms: float = INGEST_MAX_LATENCY_MS,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        submit_timeout: float = INGEST_SUBMIT_TIMEOUT,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.max_latency = max_latency_ms / 1000
+        self.submit_timeout = submit_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = False
+
+        # Throughput metrics
+        self.submitted = 0
+        self.rejected = 0
+        self.commits = 0
+        self.points_committed = 0
+        self.max_commit_size = 0
+        self.failed_commits = 0
+        self.failed_points = 0
+
+    async def start(self):
+        """Open the writer's own connection and start draining the queue."""
+        self._db = await connect()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued so far, then stop the writer."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.put(_STOP)
+        # A writer that died has already failed its points; don't re-raise here
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self._db.close()
+        self._db = None
+
+    async def submit(self, trip_id: int, lat: float, lng: float) -> Tuple[TripPoint, float, float]:
+        """Queue a point and wait until the group containing it is committed."""
+        if self._stopped:
+            raise IngestWriterStopped("ingest writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(
+                self._queue.put((trip_id, lat, lng, future)), self.submit_timeout
+            )
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise IngestQueueFull("ingest queue is full")
+        if self._stopped:
+            # The writer exited while this point waited for queue space
+            self._fail_pending()
+        self.submitted += 1
+        return await future
+
+    async def _run(self):
+        try:
+            await self._drain()
+        finally:
+            # However the loop ended, nobody is left to resolve what is still queued
+            self._stopped = True
+            self._fail_pending()
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            # Collect a group until it is full or the oldest point has waited long enough
+            group = [item]
+            deadline = loop.time() + self.max_latency
+            while len(group) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                group.append(item)
+
+            try:
+                await self._commit_group(group)
+            except BaseException as exc:
+                self._fail_group(group, exc)
+                raise
+
+    async def _commit_group(self, group: list):
+        db = self._db
+        stored = []
+        # Last point per trip within this group, so chained distances stay correct
+        last_points = {}
+        try:
+            if not db.in_transaction:
+                await db.execute("BEGIN")
+            for item in group:
+                trip_id, lat, lng, future = item
+                # Each point gets a savepoint, so a bad one fails alone
+                await db.execute("SAVEPOINT point")
+                try:
+                    if trip_id not in last_points:
+                        last_points[trip_id] = await get_last_point(db, trip_id)
+                    result = await insert_point(db, trip_id, lat, lng, last_points[trip_id])
+                except Exception as exc:
+                    await db.execute("ROLLBACK TO point")
+                    await db.execute("RELEASE point")
+                    self.failed_points += 1
+                    if not future.done():
+                        future.set_exception(exc)
+                    continue
+                await db.execute("RELEASE point")
+                last_points[trip_id] = result[0]
+                stored.append((item, result))
+            await db.commit()
+        except Exception as exc:
+            self.failed_commits += 1
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+            self._fail_group(group, exc)
+            return
+
+        self.commits += 1
+        self.points_committed += len(stored)
+        self.max_commit_size = max(self.max_commit_size, len(stored))
+        for (trip_id, *_, future), result in stored:
+            if live_trips is not None:
+                live_trips.record_point(trip_id, result[0], result[2])
+            if not future.done():
+                future.set_result(result)
+
+    def _fail_group(self, group: list, exc: BaseException):
+        if not isinstance(exc, Exception):
+            exc = IngestWriterStopped("ingest writer stopped")
+        for *_, future in group:
+            if not future.done():
+                future.set_exception(exc)
+
+    def _fail_pending(self):
+        """Fail every point still queued once the writer has exited."""
+        exc = IngestWriterStopped("ingest writer is not running")
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                self._fail_group([item], exc)
+
+    def stats(self) -> dict:
+        """Queue depth and group-commit metrics."""
+        return {
+            "queueDepth": self._queue.qsize(),
+            "queueSize": self._queue.maxsize,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "commits": self.commits,
+            "pointsCommitted": self.points_committed,
+            "avgCommitSize": round(self.points_committed / self.commits, 2) if self.commits else 0,
+            "maxCommitSize": self.max_commit_size,
+            "failedCommits": self.failed_commits,
+            "failedPoints": self.failed_points,
+        }
+
+
+def get_point_writer() -> Optional[PointWriter]:
+    return _writer
+
+
+async def start_point_writer() -> PointWriter:
+    """Start the global point writer."""
+    global _writer
+    if _writer is None:
+        _writer = PointWriter()
+        await _writer.start()
+    return _writer
+
+
+async def stop_point_writer():
+    """Flush and stop the global point writer."""
+    global _writer
+    if _writer is not None:
+        await _writer.stop()
+        _writer = None
+
+
+async def ingest_point(
+    trip_id: int, lat: float, lng: float, user_id: Optional[int] = None
+) -> Tuple[TripPoint, float, float, bool]:
+    """Add a point through the writer queue when it is running, otherwise directly.
+
+    With point thinning on, a fix may be dropped instead: the result is then the
+    trip's last stored point, no added distance, the current total and
+    kept=False. The first fix of a trip is always kept.
+    Stored points are published to the trip owner's event subscribers when
+    `user_id` is given.
+
+    Connections are borrowed only for the filter's reads and direct writes,
+    never while waiting on the writer, so a group is not capped by the pool.
+    """
+    if point_filter is not None:
+        async with db_connection() as db:
+            recent = await list_trip_points(db, trip_id, 2)
+            last_kept = recent[0] if recent else None
+            prev_kept = recent[1] if len(recent) > 1 else None
+            if not point_filter.should_keep(last_kept, prev_kept, lat, lng):
+                return last_kept, 0.0, await get_trip_total(db, trip_id), False
+    
+    writer = _writer
+    if writer is not None:
+        point, distance_added, total = await writer.submit(trip_id, lat, lng)
+    else:
+        async with db_connection() as db:
+            point, distance_added, total = await add_point(db, trip_id, lat, lng)
+    
+    if user_id is not None and trip_events is not None and trip_events.has_subscribers(user_id):
+        trip_events.publish(user_id, "point", {
+            "tripId": trip_id, "point": point.model_dump(), "distanceAdded": distance_added, "total": total,
+        })
+    return point, distance_added, total, True
+
+
+async def ingest_points(
+    db: aiosqlite.Connection,
+    trip_id: int,
+    points: List[Tuple[float, float, Optional[datetime]]],
+    user_id: Optional[int] = None
+) -> Tuple[int, int, float, float]:
+    """Add a batch of (lat, lng, timestamp) fixes, thinning them first when enabled.
+
+    Returns (kept, dropped, distance added, new total). Like ingest_point, the
+    result is published to the owner's event subscribers when `user_id` is given.
+    """
+    if point_filter is not None:
+        recent = await list_trip_points(db, trip_id, 2)
+        last_kept = recent[0] if recent else None
+        prev_kept = recent[1] if len(recent) > 1 else None
+        kept = []
+        for lat, lng, timestamp in points:
+            if point_filter.should_keep(last_kept, prev_kept, lat, lng, timestamp):
+                kept.append((lat, lng, timestamp))
+                stamp = format_timestamp(timestamp) if timestamp else format_timestamp(datetime.now(timezone.utc))
+                prev_kept, last_kept = last_kept, TripPoint(id=0, trip_id=trip_id, timestamp=stamp, lat=lat, lng=lng)
+        dropped = len(points) - len(kept)
+        points = kept
+        if not points:
+            return 0, dropped, 0.0, await get_trip_total(db, trip_id)
+    else:
+        dropped = 0
+    
+    rows = [(lat, lng, format_timestamp(timestamp) if timestamp else None) for lat, lng, timestamp in points]
+    added, distance_added, total = await add_points(db, trip_id, rows)
+    
+    if user_id is not None and trip_events is not None and trip_events.has_subscribers(user_id):
+        trip_events.publish(user_id, "points", {
+            "tripId": trip_id, "added": added, "distanceAdded": distance_added, "total": total,
+        })
+    return added, dropped, distance_added, total
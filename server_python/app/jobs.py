@@ -0,0 +1,17 @@
+from .config import COMPACT_ON_STOP, SIMPLIFY_ON_STOP, HEATMAP_ON_STOP
+from .database import db_connection
+from .heatmap import add_trip_to_heatmap
+from .simplify import simplify_trip
+from .tracks import compact_trip
+
+
+async def process_finished_trip(trip_id: int):
+    """Post-stop work for a trip, run as a background task after the response."""
+    async with db_connection() as db:
+        if SIMPLIFY_ON_STOP:
+            await simplify_trip(db, trip_id)
+        if HEATMAP_ON_STOP:
+            await add_trip_to_heatmap(db, trip_id)
+        if COMPACT_ON_STOP:
+            await compact_trip(db, trip_id)
+        await db.commit()
@@ -0,0 +1,141 @@
+"""
+Per-user rate limits and priority-aware admission control.
+
+Every limited route belongs to a class ("ingest", "read", "tiles", "stats",
+"export") with its own token bucket per user. Independently, the admission
+controller tracks recent ingest latency: when its p95 goes over
+ADMISSION_TARGET_MS, export and stats requests are shed first, then reads and
+map tiles at twice the target. Ingestion itself is never shed. Both reject
+with a Retry-After header. Like the live cache, state is per process.
+"""
+
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+from fastapi import Depends, HTTPException, status
+
+from .auth import get_current_user
+from .config import (
+    RATE_LIMIT_ENABLED, RATE_LIMITS, RATE_LIMIT_MAX_USERS,
+    ADMISSION_ENABLED, ADMISSION_TARGET_MS, ADMISSION_WINDOW_S, ADMISSION_RETRY_AFTER_S,
+)
+from .models import AuthUser
+
+# Lower sheds later; 0 is never shed
+PRIORITIES = {"ingest": 0, "read": 1, "tiles": 1, "stats": 2, "export": 2}
+
+
+class RateLimiter:
+    """Token buckets keyed by (user id, route class), LRU-bounded."""
+
+    def __init__(self, budgets: Dict[str, Tuple[float, float]] = RATE_LIMITS, max_keys: int = RATE_LIMIT_MAX_USERS):
+        # route class -> (tokens per second, burst)
+        self.budgets = budgets
+        self.max_keys = max_keys
+        # (user_id, route class) -> [tokens, last refill time]
+        self._buckets: "OrderedDict[Tuple[int, str], list]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, user_id: int, route_class: str, cost: float = 1.0) -> float:
+        """Take `cost` tokens; returns 0 if allowed, else seconds until it would be."""
+        budget = self.budgets.get(route_class)
+        if budget is None:
+            return 0.0
+        rate, burst = budget
+        now = time.monotonic()
+        key = (user_id, route_class)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            self.allowed += 1
+            return 0.0
+        self.limited += 1
+        return (cost - bucket[0]) / rate if rate > 0 else math.inf
+
+    def stats(self) -> dict:
+        return {"buckets": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+
+class AdmissionController:
+    """Sheds low-priority requests while recent ingest latency is over target."""
+
+    def __init__(self, target_ms: float = ADMISSION_TARGET_MS, window_s: float = ADMISSION_WINDOW_S):
+        self.target = target_ms / 1000
+        self.window = window_s
+        # (finished at, seconds) of recent ingest requests
+        self._samples: deque = deque(maxlen=1024)
+        self.shed = 0
+
+    def record(self, latency: float):
+        self._samples.append((time.monotonic(), latency))
+
+    def p95(self) -> float:
+        cutoff = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        if not self._samples:
+            return 0.0
+        latencies = sorted(latency for _, latency in self._samples)
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def admit(self, priority: int) -> bool:
+        if priority <= 0:
+            return True
+        # Priority 1 tolerates twice the target, priority 2 only the target
+        if self.p95() > self.target * (3 - min(priority, 2)):
+            self.shed += 1
+            return False
+        return True
+
+    def stats(self) -> dict:
+        return {"ingestP95Ms": round(self.p95() * 1000, 1), "targetMs": self.target * 1000, "shed": self.shed}
+
+
+rate_limiter: Optional[RateLimiter] = RateLimiter() if RATE_LIMIT_ENABLED else None
+admission: Optional[AdmissionController] = AdmissionController() if ADMISSION_ENABLED else None
+
+
+def limit(route_class: str):
+    """Dependency enforcing a route class's rate limit and admission control.
+
+    Also records the duration of ingest requests, which drives admission.
+    """
+    priority = PRIORITIES.get(route_class, 1)
+
+    async def dependency(current_user: AuthUser = Depends(get_current_user)):
+        if rate_limiter is not None:
+            wait = rate_limiter.acquire(current_user.id, route_class)
+            if wait > 0:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail={"error": "rate_limited"},
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+        if admission is not None and not admission.admit(priority):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail={"error": "overloaded"},
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_S)},
+            )
+
+        if admission is None or priority > 0:
+            yield current_user
+            return
+        start = time.perf_counter()
+        try:
+            yield current_user
+        finally:
+            admission.record(time.perf_counter() - start)
+
+    return dependency
@@ -0,0 +1,120 @@
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, Optional, Tuple
+
+from .config import LIVE_CACHE_ENABLED, LIVE_CACHE_MAX_USERS, LIVE_RECENT_POINTS
+from .models import Trip, TripPoint
+
+
+class LiveTrip:
+    """Cached state of a user's active trip."""
+
+    def __init__(self, trip: Trip, points: Iterable[TripPoint], complete: bool, size: int):
+        self.trip = trip
+        # Oldest first; the right end is the most recent fix
+        self.recent: deque = deque(points, maxlen=size)
+        # True while `recent` still holds every point of the trip
+        self.complete = complete and len(self.recent) < size
+
+    @property
+    def last_point(self) -> Optional[TripPoint]:
+        return self.recent[-1] if self.recent else None
+
+
+class LiveTripCache:
+    """Per-user cache of active trips, kept coherent by start_trip, add_point and stop_trip.
+
+    Only valid while a single process owns the database writes.
+    """
+
+    def __init__(self, max_users: int = LIVE_CACHE_MAX_USERS, recent_points: int = LIVE_RECENT_POINTS):
+        self.max_users = max_users
+        self.recent_points = recent_points
+        # user_id -> LiveTrip, or None when the user is known to have no active trip
+        self._users: "OrderedDict[int, Optional[LiveTrip]]" = OrderedDict()
+        self._trip_users: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, user_id: int) -> Tuple[bool, Optional[LiveTrip]]:
+        """Return (found, state) for a user."""
+        if user_id not in self._users:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self._users.move_to_end(user_id)
+        return True, self._users[user_id]
+
+    def for_trip(self, trip_id: int) -> Optional[LiveTrip]:
+        """Return the cached state of an active trip, if any."""
+        user_id = self._trip_users.get(trip_id)
+        if user_id is None:
+            return None
+        return self._users.get(user_id)
+
+    def set_active(self, trip: Trip, points: Iterable[TripPoint] = (), complete: bool = True):
+        """Cache `trip` as the user's active trip; `points` are oldest first."""
+        self._forget_user(trip.user_id)
+        self._trip_users[trip.id] = trip.user_id
+        self._store(trip.user_id, LiveTrip(trip, points, complete, self.recent_points))
+
+    def set_inactive(self, user_id: int):
+        """Remember that a user has no active trip."""
+        self._forget_user(user_id)
+        self._store(user_id, None)
+
+    def record_point(self, trip_id: int, point: TripPoint, total: float):
+        """Append a committed point and the trip's new total."""
+        state = self.for_trip(trip_id)
+        if state is None:
+            return
+        if len(state.recent) == state.recent.maxlen:
+            state.complete = False
+        state.recent.append(point)
+        state.trip.total_distance_km = total
+
+    def set_total(self, trip_id: int, total: float):
+        """Overwrite a cached trip's total distance."""
+        state = self.for_trip(trip_id)
+        if state is not None:
+            state.trip.total_distance_km = total
+
+    def end(self, trip_id: int):
+        """Drop a stopped trip; its user has no active trip anymore."""
+        user_id = self._trip_users.get(trip_id)
+        if user_id is not None:
+            self.set_inactive(user_id)
+
+    def invalidate(self, trip_id: int):
+        """Forget a trip so the next lookup reloads it from the database."""
+        user_id = self._trip_users.get(trip_id)
+        if user_id is not None:
+            self._forget_user(user_id)
+
+    def clear(self):
+        self._users.clear()
+        self._trip_users.clear()
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._users),
+            "activeTrips": len(self._trip_users),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _store(self, user_id: int, state: Optional[LiveTrip]):
+        self._users[user_id] = state
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            _, evicted = self._users.popitem(last=False)
+            if evicted is not None:
+                self._trip_users.pop(evicted.trip.id, None)
+
+    def _forget_user(self, user_id: int):
+        state = self._users.pop(user_id, None)
+        if state is not None:
+            self._trip_users.pop(state.trip.id, None)
+
+
+# Global cache, disabled with LIVE_CACHE_ENABLED=false
+live_trips: Optional[LiveTripCache] = LiveTripCache() if LIVE_CACHE_ENABLED else None
@@ -1,10 +1,20 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-from .config import PORT, HOST
-from .database import init_database
-from .routes import auth, trips, fuel
+from .auth import token_cache, password_pool_stats, close_password_executor
+from .config import PORT, HOST, INGEST_MODE, METRICS_ENABLED
+from .database import init_database, open_pool, close_pool, get_pool
+from .events import trip_events
+from .ingest import start_point_writer, stop_point_writer, get_point_writer
+from . import limits
+from .live import live_trips
+from .metrics import MetricsMiddleware, register_gauge, registry
+from .profiler import ProfilerMiddleware, profiler
+from .stream import stream_stats
+from .thinning import point_filter
+from .routes import auth, trips, fuel, heatmap, admin
 
 
 @asynccontextmanager
@@ -12,9 +22,14 @@ async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     # Startup
     await init_database()
+    await open_pool()
+    if INGEST_MODE == "queued":
+        await start_point_writer()
     yield
     # Shutdown
-    pass
+    await stop_point_writer()
+    await close_pool()
+    close_password_executor()
 
 
 app = FastAPI(
@@ -24,6 +39,10 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Innermost, so profiled stacks start at the request handling itself
+if profiler is not None:
+    app.add_middleware(ProfilerMiddleware)
+
 # CORS middleware - allow all origins for mobile/LAN access
 app.add_middleware(
     CORSMiddleware,
@@ -33,18 +52,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    
+    def _pool_stat(key: str):
+        return lambda: pool.stats()[key] if (pool := get_pool()) else None
+    
+    register_gauge("db_pool_connections", "Open pooled connections.", _pool_stat("size"))
+    register_gauge("db_pool_in_use", "Pooled connections checked out.", _pool_stat("inUse"))
+    register_gauge("db_pool_checkouts_total", "Pool checkouts.", _pool_stat("checkouts"), kind="counter")
+    register_gauge("db_pool_waits_total", "Pool checkouts that had to wait.", _pool_stat("waits"), kind="counter")
+    register_gauge("db_pool_timeouts_total", "Pool checkouts that timed out.", _pool_stat("timeouts"), kind="counter")
+    register_gauge(
+        "ingest_queue_depth", "Points waiting for the queued writer.",
+        lambda: writer.stats()["queueDepth"] if (writer := get_point_writer()) else None
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of the in-process metrics."""
+    if not METRICS_ENABLED:
+        return PlainTextResponse("", status_code=404)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     import time
-    return {"status": "ok", "timestamp": int(time.time() * 1000)}
+    pool = get_pool()
+    writer = get_point_writer()
+    return {
+        "status": "ok",
+        "timestamp": int(time.time() * 1000),
+        "db": pool.stats() if pool else None,
+        "ingest": writer.stats() if writer else None,
+        "liveCache": live_trips.stats() if live_trips else None,
+        "pointFilter": point_filter.stats() if point_filter else None,
+        "stream": stream_stats.stats(),
+        "events": trip_events.stats() if trip_events else None,
+        "tokenCache": token_cache.stats() if token_cache else None,
+        "passwords": password_pool_stats(),
+        "rateLimits": limits.rate_limiter.stats() if limits.rate_limiter else None,
+        "admission": limits.admission.stats() if limits.admission else None,
+    }
 
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(trips.router)
 app.include_router(fuel.router)
+app.include_router(heatmap.router)
+app.include_router(admin.router)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -38,6 +38,16 @@ class TripPointCreate(BaseModel):
     lng: float
 
 
+class TripPointIn(BaseModel):
+    lat: float
+    lng: float
+    timestamp: Optional[datetime] = None
+
+
+class TripPointBatchCreate(BaseModel):
+    points: List[TripPointIn]
+
+
 class TripPoint(BaseModel):
     id: int
     trip_id: int
@@ -60,15 +70,60 @@ class TripResponse(BaseModel):
     trip: Trip
 
 
+class TripPage(BaseModel):
+    trips: List[Trip]
+    nextCursor: Optional[str] = None
+
+
+class TripGeometry(BaseModel):
+    tripId: int
+    toleranceM: float
+    points: List[List[float]]
+
+
+class TripSegment(BaseModel):
+    firstPointId: int
+    lastPointId: int
+    pointCount: int
+    lat: float
+    lng: float
+
+
+class TripSearchResult(BaseModel):
+    tripId: int
+    segments: List[TripSegment]
+
+
+class TripSearchResponse(BaseModel):
+    trips: List[TripSearchResult]
+
+
+class HeatmapTile(BaseModel):
+    z: int
+    x: int
+    y: int
+    cellBits: int
+    cells: List[int]
+
+
 class ActiveTripResponse(BaseModel):
     active: Optional[Trip]
     points: List[TripPoint] = []
 
 
 class PointAddedResponse(BaseModel):
+    # The last stored point when the point filter dropped the fix (kept=False)
     point: TripPoint
     distanceAdded: float
     total: float
+    kept: bool = True
+
+
+class PointsAddedResponse(BaseModel):
+    added: int
+    distanceAdded: float
+    total: float
+    dropped: int = 0
 
 
 # Fuel models
@@ -83,3 +138,12 @@ class FuelStats(BaseModel):
     projectedRangeKm: Optional[float]
     projectedDaysLeft: Optional[float]
     samples: int
+
+
+# Admin models
+class ProfileStart(BaseModel):
+    routes: List[str]
+    requests: int = 20
+    seconds: float = 60
+    # Below 1 ms the sampler thread all but busy-spins
+    intervalMs: Optional[float] = Field(None, ge=1, le=1000)
@@ -0,0 +1,188 @@
+"""
+On-demand sampling profiler for live requests, driven from /admin/profile.
+
+A session targets a set of route patterns for the next N matching requests or
+T seconds. While it runs, a sampler thread grabs the event loop thread's stack
+every PROFILER_INTERVAL_MS and keeps the samples that fall inside a targeted
+request, aggregated as collapsed stacks ("frame;frame;frame count", the input
+of flamegraph.pl and speedscope). Only time spent running on the event loop is
+sampled: awaits on the database threads or the password pool show up as the
+request not being on the stack at all. The sampler needs the GIL, so while
+the loop is busy it effectively samples every sys.getswitchinterval() (5 ms).
+
+Without a session the middleware is a single attribute check and no thread
+runs; PROFILER_ENABLED=false removes the middleware altogether.
+"""
+
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Sequence
+
+from .config import PROFILER_ENABLED, PROFILER_INTERVAL_MS, PROFILER_MAX_SECONDS, PROFILER_MAX_STACK
+
+
+def _route_regex(pattern: str) -> "re.Pattern":
+    """Match a path against a route template, "/trips/{trip_id}/geometry" style."""
+    parts = re.split(r"(\{[^}]+\})", pattern.rstrip("/") or "/")
+    return re.compile("".join("[^/]+" if p.startswith("{") else re.escape(p) for p in parts) + "/?")
+
+
+def _frame_label(code) -> str:
+    """"module/file.py:function" with library paths shortened after site-packages."""
+    filename = code.co_filename.replace("\\", "/")
+    if "site-packages/" in filename:
+        filename = filename.rsplit("site-packages/", 1)[1]
+    elif "/app/" in filename:
+        filename = "app/" + filename.rsplit("/app/", 1)[1]
+    else:
+        filename = filename.rsplit("/", 1)[-1]
+    return f"{filename}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class ProfileSession:
+    """One profiling run: which routes, for how long, and the samples so far."""
+
+    def __init__(self, routes: Sequence[str], max_requests: int, seconds: float, interval_ms: float):
+        self.routes = list(routes)
+        self._patterns = [_route_regex(r) for r in routes]
+        self.max_requests = max_requests
+        self.interval = interval_ms / 1000
+        self.started = time.monotonic()
+        self.deadline = self.started + seconds
+        self.requests = 0
+        self.in_flight = 0
+        self.ticks = 0
+        self.samples = 0
+        self.stopped: Optional[float] = None
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def matches(self, path: str) -> bool:
+        return any(p.fullmatch(path) for p in self._patterns)
+
+    def claim(self, path: str) -> bool:
+        """Count a request in if the session still wants it."""
+        if self.stopped is not None or self.requests >= self.max_requests or not self.matches(path):
+            return False
+        if time.monotonic() >= self.deadline:
+            return False
+        self.requests += 1
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    @property
+    def finished(self) -> bool:
+        if self.stopped is not None:
+            return True
+        if time.monotonic() >= self.deadline:
+            return True
+        return self.requests >= self.max_requests and self.in_flight == 0
+
+    def add(self, stack: str):
+        with self._lock:
+            self._stacks[stack] += 1
+            self.samples += 1
+
+    def stacks(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stacks)
+
+    def collapsed(self) -> str:
+        """Folded stacks, heaviest first."""
+        return "".join(f"{stack} {count}\n" for stack, count in
+                       sorted(self.stacks().items(), key=lambda item: item[1], reverse=True))
+
+    def status(self) -> dict:
+        end = self.stopped or min(time.monotonic(), self.deadline)
+        return {
+            "active": not self.finished,
+            "routes": self.routes,
+            "requests": self.requests,
+            "maxRequests": self.max_requests,
+            "elapsedS": round(end - self.started, 3),
+            "intervalMs": self.interval * 1000,
+            "ticks": self.ticks,
+            "samples": self.samples,
+        }
+
+
+class SamplingProfiler:
+    """Runs at most one session at a time with its own sampler thread."""
+
+    def __init__(self, max_stack: int = PROFILER_MAX_STACK):
+        self.max_stack = max_stack
+        self.session: Optional[ProfileSession] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def start(self, routes: Sequence[str], max_requests: int, seconds: float,
+              interval_ms: float = PROFILER_INTERVAL_MS) -> ProfileSession:
+        """Start a session; must be called on the event loop thread."""
+        if self.session is not None and not self.session.finished:
+            raise RuntimeError("a profiling session is already running")
+        session = ProfileSession(routes, max_requests, min(seconds, PROFILER_MAX_SECONDS), interval_ms)
+        self._loop_thread_id = threading.get_ident()
+        self.session = session
+        self._thread = threading.Thread(target=self._sample, args=(session,), name="profiler", daemon=True)
+        self._thread.start()
+        return session
+
+    def stop(self) -> Optional[ProfileSession]:
+        session = self.session
+        if session is not None and session.stopped is None:
+            session.stopped = time.monotonic()
+        return session
+
+    def _sample(self, session: ProfileSession):
+        marker = ProfilerMiddleware.profiled.__code__
+        while not session.finished:
+            time.sleep(session.interval)
+            frame = sys._current_frames().get(self._loop_thread_id)
+            session.ticks += 1
+            stack = []
+            inside = False
+            while frame is not None:
+                if frame.f_code is marker:
+                    inside = True
+                    break
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            del frame
+            # Only stacks running inside a targeted request count
+            if not inside or not stack:
+                continue
+            # Keep the frames nearest the request when the stack is too deep
+            stack = [_frame_label(code) for code in reversed(stack[-self.max_stack:])]
+            session.add(";".join(stack))
+        if session.stopped is None:
+            session.stopped = time.monotonic()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware marking targeted requests for the sampler."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        session = profiler.session
+        if session is None or scope["type"] != "http" or not session.claim(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.profiled(scope, receive, send)
+        finally:
+            session.release()
+
+    async def profiled(self, scope, receive, send):
+        # The sampler keeps the frames above this one
+        await self.app(scope, receive, send)
+
+
+profiler: Optional[SamplingProfiler] = SamplingProfiler() if PROFILER_ENABLED else None
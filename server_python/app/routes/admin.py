@@ -0,0 +1,87 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from ..auth import require_admin
+from ..config import PROFILER_INTERVAL_MS
+from ..models import ProfileStart
+from ..profiler import profiler
+from ..slowlog import slow_queries
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=200),
+    order: str = Query("totalMs", pattern="^(totalMs|maxMs|count)$"),
+):
+    """Slowest statements seen by this process, worst first.
+
+    Each entry aggregates one normalized statement: how often it went over
+    the threshold, total/max/last duration, its parameter types and its
+    EXPLAIN QUERY PLAN.
+    """
+    if slow_queries is None:
+        return {"enabled": False, "queries": []}
+    return {
+        "enabled": True,
+        "thresholdMs": slow_queries.threshold * 1000,
+        "slow": slow_queries.slow,
+        "queries": slow_queries.top(limit, order),
+    }
+
+
+@router.delete("/slow-queries")
+async def reset_slow_queries():
+    """Forget the slow queries recorded so far."""
+    if slow_queries is not None:
+        slow_queries.clear()
+    return {"ok": True}
+
+
+def _profiler():
+    if profiler is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "profiler_disabled"})
+    return profiler
+
+
+@router.post("/profile", status_code=status.HTTP_201_CREATED)
+async def start_profile(payload: ProfileStart):
+    """Sample the next `requests` requests to `routes` (templates such as
+    "/trips/{trip_id}/geometry"), for at most `seconds`."""
+    if not payload.routes or payload.requests < 1 or payload.seconds <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"error": "invalid_profile"})
+    try:
+        session = _profiler().start(
+            payload.routes, payload.requests, payload.seconds, payload.intervalMs or PROFILER_INTERVAL_MS
+        )
+    except RuntimeError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"error": "profile_running"})
+    return session.status()
+
+
+@router.get("/profile")
+async def get_profile():
+    """Status of the current (or last) session and its stacks with sample counts."""
+    session = _profiler().session
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "no_profile"})
+    return {**session.status(), "stacks": session.stacks()}
+
+
+@router.get("/profile/collapsed", response_class=PlainTextResponse)
+async def get_profile_collapsed():
+    """The session's samples as collapsed stacks, for flamegraph.pl or speedscope."""
+    session = _profiler().session
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "no_profile"})
+    return PlainTextResponse(session.collapsed())
+
+
+@router.delete("/profile")
+async def stop_profile():
+    """Stop the running session early; its samples stay available."""
+    session = _profiler().stop()
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={"error": "no_profile"})
+    return session.status()
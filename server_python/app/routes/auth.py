@@ -1,15 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 import aiosqlite
 
-from ..database import get_db
-from ..auth import hash_password, verify_password, create_access_token, get_current_user
+from ..database import db_connection, PoolTimeout
+from ..auth import (
+    hash_password_async, verify_password_async, create_access_token, get_current_user, PasswordPoolBusy
+)
 from ..models import UserCreate, TokenResponse, UserResponse, AuthUser
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _auth_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail={"error": "auth_busy"},
+        headers={"Retry-After": "1"},
+    )
+
+
+def _db_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail={"error": "db_busy"},
+        headers={"Retry-After": "1"},
+    )
+
+
+# bcrypt runs with no connection held: a burst of logins would otherwise take
+# every pooled connection for the length of a hash.
+
+
 @router.post("/signup", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
-async def signup(user_data: UserCreate, db: aiosqlite.Connection = Depends(get_db)):
+async def signup(user_data: UserCreate):
     """Register a new user."""
     if len(user_data.password) < 6:
         raise HTTPException(
@@ -17,20 +39,26 @@ async def signup(user_data: UserCreate, db: aiosqlite.Connection = Depends(get_d
             detail={"error": "validation", "details": [{"msg": "Password must be at least 6 characters"}]}
         )
     
-    password_hash = hash_password(user_data.password)
+    try:
+        password_hash = await hash_password_async(user_data.password)
+    except PasswordPoolBusy:
+        raise _auth_busy()
     
     try:
-        cursor = await db.execute(
-            "INSERT INTO users (email, password_hash) VALUES (?, ?)",
-            (user_data.email, password_hash)
-        )
-        await db.commit()
-        user_id = cursor.lastrowid
+        async with db_connection() as db:
+            cursor = await db.execute(
+                "INSERT INTO users (email, password_hash) VALUES (?, ?)",
+                (user_data.email, password_hash)
+            )
+            await db.commit()
+            user_id = cursor.lastrowid
     except aiosqlite.IntegrityError:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail={"error": "email_taken"}
         )
+    except PoolTimeout:
+        raise _db_busy()
     
     token = create_access_token(user_id, user_data.email)
     return TokenResponse(
@@ -40,15 +68,24 @@ async def signup(user_data: UserCreate, db: aiosqlite.Connection = Depends(get_d
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(user_data: UserCreate, db: aiosqlite.Connection = Depends(get_db)):
+async def login(user_data: UserCreate):
     """Login an existing user."""
-    async with db.execute(
-        "SELECT id, email, password_hash FROM users WHERE email = ?",
-        (user_data.email,)
-    ) as cursor:
-        row = await cursor.fetchone()
+    try:
+        async with db_connection() as db:
+            async with db.execute(
+                "SELECT id, email, password_hash FROM users WHERE email = ?",
+                (user_data.email,)
+            ) as cursor:
+                row = await cursor.fetchone()
+    except PoolTimeout:
+        raise _db_busy()
+    
+    try:
+        valid = row is not None and await verify_password_async(user_data.password, row["password_hash"])
+    except PasswordPoolBusy:
+        raise _auth_busy()
     
-    if not row or not verify_password(user_data.password, row["password_hash"]):
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail={"error": "invalid_credentials"}
@@ -2,9 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 import aiosqlite
 
 from ..database import get_db
-from ..auth import get_current_user
+from ..limits import limit as rate_limit
 from ..models import AuthUser, FuelSnapshotCreate, FuelStats
-from ..calc import compute_consumption_stats, record_fuel_snapshot
+from ..calc import get_consumption_stats, record_fuel_snapshot
 
 router = APIRouter(prefix="/fuel", tags=["fuel"])
 
@@ -12,7 +12,7 @@ router = APIRouter(prefix="/fuel", tags=["fuel"])
 @router.post("/snapshot", status_code=status.HTTP_201_CREATED)
 async def create_snapshot(
     snapshot_data: FuelSnapshotCreate,
-    current_user: AuthUser = Depends(get_current_user),
+    current_user: AuthUser = Depends(rate_limit("ingest")),
     db: aiosqlite.Connection = Depends(get_db)
 ):
     """Record a fuel snapshot."""
@@ -28,9 +28,9 @@ async def create_snapshot(
 
 @router.get("/stats", response_model=FuelStats)
 async def get_stats(
-    current_user: AuthUser = Depends(get_current_user),
+    current_user: AuthUser = Depends(rate_limit("stats")),
     db: aiosqlite.Connection = Depends(get_db)
 ):
     """Get fuel consumption statistics."""
-    stats = await compute_consumption_stats(db, current_user.id)
+    stats = await get_consumption_stats(db, current_user.id)
     return stats
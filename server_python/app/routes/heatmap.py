@@ -0,0 +1,49 @@
+import hashlib
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+import aiosqlite
+
+from ..config import HEATMAP_MIN_ZOOM, HEATMAP_MAX_ZOOM, HEATMAP_CELL_BITS, HEATMAP_CACHE_MAX_AGE
+from ..database import get_db
+from ..limits import limit as rate_limit
+from ..heatmap import get_heatmap_tile
+from ..models import AuthUser, HeatmapTile
+
+router = APIRouter(prefix="/heatmap", tags=["heatmap"])
+
+
+@router.get("/{z}/{x}/{y}", response_model=HeatmapTile)
+async def get_tile(
+    z: int,
+    x: int,
+    y: int,
+    if_none_match: Optional[str] = Header(None),
+    # A map pan fetches a dozen tiles at once: they get their own, larger bucket
+    current_user: AuthUser = Depends(rate_limit("tiles")),
+    db: aiosqlite.Connection = Depends(get_db)
+):
+    """Get one heatmap tile of the current user's finished trips.
+
+    `cells` is a flat [x, y, count, ...] list of the non-empty cells of a
+    2^cellBits square grid over the tile, with x/y relative to the tile.
+    """
+    if z < HEATMAP_MIN_ZOOM or z > HEATMAP_MAX_ZOOM:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "zoom_out_of_range", "minZoom": HEATMAP_MIN_ZOOM, "maxZoom": HEATMAP_MAX_ZOOM}
+        )
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "tile_not_found"}
+        )
+    
+    cells = await get_heatmap_tile(db, current_user.id, z, x, y)
+    body = HeatmapTile(z=z, x=x, y=y, cellBits=HEATMAP_CELL_BITS, cells=cells).model_dump_json().encode()
+    headers = {
+        "Cache-Control": f"private, max-age={HEATMAP_CACHE_MAX_AGE}",
+        "ETag": '"' + hashlib.sha1(body).hexdigest() + '"',
+    }
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
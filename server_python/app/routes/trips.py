@@ -1,21 +1,133 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import Response
+import asyncio
+import json
+import zlib
+from datetime import date, timedelta
+from typing import AsyncIterator, List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, WebSocket, status
+from fastapi.responses import StreamingResponse
 import aiosqlite
 
-from ..database import get_db
-from ..auth import get_current_user
+from ..config import (
+    EVENTS_HEARTBEAT_S, MAX_POINTS_PER_BATCH, TRIPS_PAGE_DEFAULT, TRIPS_PAGE_MAX, SEARCH_MAX_TRIPS, SEARCH_MAX_RADIUS_M
+)
+from ..database import get_db, db_connection, PoolTimeout
+from ..auth import get_stream_user
+from ..limits import limit as rate_limit
+from ..events import trip_events
+from ..ingest import ingest_point, ingest_points, IngestQueueFull
+from ..jobs import process_finished_trip
+from ..simplify import load_trip_geometry
+from ..spatial import search_bbox, search_near
+from ..stream import handle_point_stream
 from ..models import (
-    AuthUser, TripCreate, TripStop, TripPointCreate,
-    TripResponse, ActiveTripResponse, PointAddedResponse
+    AuthUser, TripCreate, TripStop, TripPointCreate, TripPointBatchCreate,
+    TripResponse, TripPage, TripGeometry, TripSearchResponse, ActiveTripResponse, PointAddedResponse, PointsAddedResponse
+)
+from ..trips import (
+    get_active_trip, get_trip, start_trip, stop_trip, list_trip_points,
+    list_trips, iter_trips_csv, decode_trip_cursor
 )
-from ..trips import get_active_trip, start_trip, add_point, stop_trip, list_trip_points, get_all_trips, convert_trips_to_csv
 
 router = APIRouter(prefix="/trips", tags=["trips"])
 
 
+@router.get("", response_model=TripPage)
+async def get_trips(
+    limit: int = TRIPS_PAGE_DEFAULT,
+    cursor: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    minDistanceKm: Optional[float] = None,
+    maxDistanceKm: Optional[float] = None,
+    current_user: AuthUser = Depends(rate_limit("read")),
+    db: aiosqlite.Connection = Depends(get_db)
+):
+    """List the current user's trips, newest first, one keyset page at a time.
+
+    Pass the returned `nextCursor` as `cursor` to get the following page.
+    """
+    if limit < 1 or limit > TRIPS_PAGE_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "validation", "details": [{"msg": f"limit must be between 1 and {TRIPS_PAGE_MAX}"}]}
+        )
+    if cursor is not None and decode_trip_cursor(cursor) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "validation", "details": [{"msg": "invalid cursor"}]}
+        )
+    
+    trips, next_cursor = await list_trips(
+        db, current_user.id, limit, cursor,
+        start=start.isoformat() if start else None,
+        end=(end + timedelta(days=1)).isoformat() if end else None,
+        min_distance=minDistanceKm,
+        max_distance=maxDistanceKm,
+    )
+    return TripPage(trips=trips, nextCursor=next_cursor)
+
+
+def _parse_floats(value: str, count: int, name: str) -> List[float]:
+    try:
+        values = [float(v) for v in value.split(",")]
+    except ValueError:
+        values = []
+    if len(values) != count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "validation", "details": [{"msg": f"{name} must be {count} comma-separated numbers"}]}
+        )
+    return values
+
+
+@router.get("/search", response_model=TripSearchResponse)
+async def search_trips(
+    bbox: Optional[str] = None,
+    near: Optional[str] = None,
+    radius: float = 500,
+    limit: int = SEARCH_MAX_TRIPS,
+    current_user: AuthUser = Depends(rate_limit("read")),
+    db: aiosqlite.Connection = Depends(get_db)
+):
+    """Find the current user's trips passing through an area.
+
+    Either `bbox=minLng,minLat,maxLng,maxLat` or `near=lat,lng` with `radius`
+    in meters. Each trip lists its runs of consecutive points inside the area.
+    """
+    if (bbox is None) == (near is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "validation", "details": [{"msg": "pass exactly one of bbox or near"}]}
+        )
+    if limit < 1 or limit > SEARCH_MAX_TRIPS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "validation", "details": [{"msg": f"limit must be between 1 and {SEARCH_MAX_TRIPS}"}]}
+        )
+    
+    if bbox is not None:
+        min_lng, min_lat, max_lng, max_lat = _parse_floats(bbox, 4, "bbox")
+        if min_lng > max_lng or min_lat > max_lat:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "validation", "details": [{"msg": "bbox must be minLng,minLat,maxLng,maxLat"}]}
+            )
+        trips = await search_bbox(db, current_user.id, (min_lng, min_lat, max_lng, max_lat), limit)
+    else:
+        lat, lng = _parse_floats(near, 2, "near")
+        if radius <= 0 or radius > SEARCH_MAX_RADIUS_M:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "validation", "details": [{"msg": f"radius must be between 0 and {SEARCH_MAX_RADIUS_M:g} meters"}]}
+            )
+        trips = await search_near(db, current_user.id, lat, lng, radius, limit)
+    
+    return TripSearchResponse(trips=trips)
+
+
 @router.get("/active", response_model=ActiveTripResponse)
 async def get_active(
-    current_user: AuthUser = Depends(get_current_user),
+    current_user: AuthUser = Depends(rate_limit("read")),
     db: aiosqlite.Connection = Depends(get_db)
 ):
     """Get the active trip for the current user."""
@@ -28,10 +140,81 @@ async def get_active(
     return ActiveTripResponse(active=trip, points=points)
 
 
+@router.get("/active/events")
+async def get_active_events(current_user: AuthUser = Depends(get_stream_user)):
+    """Server-sent events for the current user's live trips.
+
+    Starts with a `snapshot` (same body as GET /trips/active), then sends
+    `start`, `point`, `points` and `stop` events as they happen. Browsers can
+    pass the token as `?token=` since EventSource can't set headers.
+    """
+    if trip_events is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "events_disabled"}
+        )
+    return StreamingResponse(
+        _trip_event_stream(current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def _trip_event_stream(user_id: int) -> AsyncIterator[str]:
+    # Subscribe before the snapshot so nothing published in between is missed
+    subscription = trip_events.subscribe(user_id)
+    try:
+        async with db_connection() as db:
+            trip = await get_active_trip(db, user_id)
+            points = await list_trip_points(db, trip.id, 50) if trip else []
+        yield _sse("snapshot", ActiveTripResponse(active=trip, points=points).model_dump())
+        
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.get(), EVENTS_HEARTBEAT_S)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                # Fell too far behind; the client reconnects and gets a fresh snapshot
+                yield _sse("lagged", {})
+                return
+            yield _sse(*item)
+    finally:
+        trip_events.unsubscribe(subscription)
+
+
+@router.get("/{trip_id}/geometry", response_model=TripGeometry)
+async def get_geometry(
+    trip_id: int,
+    zoom: float = Query(14, ge=0, le=22),
+    current_user: AuthUser = Depends(rate_limit("read")),
+    db: aiosqlite.Connection = Depends(get_db)
+):
+    """Get a trip's route simplified for a map zoom level."""
+    trip = await get_trip(db, current_user.id, trip_id)
+    if not trip:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "trip_not_found"}
+        )
+    
+    tolerance, lats, lngs = await load_trip_geometry(db, trip_id, zoom)
+    return TripGeometry(
+        tripId=trip_id,
+        toleranceM=tolerance,
+        points=[[lat, lng] for lat, lng in zip(lats, lngs)]
+    )
+
+
 @router.post("/start", response_model=TripResponse, status_code=status.HTTP_201_CREATED)
 async def start_new_trip(
     trip_data: TripCreate = TripCreate(),
-    current_user: AuthUser = Depends(get_current_user),
+    current_user: AuthUser = Depends(rate_limit("ingest")),
     db: aiosqlite.Connection = Depends(get_db)
 ):
     """Start a new trip."""
@@ -49,10 +232,13 @@ async def start_new_trip(
 @router.post("/point", response_model=PointAddedResponse)
 async def add_trip_point(
     point_data: TripPointCreate,
-    current_user: AuthUser = Depends(get_current_user),
-    db: aiosqlite.Connection = Depends(get_db)
+    current_user: AuthUser = Depends(rate_limit("ingest"))
 ):
-    """Add a point to the active trip."""
+    """Add a point to the active trip.
+
+    Takes no request-long connection: in queued mode the wait for the group
+    commit must not hold one of the pool's connections.
+    """
     if point_data.lat < -90 or point_data.lat > 90:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -64,6 +250,66 @@ async def add_trip_point(
             detail={"error": "validation", "details": [{"msg": "lng must be between -180 and 180"}]}
         )
     
+    try:
+        async with db_connection() as db:
+            trip = await get_active_trip(db, current_user.id)
+        if not trip:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={"error": "no_active_trip"}
+            )
+        point, distance_added, total, kept = await ingest_point(
+            trip.id, point_data.lat, point_data.lng, current_user.id
+        )
+    except IngestQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"error": "ingest_busy"},
+            headers={"Retry-After": "1"},
+        )
+    except PoolTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"error": "db_busy"},
+            headers={"Retry-After": "1"},
+        )
+    return PointAddedResponse(point=point, distanceAdded=distance_added, total=total, kept=kept)
+
+
+@router.websocket("/stream")
+async def stream_points(websocket: WebSocket):
+    """Stream fixes for the active trip over one authenticated WebSocket.
+
+    Connect with `?token=<jwt>` (or an Authorization header), then send
+    {"lat", "lng", "seq"} messages; each gets an ack or error echoing `seq`.
+    """
+    await handle_point_stream(websocket)
+
+
+@router.post("/points", response_model=PointsAddedResponse)
+async def add_trip_points(
+    batch: TripPointBatchCreate,
+    current_user: AuthUser = Depends(rate_limit("ingest")),
+    db: aiosqlite.Connection = Depends(get_db)
+):
+    """Add a batch of buffered points to the active trip."""
+    if not batch.points or len(batch.points) > MAX_POINTS_PER_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "validation", "details": [{"msg": f"points must contain between 1 and {MAX_POINTS_PER_BATCH} items"}]}
+        )
+    for point in batch.points:
+        if point.lat < -90 or point.lat > 90:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "validation", "details": [{"msg": "lat must be between -90 and 90"}]}
+            )
+        if point.lng < -180 or point.lng > 180:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "validation", "details": [{"msg": "lng must be between -180 and 180"}]}
+            )
+    
     trip = await get_active_trip(db, current_user.id)
     if not trip:
         raise HTTPException(
@@ -71,14 +317,16 @@ async def add_trip_point(
             detail={"error": "no_active_trip"}
         )
     
-    point, distance_added, total = await add_point(db, trip.id, point_data.lat, point_data.lng)
-    return PointAddedResponse(point=point, distanceAdded=distance_added, total=total)
+    points = [(p.lat, p.lng, p.timestamp) for p in batch.points]
+    added, dropped, distance_added, total = await ingest_points(db, trip.id, points, current_user.id)
+    return PointsAddedResponse(added=added, distanceAdded=distance_added, total=total, dropped=dropped)
 
 
 @router.post("/stop", response_model=TripResponse)
 async def stop_active_trip(
+    background_tasks: BackgroundTasks,
     trip_data: TripStop = TripStop(),
-    current_user: AuthUser = Depends(get_current_user),
+    current_user: AuthUser = Depends(rate_limit("ingest")),
     db: aiosqlite.Connection = Depends(get_db)
 ):
     """Stop the active trip."""
@@ -90,20 +338,38 @@ async def stop_active_trip(
         )
     
     updated = await stop_trip(db, trip.id, trip_data.finalFuelLiters)
+    background_tasks.add_task(process_finished_trip, updated.id)
     return TripResponse(trip=updated)
 
 
 @router.get("/export/csv")
 async def export_trips_csv(
-    current_user: AuthUser = Depends(get_current_user),
-    db: aiosqlite.Connection = Depends(get_db)
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    gzip: bool = False,
+    current_user: AuthUser = Depends(rate_limit("export")),
 ):
-    """Export all trips for the current user as CSV."""
-    trips = await get_all_trips(db, current_user.id)
-    csv_content = convert_trips_to_csv(trips)
-    
-    return Response(
-        content=csv_content,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=trips.csv"}
+    """Stream the current user's trips as CSV, optionally filtered by start date and gzipped.
+
+    `start` and `end` are inclusive calendar days matched against started_at.
+    """
+    chunks = iter_trips_csv(
+        current_user.id,
+        start=start.isoformat() if start else None,
+        end=(end + timedelta(days=1)).isoformat() if end else None,
     )
+    headers = {"Content-Disposition": "attachment; filename=trips.csv"}
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    
+    return StreamingResponse(chunks, media_type="text/csv", headers=headers)
+
+
+async def _gzip_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
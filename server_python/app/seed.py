@@ -0,0 +1,192 @@
+"""
+Synthetic dataset generator for scale testing (python -m app.cli seed).
+
+Users live around a handful of Spanish cities and drive finished trips back
+to back: a fix every FIX_INTERVAL_S seconds along a random walk with smooth
+heading changes and road speeds, fuel burnt at a per-user rate and refilled
+when low, and fuel snapshots taken after random trips.
+
+Loading is synchronous sqlite3 with bulk executemany inserts and explicit
+ids. The trip_points indexes and trip_bounds trigger are dropped for the load
+and recreated from their own schema afterwards, each trip's box is inserted
+directly from its walk, and journaling/sync are off until the load finishes, so
+a crash mid-load can leave the file unusable: seed a scratch database.
+Output depends only on the seed (and on whether NumPy is available).
+"""
+
+import math
+import random
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from .auth import hash_password
+from .calc import NUMPY_AVAILABLE, segment_distances_km
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+FIX_INTERVAL_S = 5
+SEED_PASSWORD = "seed-password"
+TANK_LITERS = 50.0
+CITIES = (
+    (40.4168, -3.7038),  # Madrid
+    (41.3874, 2.1686),   # Barcelona
+    (39.4699, -0.3763),  # Valencia
+    (37.3891, -5.9845),  # Sevilla
+    (43.2630, -2.9350),  # Bilbao
+)
+
+
+def _walk_python(rng: random.Random, lat: float, lng: float, n: int) -> Tuple[List[float], List[float]]:
+    lats, lngs = [], []
+    heading = rng.uniform(0, 2 * math.pi)
+    speed = rng.uniform(30, 90)
+    for _ in range(n):
+        lats.append(lat)
+        lngs.append(lng)
+        heading += rng.gauss(0, 0.15)
+        speed = min(120.0, max(5.0, speed + rng.gauss(0, 4)))
+        km = speed * FIX_INTERVAL_S / 3600
+        lat += km / 111.32 * math.cos(heading)
+        lng += km / (111.32 * math.cos(math.radians(lat))) * math.sin(heading)
+    return lats, lngs
+
+
+def _walk_numpy(gen, lat: float, lng: float, n: int) -> Tuple[List[float], List[float]]:
+    heading = gen.uniform(0, 2 * math.pi) + np.cumsum(gen.normal(0, 0.15, n))
+    speed = np.clip(gen.uniform(30, 90) + np.cumsum(gen.normal(0, 4, n)), 5, 120)
+    km = speed * FIX_INTERVAL_S / 3600
+    d_lat = km / 111.32 * np.cos(heading)
+    d_lng = km / (111.32 * math.cos(math.radians(lat))) * np.sin(heading)
+    lats = lat + np.concatenate(([0.0], np.cumsum(d_lat[:-1])))
+    lngs = lng + np.concatenate(([0.0], np.cumsum(d_lng[:-1])))
+    return lats.tolist(), lngs.tolist()
+
+
+def _next_id(conn: sqlite3.Connection, table: str) -> int:
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+
+
+def seed_database(
+    db_path: str,
+    users: int,
+    trips_per_user: int,
+    points_per_trip: int,
+    snapshots_per_user: int,
+    seed: int = 1,
+    start: datetime = datetime(2024, 1, 1, tzinfo=timezone.utc),
+    spatial_index: bool = True,
+    batch_points: int = 200_000,
+) -> Dict[str, int]:
+    """Append a synthetic dataset to an initialized database; returns row counts.
+
+    Users are "user<id>@seed.example" with password SEED_PASSWORD.
+    """
+    rng = random.Random(seed)
+    gen = np.random.default_rng(seed) if NUMPY_AVAILABLE else None
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")
+    conn.execute("PRAGMA foreign_keys = OFF")
+
+    # Indexes and triggers on trip_points are rebuilt once at the end
+    deferred = conn.execute(
+        """SELECT type, name, sql FROM sqlite_master
+           WHERE tbl_name = 'trip_points' AND type IN ('index', 'trigger') AND sql IS NOT NULL"""
+    ).fetchall()
+    for kind, name, _ in deferred:
+        conn.execute(f"DROP {kind.upper()} {name}")
+
+    password_hash = hash_password(SEED_PASSWORD)
+    user_id, trip_id, point_id = _next_id(conn, "users"), _next_id(conn, "trips"), _next_id(conn, "trip_points")
+    first_user = user_id
+    counts = {"users": 0, "trips": 0, "points": 0, "snapshots": 0}
+    walk = _walk_numpy if NUMPY_AVAILABLE else _walk_python
+    walk_rng = gen if NUMPY_AVAILABLE else rng
+    start_ts = int(start.timestamp())
+    started = time.perf_counter()
+
+    user_rows, trip_rows, point_rows, bounds_rows, snapshot_rows = [], [], [], [], []
+
+    def flush():
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO users (id, email, password_hash) VALUES (?, ?, ?)", user_rows)
+        conn.executemany(
+            """INSERT INTO trips (id, user_id, started_at, ended_at, initial_fuel_liters, final_fuel_liters,
+                                  total_distance_km)
+               VALUES (?, ?, datetime(?, 'unixepoch'), datetime(?, 'unixepoch'), ?, ?, ?)""",
+            trip_rows
+        )
+        conn.executemany(
+            "INSERT INTO trip_points (id, trip_id, timestamp, lat, lng) VALUES (?, ?, datetime(?, 'unixepoch'), ?, ?)",
+            point_rows
+        )
+        conn.executemany(
+            """INSERT INTO trip_bounds (trip_id, user_id, min_lat, max_lat, min_lng, max_lng)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            bounds_rows
+        )
+        conn.executemany(
+            "INSERT INTO fuel_snapshots (user_id, timestamp, fuel_liters) VALUES (?, datetime(?, 'unixepoch'), ?)",
+            snapshot_rows
+        )
+        conn.execute("COMMIT")
+        for rows in (user_rows, trip_rows, point_rows, bounds_rows, snapshot_rows):
+            rows.clear()
+
+    for _ in range(users):
+        city_lat, city_lng = rng.choice(CITIES)
+        home = (city_lat + rng.gauss(0, 0.08), city_lng + rng.gauss(0, 0.08))
+        per_100km = rng.uniform(5.0, 9.0)
+        fuel = rng.uniform(15, TANK_LITERS)
+        clock = start_ts + rng.randrange(0, 86400)
+        snapshot_after = set(rng.sample(range(trips_per_user), min(snapshots_per_user, trips_per_user)))
+        user_rows.append((user_id, f"user{user_id}@seed.example", password_hash))
+
+        for t in range(trips_per_user):
+            origin = (home[0] + rng.gauss(0, 0.02), home[1] + rng.gauss(0, 0.02))
+            lats, lngs = walk(walk_rng, origin[0], origin[1], points_per_trip)
+            distance = sum(segment_distances_km(lats, lngs))
+            initial = round(fuel, 2)
+            fuel = max(0.0, fuel - distance * per_100km / 100)
+            duration = (points_per_trip - 1) * FIX_INTERVAL_S
+            trip_rows.append((trip_id, user_id, clock, clock + duration, initial, round(fuel, 2), distance))
+
+            for i, (lat, lng) in enumerate(zip(lats, lngs)):
+                point_rows.append((point_id + i, trip_id, clock + i * FIX_INTERVAL_S, lat, lng))
+            if spatial_index:
+                bounds_rows.append((trip_id, user_id, min(lats), max(lats), min(lngs), max(lngs)))
+            point_id += len(lats)
+
+            clock += duration + rng.randrange(3600, 3 * 86400)
+            if fuel < 10:
+                fuel = TANK_LITERS
+            if t in snapshot_after:
+                snapshot_rows.append((user_id, clock - 600, round(fuel, 2)))
+                counts["snapshots"] += 1
+            trip_id += 1
+            counts["trips"] += 1
+            counts["points"] += len(lats)
+            if len(point_rows) >= batch_points:
+                flush()
+                elapsed = time.perf_counter() - started
+                print(f"  {counts['points']:,} points ({counts['points'] / elapsed:,.0f}/s)", flush=True)
+
+        user_id += 1
+        counts["users"] += 1
+
+    flush()
+    print("  rebuilding trip_points indexes...", flush=True)
+    for _, _, sql in deferred:
+        conn.execute(sql)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA locking_mode = NORMAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+    counts["firstUser"] = first_user
+    return counts
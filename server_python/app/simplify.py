@@ -0,0 +1,197 @@
+"""
+Douglas-Peucker simplification of trip geometries at several tolerances.
+
+A single pass computes, for every point, the largest tolerance at which
+Douglas-Peucker would still keep it (its "significance"). Each stored level is
+then just the points whose significance exceeds that level's tolerance, which
+is exactly what a separate Douglas-Peucker run at that tolerance would return.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+import aiosqlite
+
+from .calc import EARTH_RADIUS_KM, NUMPY_AVAILABLE
+from .config import SIMPLIFY_TOLERANCES_M
+from .metrics import timed
+from .tracks import encode_coordinates, decode_coordinates
+from .trips import load_trip_coordinates
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+# Web Mercator ground resolution at the equator for zoom 0, in meters per pixel
+METERS_PER_PIXEL_Z0 = 156543.03
+
+
+def _project(lats: Sequence[float], lngs: Sequence[float]):
+    """Equirectangular projection to local meters around the route's mean latitude."""
+    r = EARTH_RADIUS_KM * 1000
+    if NUMPY_AVAILABLE:
+        lat = np.radians(np.asarray(lats, dtype=np.float64))
+        lng = np.radians(np.asarray(lngs, dtype=np.float64))
+        return lng * math.cos(float(lat.mean())) * r, lat * r
+    
+    k = math.cos(math.radians(sum(lats) / len(lats)))
+    return [math.radians(v) * k * r for v in lngs], [math.radians(v) * r for v in lats]
+
+
+def _max_offset(x, y, first: int, last: int) -> Tuple[int, float]:
+    """Farthest point strictly between `first` and `last` from their chord."""
+    if NUMPY_AVAILABLE:
+        px = x[first + 1:last]
+        py = y[first + 1:last]
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            dist = np.hypot(px - x[first], py - y[first])
+        else:
+            dist = np.abs(dy * (px - x[first]) - dx * (py - y[first])) / length
+        i = int(np.argmax(dist))
+        return first + 1 + i, float(dist[i])
+    
+    dx = x[last] - x[first]
+    dy = y[last] - y[first]
+    length = math.hypot(dx, dy)
+    best, best_dist = first + 1, -1.0
+    for i in range(first + 1, last):
+        if length == 0:
+            dist = math.hypot(x[i] - x[first], y[i] - y[first])
+        else:
+            dist = abs(dy * (x[i] - x[first]) - dx * (y[i] - y[first])) / length
+        if dist > best_dist:
+            best, best_dist = i, dist
+    return best, best_dist
+
+
+def significance(lats: Sequence[float], lngs: Sequence[float], min_tolerance_m: float = 0.0) -> List[float]:
+    """Largest Douglas-Peucker tolerance (meters) at which each point is kept.
+
+    Endpoints are always kept (infinite significance). Points below
+    `min_tolerance_m` are not refined further and get 0.
+    """
+    n = len(lats)
+    result = [0.0] * n
+    if n == 0:
+        return result
+    result[0] = result[-1] = math.inf
+    if n < 3:
+        return result
+    
+    x, y = _project(lats, lngs)
+    stack = [(0, n - 1, math.inf)]
+    while stack:
+        first, last, parent = stack.pop()
+        if last - first < 2:
+            continue
+        index, dist = _max_offset(x, y, first, last)
+        if dist <= min_tolerance_m:
+            continue
+        # A point can never outlive the split that exposed it
+        result[index] = min(dist, parent)
+        stack.append((first, index, result[index]))
+        stack.append((index, last, result[index]))
+    return result
+
+
+def simplify(lats: Sequence[float], lngs: Sequence[float], tolerance_m: float) -> Tuple[List[float], List[float]]:
+    """Douglas-Peucker simplification of a polyline at one tolerance."""
+    sig = significance(lats, lngs, tolerance_m)
+    keep = [i for i, s in enumerate(sig) if s > tolerance_m]
+    return [lats[i] for i in keep], [lngs[i] for i in keep]
+
+
+def simplify_levels(
+    lats: Sequence[float],
+    lngs: Sequence[float],
+    tolerances_m: Sequence[float] = SIMPLIFY_TOLERANCES_M
+) -> Dict[float, Tuple[List[float], List[float]]]:
+    """Simplify a polyline at every tolerance in one pass."""
+    if not tolerances_m:
+        return {}
+    sig = significance(lats, lngs, min(tolerances_m))
+    levels = {}
+    for tol in tolerances_m:
+        keep = [i for i, s in enumerate(sig) if s > tol]
+        levels[tol] = ([lats[i] for i in keep], [lngs[i] for i in keep])
+    return levels
+
+
+def tolerance_for_zoom(zoom: float, lat: float) -> float:
+    """Ground size of one map pixel at a zoom level and latitude, in meters."""
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+async def store_trip_levels(
+    db: aiosqlite.Connection,
+    trip_id: int,
+    levels: Dict[float, Tuple[List[float], List[float]]]
+):
+    """Replace a trip's stored simplified geometries (does not commit)."""
+    await db.execute("DELETE FROM trip_simplified WHERE trip_id = ?", (trip_id,))
+    await db.executemany(
+        "INSERT INTO trip_simplified (trip_id, tolerance_m, point_count, data) VALUES (?, ?, ?, ?)",
+        [
+            (trip_id, tol, len(lats), encode_coordinates(lats, lngs))
+            for tol, (lats, lngs) in levels.items()
+        ]
+    )
+
+
+@timed("simplify_trip")
+async def simplify_trip(db: aiosqlite.Connection, trip_id: int) -> int:
+    """Compute and store every simplification level of a trip (does not commit).
+
+    Returns the number of source points.
+    """
+    lats, lngs = await load_trip_coordinates(db, trip_id)
+    if not lats:
+        return 0
+    await store_trip_levels(db, trip_id, simplify_levels(lats, lngs))
+    return len(lats)
+
+
+async def load_trip_level(
+    db: aiosqlite.Connection, trip_id: int, max_tolerance_m: float
+) -> Optional[Tuple[float, List[float], List[float]]]:
+    """Load the coarsest stored level whose tolerance does not exceed `max_tolerance_m`.
+
+    Returns (tolerance, lats, lngs), or None if no stored level is fine enough.
+    """
+    async with db.execute(
+        """SELECT tolerance_m, data FROM trip_simplified
+           WHERE trip_id = ? AND tolerance_m <= ?
+           ORDER BY tolerance_m DESC LIMIT 1""",
+        (trip_id, max_tolerance_m)
+    ) as cursor:
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+    lats, lngs = decode_coordinates(row["data"])
+    return row["tolerance_m"], lats, lngs
+
+
+@timed("load_trip_geometry")
+async def load_trip_geometry(
+    db: aiosqlite.Connection, trip_id: int, zoom: float
+) -> Tuple[float, List[float], List[float]]:
+    """Trip geometry detailed enough for a map zoom level.
+
+    Uses the stored levels when present, otherwise simplifies the full
+    geometry on the fly (active trips, or trips not processed yet).
+    """
+    # The coarsest level is tiny and gives the latitude for the pixel size
+    coarse = await load_trip_level(db, trip_id, math.inf)
+    if coarse is not None:
+        tolerance = tolerance_for_zoom(zoom, coarse[1][0])
+        level = await load_trip_level(db, trip_id, tolerance)
+        if level is not None:
+            return level
+    
+    lats, lngs = await load_trip_coordinates(db, trip_id)
+    if not lats:
+        return 0.0, [], []
+    tolerance = tolerance_for_zoom(zoom, lats[0])
+    lats, lngs = simplify(lats, lngs, tolerance)
+    return tolerance, lats, lngs
@@ -0,0 +1,97 @@
+"""
+Slow-query log for statements run through TrackedConnection (database.py).
+
+Statements slower than SLOW_QUERY_MS are logged with their normalized SQL, the
+shape of their parameters, the duration and the EXPLAIN QUERY PLAN output,
+and aggregated per normalized statement so GET /admin/slow-queries can show
+the worst offenders. Plans are captured once per statement and reused.
+"""
+
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import SLOW_QUERY_MS, SLOW_QUERY_MAX_ENTRIES
+
+logger = logging.getLogger("gastracker.slowquery")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+# Statements EXPLAIN QUERY PLAN can describe
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and replace inline literals with `?`."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def params_shape(parameters: Any, many: bool = False) -> str:
+    """Types of the bound parameters, e.g. "(int, str, NoneType)" or "120 x (int, float)"."""
+    if many:
+        rows = parameters if isinstance(parameters, list) else list(parameters or [])
+        return f"{len(rows)} x {params_shape(rows[0]) if rows else '()'}"
+    if not parameters:
+        return "()"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+
+
+def is_explainable(sql: str) -> bool:
+    return sql.lstrip().upper().startswith(_EXPLAINABLE)
+
+
+class SlowQueryLog:
+    """Per-statement aggregates of slow queries, bounded to `max_entries` statements."""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, max_entries: int = SLOW_QUERY_MAX_ENTRIES):
+        self.threshold = threshold_ms / 1000
+        self.max_entries = max_entries
+        self._entries: Dict[str, dict] = {}
+        self.slow = 0
+
+    def has_plan(self, normalized: str) -> bool:
+        entry = self._entries.get(normalized)
+        return entry is not None and entry["plan"] is not None
+
+    def record(self, normalized: str, shape: str, duration: float, plan: Optional[List[str]]):
+        self.slow += 1
+        entry = self._entries.get(normalized)
+        if entry is None:
+            if len(self._entries) >= self.max_entries:
+                # Make room by forgetting the statement with the least total time
+                del self._entries[min(self._entries, key=lambda k: self._entries[k]["totalMs"])]
+            entry = self._entries[normalized] = {
+                "sql": normalized, "count": 0, "totalMs": 0.0, "maxMs": 0.0, "plan": None,
+            }
+        ms = duration * 1000
+        entry["count"] += 1
+        entry["totalMs"] += ms
+        entry["maxMs"] = max(entry["maxMs"], ms)
+        entry["lastMs"] = ms
+        entry["params"] = shape
+        entry["lastSeen"] = int(time.time() * 1000)
+        if plan is not None:
+            entry["plan"] = plan
+
+        logger.warning(
+            "slow query %.1f ms params=%s: %s | plan: %s",
+            ms, shape, normalized, " / ".join(entry["plan"] or []),
+        )
+
+    def top(self, n: int = 20, order_by: str = "totalMs") -> List[dict]:
+        entries = sorted(self._entries.values(), key=lambda e: e[order_by], reverse=True)[:n]
+        return [dict(e, totalMs=round(e["totalMs"], 3), maxMs=round(e["maxMs"], 3), lastMs=round(e["lastMs"], 3))
+                for e in entries]
+
+    def clear(self):
+        self._entries.clear()
+        self.slow = 0
+
+
+slow_queries: Optional[SlowQueryLog] = SlowQueryLog() if SLOW_QUERY_MS >= 0 else None
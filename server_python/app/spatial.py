@@ -0,0 +1,214 @@
+"""
+Location search over trip points, backed by the per-trip trip_bounds boxes.
+
+Every trip keeps the bounding box of its points (grown by a trigger as points
+arrive). A search first picks the user's trips whose box overlaps the search
+area, straight from the (user_id, box) index, so other users' trips are never
+looked at. Only those candidates' points are read, from rows or from the
+compacted track, and runs of consecutive points (by id) inside the area become
+segments. Trips are visited most recent first and the search stops once
+`limit` of them matched, or once `max_points` points were scanned (a trip
+always counts as a whole, and the first candidate is always scanned).
+
+A box over a whole trip is coarse: home and work sit inside almost every
+box. The decoding and scanning therefore run in a worker thread, one trip
+at a time, so a long search does not stall the event loop.
+"""
+
+import asyncio
+import math
+from typing import Callable, List, Optional, Sequence, Tuple
+import aiosqlite
+
+from .calc import haversine_km
+from .config import SEARCH_MAX_POINTS
+from .metrics import timed
+from .models import TripSearchResult, TripSegment
+from .tracks import decode_track_positions, load_track_positions
+
+METERS_PER_DEGREE_LAT = 111_320.0
+
+
+def bbox_around(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """Bounding box (min_lng, min_lat, max_lng, max_lat) enclosing a circle."""
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return lng - dlng, max(lat - dlat, -90.0), lng + dlng, min(lat + dlat, 90.0)
+
+
+async def _candidate_trips(
+    db: aiosqlite.Connection,
+    user_id: int,
+    bbox: Tuple[float, float, float, float]
+) -> List[int]:
+    """The user's trips whose bounding box overlaps bbox, most recent first."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    async with db.execute(
+        """SELECT trip_id FROM trip_bounds
+           WHERE user_id = ? AND min_lat <= ? AND max_lat >= ? AND min_lng <= ? AND max_lng >= ?
+           ORDER BY trip_id DESC""",
+        (user_id, max_lat, min_lat, max_lng, min_lng)
+    ) as cursor:
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def _trip_data(db: aiosqlite.Connection, trip_id: int) -> Tuple[list, Optional[bytes], int]:
+    """A trip's point rows by id, its undecoded track blob and its point count."""
+    async with db.execute(
+        "SELECT id, lat, lng FROM trip_points WHERE trip_id = ? ORDER BY id", (trip_id,)
+    ) as cursor:
+        rows = await cursor.fetchall()
+    async with db.execute(
+        "SELECT point_count, data FROM trip_tracks WHERE trip_id = ?", (trip_id,)
+    ) as cursor:
+        track = await cursor.fetchone()
+    if track is None:
+        return rows, None, len(rows)
+    return rows, track["data"], len(rows) + track["point_count"]
+
+
+def _trip_positions(rows: list, data: Optional[bytes]) -> Sequence[Tuple[int, float, float]]:
+    """(id, lat, lng) of every point of a trip, rows and compacted track, by id."""
+    track = decode_track_positions(data) if data is not None else None
+    if not track:
+        return rows
+    positions = list(zip(*track))
+    ids = track[0]
+    if rows:
+        # Partly compacted trip (late uploads after compaction)
+        positions = sorted(positions + [tuple(row) for row in rows])
+    elif any(b < a for a, b in zip(ids, ids[1:])):
+        # Tracks are stored in travel order, which batch uploads can make differ from id order
+        positions.sort()
+    return positions
+
+
+def find_segments(
+    positions: Sequence[Tuple[int, float, float]],
+    inside: Callable[[float, float], bool]
+) -> List[TripSegment]:
+    """Runs of consecutive positions (by id) for which inside(lat, lng) holds."""
+    # Runs are tracked as plain lists; model instances are built once at the end
+    runs: List[list] = []
+    run = None
+    for point_id, lat, lng in positions:
+        if not inside(lat, lng):
+            run = None
+        elif run is not None:
+            run[1] = point_id
+            run[2] += 1
+        else:
+            run = [point_id, point_id, 1, lat, lng]
+            runs.append(run)
+    return [
+        TripSegment(firstPointId=first, lastPointId=last, pointCount=count, lat=lat, lng=lng)
+        for first, last, count, lat, lng in runs
+    ]
+
+
+def _scan_trip(rows: list, data: Optional[bytes], inside: Callable[[float, float], bool]) -> List[TripSegment]:
+    return find_segments(_trip_positions(rows, data), inside)
+
+
+async def _search(
+    db: aiosqlite.Connection,
+    user_id: int,
+    bbox: Tuple[float, float, float, float],
+    inside: Callable[[float, float], bool],
+    limit: int,
+    max_points: int
+) -> List[TripSearchResult]:
+    results = []
+    scanned = 0
+    for trip_id in await _candidate_trips(db, user_id, bbox):
+        if len(results) >= limit:
+            break
+        rows, data, count = await _trip_data(db, trip_id)
+        if scanned and scanned + count > max_points:
+            break
+        scanned += count
+        # The box only says the trip may pass through; its points decide
+        segments = await asyncio.to_thread(_scan_trip, rows, data, inside)
+        if segments:
+            results.append(TripSearchResult(tripId=trip_id, segments=segments))
+    return results
+
+
+@timed("search_bbox")
+async def search_bbox(
+    db: aiosqlite.Connection,
+    user_id: int,
+    bbox: Tuple[float, float, float, float],
+    limit: int = 100,
+    max_points: int = SEARCH_MAX_POINTS
+) -> List[TripSearchResult]:
+    """A user's trips with points inside bbox (min_lng, min_lat, max_lng, max_lat)."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+
+    def inside(lat: float, lng: float) -> bool:
+        return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+    return await _search(db, user_id, bbox, inside, limit, max_points)
+
+
+@timed("search_near")
+async def search_near(
+    db: aiosqlite.Connection,
+    user_id: int,
+    lat: float,
+    lng: float,
+    radius_m: float,
+    limit: int = 100,
+    max_points: int = SEARCH_MAX_POINTS
+) -> List[TripSearchResult]:
+    """A user's trips with points within radius_m of (lat, lng)."""
+    bbox = bbox_around(lat, lng, radius_m)
+    min_lng, min_lat, max_lng, max_lat = bbox
+    radius_km = radius_m / 1000
+
+    def inside(p_lat: float, p_lng: float) -> bool:
+        return (
+            min_lat <= p_lat <= max_lat and min_lng <= p_lng <= max_lng
+            and haversine_km(lat, lng, p_lat, p_lng) <= radius_km
+        )
+
+    return await _search(db, user_id, bbox, inside, limit, max_points)
+
+
+async def rebuild_spatial_index(db: aiosqlite.Connection, trip_id: Optional[int] = None) -> int:
+    """Recompute the trip_bounds box of one trip or every trip (does not commit).
+
+    Needed for points stored before the index existed, including compacted
+    tracks. Returns the number of trips indexed.
+    """
+    if trip_id is not None:
+        query, params = "SELECT id, user_id FROM trips WHERE id = ?", (trip_id,)
+        await db.execute("DELETE FROM trip_bounds WHERE trip_id = ?", (trip_id,))
+    else:
+        query, params = "SELECT id, user_id FROM trips ORDER BY id", ()
+        await db.execute("DELETE FROM trip_bounds")
+    async with db.execute(query, params) as cursor:
+        trips = [(row["id"], row["user_id"]) for row in await cursor.fetchall()]
+
+    indexed = 0
+    for tid, user_id in trips:
+        async with db.execute(
+            "SELECT MIN(lat), MAX(lat), MIN(lng), MAX(lng) FROM trip_points WHERE trip_id = ?", (tid,)
+        ) as cursor:
+            min_lat, max_lat, min_lng, max_lng = await cursor.fetchone()
+        lats = [] if min_lat is None else [min_lat, max_lat]
+        lngs = [] if min_lng is None else [min_lng, max_lng]
+        track = await load_track_positions(db, tid)
+        if track:
+            lats += track[1]
+            lngs += track[2]
+        if not lats:
+            continue
+
+        await db.execute(
+            """INSERT INTO trip_bounds (trip_id, user_id, min_lat, max_lat, min_lng, max_lng)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (tid, user_id, min(lats), max(lats), min(lngs), max(lngs))
+        )
+        indexed += 1
+    return indexed
@@ -0,0 +1,147 @@
+"""
+WebSocket ingestion of live trip fixes (`/trips/stream`).
+
+A client authenticates when connecting and then sends one JSON fix per
+message: {"lat": .., "lng": .., "seq": ..}. The token is checked again before
+each fix (a cache hit while it stays valid): once it expires or the user's
+tokens are invalidated, the connection is closed with 1008. Every fix is answered in order
+with an ack carrying the stored point, distance added and trip total, or an
+error, echoing `seq`. A bounded queue sits between reading and processing:
+when it is full the connection stops reading, so a client that sends faster
+than fixes are stored is slowed down by TCP instead of buffering without limit.
+"""
+
+import asyncio
+import json
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .auth import decode_token, token_from_connection
+from .config import STREAM_MAX_CONNECTIONS, STREAM_QUEUE_SIZE
+from .database import db_connection, PoolTimeout
+from .ingest import ingest_point, IngestQueueFull
+from . import limits
+from .models import AuthUser
+from .trips import get_active_trip
+
+# Close codes (RFC 6455 / IANA registry)
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class StreamStats:
+    """Connection and message counters for /health."""
+
+    def __init__(self, max_connections: int = STREAM_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.connections = 0
+        self.rejected = 0
+        self.points = 0
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "maxConnections": self.max_connections,
+            "rejected": self.rejected,
+            "points": self.points,
+        }
+
+
+stream_stats = StreamStats()
+
+
+def _parse_fix(message: str):
+    """(seq, lat, lng) from a fix message, or (seq, None, error) if it is invalid."""
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None, None, "validation"
+    if not isinstance(data, dict):
+        return None, None, "validation"
+    seq = data.get("seq")
+    lat, lng = data.get("lat"), data.get("lng")
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (lat, lng)):
+        return seq, None, "validation"
+    if lat < -90 or lat > 90 or lng < -180 or lng > 180:
+        return seq, None, "validation"
+    return seq, float(lat), float(lng)
+
+
+async def _ingest(user: AuthUser, lat: float, lng: float) -> dict:
+    """Store one fix for the user's active trip, the same way POST /trips/point does."""
+    try:
+        async with db_connection() as db:
+            trip = await get_active_trip(db, user.id)
+        if not trip:
+            return {"type": "error", "error": "no_active_trip"}
+        point, distance_added, total, kept = await ingest_point(trip.id, lat, lng, user.id)
+    except IngestQueueFull:
+        return {"type": "error", "error": "ingest_busy"}
+    except PoolTimeout:
+        return {"type": "error", "error": "db_busy"}
+
+    stream_stats.points += 1
+    return {
+        "type": "ack",
+        "point": point.model_dump(),
+        "distanceAdded": distance_added,
+        "total": total,
+        "kept": kept,
+    }
+
+
+async def _receive(websocket: WebSocket, queue: asyncio.Queue):
+    while True:
+        message = await websocket.receive_text()
+        # Blocks while the queue is full, which stops reading the socket
+        await queue.put(message)
+
+
+async def _process(websocket: WebSocket, token: str, user: AuthUser, queue: asyncio.Queue):
+    while True:
+        message = await queue.get()
+        if decode_token(token) is None:
+            await websocket.close(code=CLOSE_POLICY_VIOLATION, reason="invalid_token")
+            return
+        seq, lat, lng = _parse_fix(message)
+        wait = limits.rate_limiter.acquire(user.id, "ingest") if limits.rate_limiter is not None else 0.0
+        if lat is None:
+            reply = {"type": "error", "error": lng}
+        elif wait > 0:
+            reply = {"type": "error", "error": "rate_limited", "retryAfter": round(wait, 3)}
+        else:
+            reply = await _ingest(user, lat, lng)
+        reply["seq"] = seq
+        await websocket.send_json(reply)
+
+
+async def handle_point_stream(websocket: WebSocket):
+    """Serve one /trips/stream connection until the client disconnects."""
+    # Accept first so the client sees the close code and reason
+    await websocket.accept()
+    token = token_from_connection(websocket) or ""
+    user = decode_token(token)
+    if user is None:
+        await websocket.close(code=CLOSE_POLICY_VIOLATION, reason="invalid_token")
+        return
+    if stream_stats.connections >= stream_stats.max_connections:
+        stream_stats.rejected += 1
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason="too_many_connections")
+        return
+
+    stream_stats.connections += 1
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    tasks = {
+        asyncio.create_task(_receive(websocket, queue)),
+        asyncio.create_task(_process(websocket, token, user, queue)),
+    }
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        stream_stats.connections -= 1
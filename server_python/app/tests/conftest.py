@@ -0,0 +1,49 @@
+import pytest
+
+from app import limits
+from app.auth import token_cache
+from app.database import connect, init_database, set_db_path
+from app.live import live_trips
+from app.slowlog import slow_queries
+
+
+@pytest.fixture(autouse=True)
+def reset_caches(monkeypatch):
+    """Start every test with empty process-global caches.
+
+    They are keyed by trip/user id or token, which repeat across the per-test
+    databases, so a stale entry from an earlier test points at rows that
+    no longer exist.
+    """
+    if live_trips is not None:
+        live_trips.clear()
+    if token_cache is not None:
+        token_cache.clear()
+    if slow_queries is not None:
+        slow_queries.clear()
+    if limits.rate_limiter is not None:
+        monkeypatch.setattr(limits, "rate_limiter", limits.RateLimiter())
+    if limits.admission is not None:
+        monkeypatch.setattr(limits, "admission", limits.AdmissionController())
+
+
+@pytest.fixture
+async def db_path(tmp_path):
+    """Path of a freshly initialized on-disk database, set as the global one."""
+    path = str(tmp_path / "test.db")
+    set_db_path(path)
+    await init_database()
+    return path
+
+
+@pytest.fixture
+async def db(db_path):
+    """Connection to a freshly initialized on-disk database with one user."""
+    db = await connect()
+    await db.execute(
+        "INSERT INTO users (email, password_hash) VALUES (?, ?)",
+        ("driver@example.com", "hash")
+    )
+    await db.commit()
+    yield db
+    await db.close()
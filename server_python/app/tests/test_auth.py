@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+from jose import jwt
+
+from app import auth
+from app.auth import TokenCache, create_access_token, decode_token, token_cache, PasswordPoolBusy
+from app.config import JWT_SECRET, JWT_ALGORITHM
+from app.models import AuthUser
+
+
+def test_token_cache_honors_exp_size_and_invalidation():
+    cache = TokenCache(max_size=2, ttl=60)
+    alice, bob = AuthUser(id=1, email="a@example.com"), AuthUser(id=2, email="b@example.com")
+
+    cache.put("expired", alice, time.time() - 1)
+    assert cache.get("expired") is None
+
+    cache.put("a1", alice, None)
+    cache.put("b1", bob, time.time() + 3600)
+    assert cache.get("a1") is alice
+    cache.put("a2", alice, None)  # evicts b1, the least recently used
+    assert cache.get("b1") is None
+
+    cache.invalidate_user(1)
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_decode_token_uses_cache_but_still_rejects_bad_tokens():
+    token_cache.clear()
+    token = create_access_token(7, "c@example.com")
+    hits = token_cache.hits
+
+    first, second = decode_token(token), decode_token(token)
+    assert first == AuthUser(id=7, email="c@example.com") and second is first
+    assert token_cache.hits == hits + 1
+
+    token_cache.invalidate(token)
+    assert decode_token(token) == first
+    assert token_cache.hits == hits + 1
+
+    forged = jwt.encode({"sub": "7", "email": "c@example.com"}, "wrong-secret", algorithm=JWT_ALGORITHM)
+    assert decode_token(forged) is None
+    expired = jwt.encode({"sub": "7", "email": "c@example.com", "exp": int(time.time()) - 5}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    assert decode_token(expired) is None
+
+
+@pytest.mark.asyncio
+async def test_password_work_is_bounded(monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_WORKERS", 1)
+    monkeypatch.setattr(auth, "PASSWORD_MAX_PENDING", 1)
+
+    pending = asyncio.create_task(auth.hash_password_async("secret1"))
+    await asyncio.sleep(0)
+    with pytest.raises(PasswordPoolBusy):
+        await auth.verify_password_async("secret1", "$2b$12$invalid")
+
+    hashed = await pending
+    assert await auth.verify_password_async("secret1", hashed)
+    assert auth.password_pool_stats()["pending"] == 0
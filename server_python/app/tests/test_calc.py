@@ -26,6 +26,22 @@ async def test_haversine_km_paris_london():
     assert d < 360
 
 
+def test_segment_distances_match_scalar_haversine():
+    """The batch kernel agrees with the scalar haversine for every segment."""
+    from app.calc import segment_distances_km, cumulative_distances_km
+    
+    lats = [48.8566, 51.5074, 40.4168, -33.8688]
+    lngs = [2.3522, -0.1278, -3.7038, 151.2093]
+    segments = segment_distances_km(lats, lngs)
+    expected = [haversine_km(lats[i], lngs[i], lats[i + 1], lngs[i + 1]) for i in range(3)]
+    assert segments == pytest.approx(expected)
+    
+    cumulative = cumulative_distances_km(lats, lngs)
+    assert cumulative[0] == 0
+    assert cumulative[-1] == pytest.approx(sum(expected))
+    assert segment_distances_km([1.0], [2.0]) == []
+
+
 @pytest.mark.asyncio
 async def test_consumption_stats_no_trips():
     """Test consumption stats with no trips."""
@@ -109,6 +125,18 @@ async def test_consumption_stats_with_trips():
                 FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
             );
         """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS user_fuel_stats (
+                user_id INTEGER PRIMARY KEY,
+                window_trips INTEGER NOT NULL DEFAULT 0,
+                distance_km REAL NOT NULL DEFAULT 0,
+                fuel_consumed_liters REAL NOT NULL DEFAULT 0,
+                duration_days REAL NOT NULL DEFAULT 0,
+                current_fuel_liters REAL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+        """)
         await db.commit()
         
         # Create user
@@ -153,3 +181,54 @@ async def test_consumption_stats_with_trips():
         # Days left should be positive
         assert stats.projectedDaysLeft is not None
         assert stats.projectedDaysLeft > 0
+
+
+@pytest.mark.asyncio
+async def test_materialized_stats_match_sliding_window(tmp_path):
+    """Incrementally maintained stats agree with a full scan of the last 20 trips."""
+    from app.database import connect
+    from app.calc import get_consumption_stats
+    from app.trips import start_trip, stop_trip
+    
+    set_db_path(str(tmp_path / "stats.db"))
+    await init_database()
+    db = await connect()
+    try:
+        await db.execute("INSERT INTO users (email, password_hash) VALUES ('s@example.com', 'hash')")
+        user_id = 1
+        
+        # 22 finished trips with varied durations; every fifth one refuels mid-trip
+        for i in range(22):
+            initial, final = (40, 45) if i % 5 == 0 else (50, 50 - (i % 7 + 1))
+            await db.execute(
+                '''INSERT INTO trips (user_id, started_at, ended_at, initial_fuel_liters, final_fuel_liters, total_distance_km)
+                   VALUES (?, datetime("now", ?), datetime("now", ?), ?, ?, ?)''',
+                (user_id, f"-{60 - i} day", f"-{60 - i} day", initial, final, 20 + i * 3)
+            )
+            await db.execute(
+                "UPDATE trips SET ended_at = datetime(ended_at, ?) WHERE id = last_insert_rowid()",
+                (f"+{i % 4 + 1} hour",)
+            )
+        await db.commit()
+        await record_fuel_snapshot(db, user_id, 35)
+        
+        def assert_same(a, b):
+            assert a.samples == b.samples
+            for field in ("currentFuelLiters", "avgLitersPer100Km", "avgKmPerDay", "projectedRangeKm", "projectedDaysLeft"):
+                assert getattr(a, field) == pytest.approx(getattr(b, field))
+        
+        assert_same(await get_consumption_stats(db, user_id), await compute_consumption_stats(db, user_id))
+        
+        # New trips slide older ones out of the window
+        for i in range(3):
+            trip = await start_trip(db, user_id, 45)
+            await db.execute("UPDATE trips SET total_distance_km = ? WHERE id = ?", (80 + i, trip.id))
+            await stop_trip(db, trip.id, 41 - i)
+            assert_same(await get_consumption_stats(db, user_id), await compute_consumption_stats(db, user_id))
+        
+        await record_fuel_snapshot(db, user_id, 12)
+        stats = await get_consumption_stats(db, user_id)
+        assert stats.samples == 20
+        assert stats.currentFuelLiters == 12
+    finally:
+        await db.close()
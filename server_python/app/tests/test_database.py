@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+
+from app.database import ConnectionPool, PoolTimeout, init_database, set_db_path
+
+
+@pytest.fixture
+async def pool(tmp_path):
+    """Pool over a fresh on-disk database."""
+    db_path = str(tmp_path / "pool.db")
+    set_db_path(db_path)
+    await init_database()
+    pool = ConnectionPool(db_path, size=2, timeout=0.05)
+    yield pool
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_configured_connections(pool):
+    """Released connections are handed out again with WAL and foreign keys on."""
+    db = await pool.acquire()
+    async with db.execute("PRAGMA journal_mode") as cursor:
+        assert (await cursor.fetchone())[0] == "wal"
+    async with db.execute("PRAGMA foreign_keys") as cursor:
+        assert (await cursor.fetchone())[0] == 1
+    await pool.release(db)
+
+    again = await pool.acquire()
+    assert again is db
+    await pool.release(again)
+
+    stats = pool.stats()
+    assert stats["size"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["inUse"] == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_is_bounded(pool):
+    """Checkout waits for a free connection and times out when none is released."""
+    first = await pool.acquire()
+    second = await pool.acquire()
+
+    with pytest.raises(PoolTimeout):
+        await pool.acquire()
+
+    asyncio.get_running_loop().call_later(0.01, lambda: asyncio.ensure_future(pool.release(first)))
+    third = await pool.acquire()
+    assert third is first
+
+    await pool.release(second)
+    await pool.release(third)
+    stats = pool.stats()
+    assert stats["waits"] == 2
+    assert stats["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_rolls_back_unfinished_transactions(pool):
+    """A connection returned mid-transaction is rolled back before reuse."""
+    db = await pool.acquire()
+    await db.execute("INSERT INTO users (email, password_hash) VALUES ('a@b.c', 'x')")
+    assert db.in_transaction
+    await pool.release(db)
+
+    db = await pool.acquire()
+    assert not db.in_transaction
+    async with db.execute("SELECT COUNT(*) FROM users") as cursor:
+        assert (await cursor.fetchone())[0] == 0
+    await pool.release(db)
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app.database import connect
+from app.events import TripEventHub, trip_events
+from app.ingest import ingest_point
+from app.trips import start_trip, stop_trip
+
+
+@pytest.mark.asyncio
+async def test_lagging_subscriber_is_dropped():
+    hub = TripEventHub(queue_size=2)
+    slow = hub.subscribe(1)
+    other = hub.subscribe(2)
+    for i in range(3):
+        hub.publish(1, "point", {"i": i})
+
+    assert slow.lagged and not hub.has_subscribers(1)
+    assert await slow.get() is None
+    assert hub.has_subscribers(2) and other.queue.empty()
+    assert hub.stats()["dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_trip_lifecycle_is_published(db_path):
+    db = await connect()
+    subscription = trip_events.subscribe(1)
+    try:
+        await db.execute("INSERT INTO users (email, password_hash) VALUES ('e@example.com', 'hash')")
+        trip = await start_trip(db, 1, 40)
+        await ingest_point(trip.id, 10.0, 10.0, 1)
+        await ingest_point(trip.id, 10.01, 10.0, 1)
+        # Without a user id nothing is published
+        await ingest_point(trip.id, 10.02, 10.0)
+        await stop_trip(db, trip.id, 38)
+
+        events = []
+        while not subscription.queue.empty():
+            events.append(await asyncio.wait_for(subscription.get(), 1))
+        assert [e for e, _ in events] == ["start", "point", "point", "stop"]
+        assert events[2][1]["total"] == pytest.approx(events[2][1]["distanceAdded"])
+        assert events[3][1]["trip"]["ended_at"] is not None
+    finally:
+        trip_events.unsubscribe(subscription)
+        await db.close()
@@ -0,0 +1,54 @@
+import math
+
+import pytest
+
+from app.config import HEATMAP_MIN_ZOOM, HEATMAP_MAX_ZOOM, HEATMAP_CELL_BITS
+from app.database import connect
+from app.heatmap import bin_points, add_trip_to_heatmap, get_heatmap_tile
+from app.trips import start_trip, add_point, stop_trip
+
+
+def _cell(lat, lng, zoom):
+    n = 2 ** (zoom + HEATMAP_CELL_BITS)
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.log(math.tan(math.radians(lat)) + 1 / math.cos(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+def test_bin_points_matches_slippy_map_formula():
+    lats, lngs = [40.4168, 40.4169, 51.5074], [-3.7038, -3.7037, -0.1278]
+    counts = bin_points(lats, lngs)
+
+    for z in (HEATMAP_MIN_ZOOM, HEATMAP_MAX_ZOOM):
+        assert sum(c for (cz, _, _), c in counts.items() if cz == z) == 3
+        x, y = _cell(51.5074, -0.1278, z)
+        assert counts[(z, x, y)] == 1
+    # Madrid's two fixes share a cell at low zoom
+    x, y = _cell(40.4168, -3.7038, HEATMAP_MIN_ZOOM)
+    assert counts[(HEATMAP_MIN_ZOOM, x, y)] == 2
+
+
+@pytest.mark.asyncio
+async def test_trips_are_added_once_and_served_per_tile(db_path):
+    db = await connect()
+    try:
+        await db.execute("INSERT INTO users (email, password_hash) VALUES ('h@example.com', 'hash')")
+        trip = await start_trip(db, 1, 40)
+        for i in range(4):
+            await add_point(db, trip.id, 40.4168, -3.7038 + i * 0.00001)
+        # Active trips are not counted yet
+        assert await add_trip_to_heatmap(db, trip.id) == 0
+        await stop_trip(db, trip.id, 38)
+
+        assert await add_trip_to_heatmap(db, trip.id) == 4
+        assert await add_trip_to_heatmap(db, trip.id) == 0
+        await db.commit()
+
+        z = 10
+        x, y = (v >> HEATMAP_CELL_BITS for v in _cell(40.4168, -3.7038, z))
+        cells = await get_heatmap_tile(db, 1, z, x, y)
+        assert len(cells) == 3 and cells[2] == 4
+        assert all(0 <= v < 2 ** HEATMAP_CELL_BITS for v in cells[:2])
+        assert await get_heatmap_tile(db, 1, z, x + 1, y) == []
+    finally:
+        await db.close()
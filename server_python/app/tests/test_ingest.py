@@ -0,0 +1,176 @@
+import asyncio
+from datetime import datetime
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import ingest
+from app.calc import haversine_km
+from app.auth import create_access_token
+from app.database import close_pool, open_pool, set_db_path
+from app.ingest import PointWriter, IngestQueueFull, IngestWriterStopped
+from app.main import app
+from app.models import TripPoint
+from app.thinning import PointFilter
+from app.trips import start_trip, list_trip_points
+
+
+@pytest.mark.asyncio
+async def test_writer_group_commits_with_correct_totals(db):
+    """Concurrent submits are committed in groups and distances chain in queue order."""
+    trip = await start_trip(db, 1, 40)
+    writer = PointWriter(batch_size=8, max_latency_ms=20)
+    await writer.start()
+
+    coords = [(10.0 + i * 0.001, 10.0) for i in range(20)]
+    results = await asyncio.gather(*(writer.submit(trip.id, lat, lng) for lat, lng in coords))
+    await writer.stop()
+
+    expected = sum(
+        haversine_km(a[0], a[1], b[0], b[1]) for a, b in zip(coords, coords[1:])
+    )
+    assert max(total for _, _, total in results) == pytest.approx(expected)
+    assert sum(added for _, added, _ in results) == pytest.approx(expected)
+
+    stats = writer.stats()
+    assert stats["pointsCommitted"] == 20
+    assert stats["commits"] < 20
+    assert stats["maxCommitSize"] <= 8
+    assert len(await list_trip_points(db, trip.id)) == 20
+
+
+@pytest.mark.asyncio
+async def test_writer_applies_backpressure(db):
+    """Submitting to a full queue fails once the submit timeout expires."""
+    trip = await start_trip(db, 1, 40)
+    # Not started, so nothing drains the queue
+    writer = PointWriter(queue_size=1, submit_timeout=0.01)
+
+    first = asyncio.ensure_future(writer.submit(trip.id, 10.0, 10.0))
+    await asyncio.sleep(0)
+    with pytest.raises(IngestQueueFull):
+        await writer.submit(trip.id, 10.1, 10.0)
+    assert writer.stats()["rejected"] == 1
+    first.cancel()
+
+
+@pytest.mark.asyncio
+async def test_writer_fails_only_the_bad_point_of_a_group(db):
+    """A point that cannot be stored errors alone; the rest of its group commits."""
+    trip = await start_trip(db, 1, 40)
+    writer = PointWriter(batch_size=8, max_latency_ms=50)
+    await writer.start()
+    # Trip 999 does not exist, so its insert violates the foreign key
+    results = await asyncio.gather(
+        writer.submit(trip.id, 10.0, 10.0),
+        writer.submit(999, 10.0, 10.0),
+        writer.submit(trip.id, 10.01, 10.0),
+        return_exceptions=True,
+    )
+    await writer.stop()
+
+    assert isinstance(results[1], Exception)
+    (first, _, _), (second, distance_added, total) = results[0], results[2]
+    assert distance_added == pytest.approx(haversine_km(10.0, 10.0, 10.01, 10.0))
+    assert total == pytest.approx(distance_added)
+    assert [p.id for p in await list_trip_points(db, trip.id)] == [second.id, first.id]
+    stats = writer.stats()
+    assert (stats["commits"], stats["pointsCommitted"], stats["failedPoints"]) == (1, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_writer_exit_fails_pending_and_new_points(db):
+    """Once the writer task dies, queued and later submissions fail instead of hanging."""
+    trip = await start_trip(db, 1, 40)
+    writer = PointWriter(batch_size=1, max_latency_ms=0)
+
+    async def broken_commit(group):
+        raise RuntimeError("writer bug")
+
+    writer._commit_group = broken_commit
+    await writer.start()
+    results = await asyncio.wait_for(asyncio.gather(
+        writer.submit(trip.id, 10.0, 10.0),
+        writer.submit(trip.id, 10.01, 10.0),
+        return_exceptions=True,
+    ), 1)
+    assert isinstance(results[0], RuntimeError)
+    assert isinstance(results[1], IngestWriterStopped)
+
+    with pytest.raises(IngestWriterStopped):
+        await writer.submit(trip.id, 10.02, 10.0)
+    await writer.stop()
+
+
+def test_point_filter_dead_band_heading_and_keepalive():
+    """Jitter and straight-line fixes are dropped until the keepalive gap expires."""
+    f = PointFilter(min_distance_m=10, min_heading_deg=10, max_gap_s=60)
+    prev = TripPoint(id=1, trip_id=1, timestamp="2026-06-01 10:00:00", lat=40.0, lng=-3.0)
+    last = TripPoint(id=2, trip_id=1, timestamp="2026-06-01 10:00:05", lat=40.001, lng=-3.0)
+    soon = datetime(2026, 6, 1, 10, 0, 10)
+
+    assert f.should_keep(None, None, 40.0, -3.0, soon)
+    # ~3 m away: parked or GPS jitter
+    assert not f.should_keep(last, prev, 40.00103, -3.0, soon)
+    # Keeps heading north: straight line
+    assert not f.should_keep(last, prev, 40.002, -3.0, soon)
+    # Turns east
+    assert f.should_keep(last, prev, 40.001, -2.999, soon)
+    # Same jitter, but a minute after the last stored fix
+    assert f.should_keep(last, prev, 40.00103, -3.0, datetime(2026, 6, 1, 10, 1, 5))
+
+    assert f.stats()["kept"] == 3
+    assert f.stats()["dropped"] == 2
+
+
+def test_dropped_fix_response_returns_last_kept_point(tmp_path, monkeypatch):
+    """POST /trips/point answers a dropped fix with kept=false and the last stored point."""
+    set_db_path(str(tmp_path / "dropped.db"))
+    monkeypatch.setattr(ingest, "point_filter", PointFilter(min_distance_m=10, min_heading_deg=10, max_gap_s=60))
+    with TestClient(app) as client:
+        token = client.post("/auth/signup", json={"email": "d@example.com", "password": "secret1"}).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        assert client.post("/trips/start", json={"initialFuelLiters": 40}, headers=headers).status_code == 201
+
+        stored = client.post("/trips/point", json={"lat": 40.0, "lng": -3.0}, headers=headers)
+        assert stored.status_code == 200
+        assert stored.json()["kept"] is True
+        assert stored.json()["point"]["lat"] == 40.0
+
+        # ~3 m away from the stored fix: GPS jitter
+        dropped = client.post("/trips/point", json={"lat": 40.00003, "lng": -3.0}, headers=headers)
+        assert dropped.status_code == 200
+        assert dropped.json() == {**stored.json(), "kept": False}
+
+
+@pytest.mark.asyncio
+async def test_queued_route_groups_beyond_pool_size(db, monkeypatch):
+    """POST /trips/point releases its connection before waiting, so one group outgrows the pool."""
+    drivers = 12
+    headers = []
+    for user_id in range(1, drivers + 1):
+        if user_id > 1:
+            await db.execute(
+                "INSERT INTO users (id, email, password_hash) VALUES (?, ?, 'hash')", (user_id, f"d{user_id}@example.com")
+            )
+        await start_trip(db, user_id, 40)
+        headers.append({"Authorization": f"Bearer {create_access_token(user_id, f'd{user_id}@example.com')}"})
+    await db.commit()
+
+    pool = await open_pool(size=2)
+    writer = PointWriter(batch_size=50, max_latency_ms=500)
+    await writer.start()
+    monkeypatch.setattr(ingest, "_writer", writer)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/trips/point", json={"lat": 10.0, "lng": 10.0}, headers=h) for h in headers
+            ))
+    finally:
+        await writer.stop()
+        await close_pool()
+
+    assert [r.status_code for r in responses] == [200] * drivers
+    stats = writer.stats()
+    assert (stats["commits"], stats["maxCommitSize"]) == (1, drivers)
+    assert pool.stats()["timeouts"] == 0
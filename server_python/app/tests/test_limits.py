@@ -0,0 +1,73 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import limits
+from app.database import set_db_path
+from app.limits import AdmissionController, RateLimiter
+from app.main import app
+
+
+def test_token_bucket_refills_per_user_and_class(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(limits.time, "monotonic", lambda: now[0])
+    limiter = RateLimiter({"ingest": (2.0, 3.0)}, max_keys=10)
+
+    assert [limiter.acquire(1, "ingest") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire(1, "ingest") == pytest.approx(0.5)
+    # Other users and unbudgeted classes are unaffected
+    assert limiter.acquire(2, "ingest") == 0.0
+    assert limiter.acquire(1, "read") == 0.0
+
+    now[0] += 0.5
+    assert limiter.acquire(1, "ingest") == 0.0
+    assert limiter.acquire(1, "ingest") > 0
+
+
+def test_admission_sheds_lowest_priority_first():
+    controller = AdmissionController(target_ms=100, window_s=60)
+    for _ in range(20):
+        controller.record(0.15)
+    assert controller.admit(0) and controller.admit(1)
+    assert not controller.admit(2)
+
+    for _ in range(20):
+        controller.record(0.3)
+    assert controller.admit(0)
+    assert not controller.admit(1)
+
+
+def test_limited_routes_return_retry_after(tmp_path, monkeypatch):
+    set_db_path(str(tmp_path / "limits.db"))
+    monkeypatch.setattr(limits, "rate_limiter", RateLimiter({"export": (0.01, 2.0)}))
+    monkeypatch.setattr(limits, "admission", AdmissionController(target_ms=100))
+    with TestClient(app) as client:
+        token = client.post("/auth/signup", json={"email": "l@example.com", "password": "secret1"}).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        assert [client.get("/trips/export/csv", headers=headers).status_code for _ in range(2)] == [200, 200]
+        limited = client.get("/trips/export/csv", headers=headers)
+        assert limited.status_code == 429
+        assert int(limited.headers["Retry-After"]) >= 1
+
+        # Slow ingestion sheds stats but still accepts points
+        for _ in range(10):
+            limits.admission.record(1.0)
+        shed = client.get("/fuel/stats", headers=headers)
+        assert shed.status_code == 503 and shed.json()["detail"]["error"] == "overloaded"
+        assert "Retry-After" in shed.headers
+        assert client.post("/trips/start", json={"initialFuelLiters": 40}, headers=headers).status_code == 201
+        assert client.post("/trips/point", json={"lat": 1.0, "lng": 1.0}, headers=headers).status_code == 200
+
+
+def test_heatmap_tiles_have_their_own_bucket(tmp_path, monkeypatch):
+    """A map pan's burst of tiles neither spends nor is capped by the read budget."""
+    set_db_path(str(tmp_path / "tiles.db"))
+    monkeypatch.setattr(limits, "rate_limiter", RateLimiter({"read": (0.01, 1.0), "tiles": (0.01, 4.0)}))
+    with TestClient(app) as client:
+        token = client.post("/auth/signup", json={"email": "t@example.com", "password": "secret1"}).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        tiles = [client.get(f"/heatmap/10/{x}/300", headers=headers).status_code for x in range(5)]
+        assert tiles == [200, 200, 200, 200, 429]
+        assert client.get("/trips/active", headers=headers).status_code != 429
+        assert client.get("/trips/active", headers=headers).status_code == 429
@@ -0,0 +1,32 @@
+import pytest
+
+from app.metrics import Counter, Histogram, timed, db_duration
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("op_seconds", "Test.", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, "read")
+
+    lines = histogram.render()
+    assert 'op_seconds_bucket{op="read",le="0.1"} 1' in lines
+    assert 'op_seconds_bucket{op="read",le="1"} 3' in lines
+    assert 'op_seconds_bucket{op="read",le="+Inf"} 4' in lines
+    assert 'op_seconds_count{op="read"} 4' in lines
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("requests_total", "Test.", ("route",))
+    counter.inc('/a"b')
+    assert counter.render()[-1] == 'requests_total{route="/a\\"b"} 1'
+
+
+@pytest.mark.asyncio
+async def test_timed_records_failures_too():
+    @timed("test_operation")
+    async def failing():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        await failing()
+    assert db_duration.series[("test_operation",)][2] == 1
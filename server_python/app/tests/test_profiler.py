@@ -0,0 +1,77 @@
+import asyncio
+import time
+import pytest
+from pydantic import ValidationError
+
+from app.models import ProfileStart
+from app.profiler import ProfilerMiddleware, SamplingProfiler, _route_regex
+import app.profiler as profiler_module
+
+
+def test_route_templates_match_paths():
+    pattern = _route_regex("/trips/{trip_id}/geometry")
+    assert pattern.fullmatch("/trips/12/geometry")
+    assert pattern.fullmatch("/trips/12/geometry/")
+    assert not pattern.fullmatch("/trips/12/geometry/extra")
+    assert not pattern.fullmatch("/trips/active")
+
+
+def spin(seconds: float):
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        sum(range(1000))
+
+
+def fuel_stats_handler():
+    spin(0.05)
+
+
+def other_handler():
+    spin(0.05)
+
+
+@pytest.mark.asyncio
+async def test_samples_only_targeted_requests(monkeypatch):
+    profiler = SamplingProfiler()
+    monkeypatch.setattr(profiler_module, "profiler", profiler)
+
+    async def app(scope, receive, send):
+        fuel_stats_handler() if scope["path"] == "/fuel/stats" else other_handler()
+
+    middleware = ProfilerMiddleware(app)
+    session = profiler.start(["/fuel/stats"], max_requests=1, seconds=5, interval_ms=1)
+    await middleware({"type": "http", "path": "/trips/point"}, None, None)
+    await middleware({"type": "http", "path": "/fuel/stats"}, None, None)
+    # Past max_requests: not sampled
+    await middleware({"type": "http", "path": "/fuel/stats"}, None, None)
+    await asyncio.sleep(0.02)
+
+    status = session.status()
+    assert status["requests"] == 1
+    assert not status["active"]
+    assert session.samples > 0
+    # Only frames above the middleware, and none from the untargeted request
+    for line in session.collapsed().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("app/tests/test_profiler.py:test_samples_only_targeted_requests.<locals>.app")
+        assert "fuel_stats_handler" in stack and "other_handler" not in stack
+    assert sum(session.stacks().values()) == session.samples
+
+
+def test_one_session_at_a_time():
+    profiler = SamplingProfiler()
+    session = profiler.start(["/fuel/stats"], max_requests=5, seconds=5, interval_ms=1)
+    with pytest.raises(RuntimeError):
+        profiler.start(["/trips/point"], max_requests=5, seconds=5)
+    profiler.stop()
+    assert not session.status()["active"]
+    profiler.start(["/trips/point"], max_requests=5, seconds=5)
+    profiler.stop()
+
+
+def test_profile_interval_is_bounded():
+    assert ProfileStart(routes=["/fuel/stats"], intervalMs=2).intervalMs == 2
+    assert ProfileStart(routes=["/fuel/stats"]).intervalMs is None
+    for interval in (-1, 0, 0.01, 60_000):
+        with pytest.raises(ValidationError):
+            ProfileStart(routes=["/fuel/stats"], intervalMs=interval)
@@ -0,0 +1,61 @@
+import sqlite3
+import pytest
+
+from app.database import connect, init_database, set_db_path
+from app.seed import seed_database
+from app.spatial import rebuild_spatial_index
+
+
+def _dump(path: str):
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            table: conn.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall()
+            for table in ("users", "trips", "trip_points", "fuel_snapshots", "trip_bounds")
+        }
+    finally:
+        conn.close()
+
+
+async def _seed(path: str, seed: int):
+    set_db_path(path)
+    await init_database()
+    return seed_database(path, users=3, trips_per_user=4, points_per_trip=30, snapshots_per_user=2, seed=seed)
+
+
+@pytest.mark.asyncio
+async def test_seed_is_deterministic(tmp_path):
+    counts = await _seed(str(tmp_path / "a.db"), seed=7)
+    await _seed(str(tmp_path / "b.db"), seed=7)
+    await _seed(str(tmp_path / "c.db"), seed=8)
+
+    assert counts["users"] == 3 and counts["trips"] == 12 and counts["points"] == 360
+    a, b, c = (_dump(str(tmp_path / f"{name}.db")) for name in "abc")
+    # Password hashes are salted; everything else repeats exactly
+    assert {k: v for k, v in a.items() if k != "users"} == {k: v for k, v in b.items() if k != "users"}
+    assert a["trip_points"] != c["trip_points"]
+
+
+@pytest.mark.asyncio
+async def test_seed_restores_schema_and_spatial_index(tmp_path):
+    path = str(tmp_path / "seed.db")
+    await _seed(path, seed=1)
+    loaded = _dump(path)["trip_bounds"]
+
+    db = await connect(path)
+    try:
+        async with db.execute(
+            "SELECT name FROM sqlite_master WHERE tbl_name = 'trip_points' AND type IN ('index', 'trigger')"
+        ) as cursor:
+            names = {row["name"] for row in await cursor.fetchall()}
+        async with db.execute("PRAGMA journal_mode") as cursor:
+            assert (await cursor.fetchone())[0] == "wal"
+        # The directly loaded entries match a rebuild from the points
+        await rebuild_spatial_index(db)
+        await db.commit()
+    finally:
+        await db.close()
+
+    assert {"idx_trip_points_trip_timestamp", "trip_bounds_insert"} <= names
+    assert len(loaded) == 12
+    assert _dump(path)["trip_bounds"] == loaded
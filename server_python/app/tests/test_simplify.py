@@ -0,0 +1,86 @@
+import math
+import random
+
+import pytest
+
+from app.database import connect
+from app.jobs import process_finished_trip
+from app.simplify import _project, significance, simplify_levels, load_trip_level, load_trip_geometry
+from app.trips import start_trip, add_point, stop_trip
+
+
+def _douglas_peucker(x, y, first, last, tolerance, keep):
+    """Textbook recursive Douglas-Peucker, used as the reference."""
+    if last - first < 2:
+        return
+    dx, dy = x[last] - x[first], y[last] - y[first]
+    length = math.hypot(dx, dy)
+    best, best_dist = first + 1, -1.0
+    for i in range(first + 1, last):
+        if length == 0:
+            dist = math.hypot(x[i] - x[first], y[i] - y[first])
+        else:
+            dist = abs(dy * (x[i] - x[first]) - dx * (y[i] - y[first])) / length
+        if dist > best_dist:
+            best, best_dist = i, dist
+    if best_dist > tolerance:
+        keep.add(best)
+        _douglas_peucker(x, y, first, best, tolerance, keep)
+        _douglas_peucker(x, y, best, last, tolerance, keep)
+
+
+def test_levels_match_separate_douglas_peucker_runs():
+    """Every level from the single significance pass equals a direct run at that tolerance."""
+    rng = random.Random(7)
+    lats, lngs = [40.0], [-3.0]
+    for _ in range(400):
+        lats.append(lats[-1] + rng.uniform(-0.0005, 0.0008))
+        lngs.append(lngs[-1] + rng.uniform(-0.0005, 0.0008))
+
+    tolerances = (2.0, 10.0, 50.0, 250.0)
+    levels = simplify_levels(lats, lngs, tolerances)
+    x, y = [list(map(float, c)) for c in _project(lats, lngs)]
+
+    for tol in tolerances:
+        keep = {0, len(lats) - 1}
+        _douglas_peucker(x, y, 0, len(lats) - 1, tol, keep)
+        assert levels[tol][0] == [lats[i] for i in sorted(keep)]
+        assert levels[tol][1] == [lngs[i] for i in sorted(keep)]
+
+    counts = [len(levels[tol][0]) for tol in tolerances]
+    assert counts == sorted(counts, reverse=True)
+
+
+def test_significance_keeps_endpoints():
+    assert significance([1.0, 1.0], [2.0, 2.0]) == [math.inf, math.inf]
+    assert significance([], []) == []
+
+
+@pytest.mark.asyncio
+async def test_stop_job_stores_levels_served_by_zoom(db_path):
+    """Finishing a trip stores its levels and coarse zooms get fewer points."""
+    db = await connect()
+    try:
+        await db.execute("INSERT INTO users (email, password_hash) VALUES ('s@example.com', 'hash')")
+        trip = await start_trip(db, 1, 40)
+        for i in range(60):
+            await add_point(db, trip.id, 40.0 + i * 0.001, -3.0 + 0.0004 * math.sin(i))
+        await stop_trip(db, trip.id, 38)
+    finally:
+        await db.close()
+
+    await process_finished_trip(trip.id)
+
+    db = await connect()
+    try:
+        async with db.execute("SELECT COUNT(*) FROM trip_simplified WHERE trip_id = ?", (trip.id,)) as cursor:
+            assert (await cursor.fetchone())[0] > 0
+        finest = await load_trip_level(db, trip.id, 5.0)
+        assert finest is not None and finest[0] <= 5.0
+
+        _, detailed, _ = await load_trip_geometry(db, trip.id, 18)
+        _, coarse, _ = await load_trip_geometry(db, trip.id, 8)
+        assert len(coarse) == 2
+        assert len(coarse) < len(detailed) <= 60
+    finally:
+        await db.close()
@@ -0,0 +1,57 @@
+import pytest
+
+from app.database import connect
+from app.slowlog import SlowQueryLog, normalize_sql, params_shape, slow_queries
+
+
+def test_normalize_sql_strips_literals_and_whitespace():
+    sql = """SELECT * FROM trips
+             WHERE user_id = 42 AND note = 'it''s' LIMIT ?"""
+    assert normalize_sql(sql) == "SELECT * FROM trips WHERE user_id = ? AND note = ? LIMIT ?"
+
+
+def test_params_shape():
+    assert params_shape((1, 2.5, None)) == "(int, float, NoneType)"
+    assert params_shape([(1, "a"), (2, "b")], many=True) == "2 x (int, str)"
+    assert params_shape(None) == "()"
+
+
+def test_log_keeps_worst_statements():
+    log = SlowQueryLog(threshold_ms=0, max_entries=2)
+    log.record("SELECT a", "()", 0.010, ["SCAN a"])
+    log.record("SELECT b", "()", 0.020, None)
+    log.record("SELECT a", "()", 0.030, None)
+    log.record("SELECT c", "()", 0.001, None)
+
+    top = log.top()
+    # Adding "c" evicted "b", which had the least total time
+    assert [e["sql"] for e in top] == ["SELECT a", "SELECT c"]
+    assert top[0]["count"] == 2 and top[0]["maxMs"] == 30.0
+    assert top[0]["plan"] == ["SCAN a"]
+    assert log.slow == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(slow_queries is None, reason="slow-query log disabled")
+async def test_connection_records_plans(db_path, monkeypatch):
+    """With a zero threshold every statement is logged with its plan."""
+    monkeypatch.setattr(slow_queries, "threshold", 0.0)
+    db = await connect()
+    try:
+        async with db.execute(
+            "SELECT * FROM trip_points WHERE trip_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1", (1,)
+        ) as cursor:
+            await cursor.fetchone()
+        await db.execute("PRAGMA user_version")
+        entries = {e["sql"]: e for e in slow_queries.top(200)}
+    finally:
+        await db.close()
+        slow_queries.clear()
+
+    last_point = entries["SELECT * FROM trip_points WHERE trip_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?"]
+    assert last_point["params"] == "(int)"
+    # Served by the (trip_id, timestamp, id) index, without a sort step
+    assert any("idx_trip_points_trip_timestamp" in step for step in last_point["plan"])
+    assert not any("TEMP B-TREE" in step for step in last_point["plan"])
+    # PRAGMAs are timed but not explained
+    assert entries["PRAGMA user_version"]["plan"] is None
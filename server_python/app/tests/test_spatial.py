@@ -0,0 +1,91 @@
+import pytest
+
+from app.database import connect
+from app.spatial import search_bbox, search_near, rebuild_spatial_index
+from app.tracks import compact_trip
+from app.trips import start_trip, add_point, add_points, stop_trip
+
+
+async def _setup():
+    db = await connect()
+    await db.execute("INSERT INTO users (email, password_hash) VALUES ('a@example.com', 'hash')")
+    await db.execute("INSERT INTO users (email, password_hash) VALUES ('b@example.com', 'hash')")
+    return db
+
+
+@pytest.mark.asyncio
+async def test_search_returns_segments_of_consecutive_points(db_path):
+    """A trip leaving and re-entering the box yields two segments; other users' trips are hidden."""
+    db = await _setup()
+    try:
+        trip = await start_trip(db, 1, 40)
+        other = await start_trip(db, 2, 40)
+        # In (0.5), out (2.0), back in (0.6, 0.7); interleave the other user's points
+        for lat in (0.5, 2.0, 0.6, 0.7):
+            await add_point(db, trip.id, lat, 0.5)
+            await add_point(db, other.id, lat, 0.5)
+        await stop_trip(db, trip.id, 38)
+
+        results = await search_bbox(db, 1, (0.0, 0.0, 1.0, 1.0))
+        assert [r.tripId for r in results] == [trip.id]
+        assert [s.pointCount for s in results[0].segments] == [1, 2]
+
+        # Compaction moves the rows; the search then reads the track
+        await compact_trip(db, trip.id)
+        await db.commit()
+        again = await search_bbox(db, 1, (0.0, 0.0, 1.0, 1.0))
+        assert again == results
+        async with db.execute("SELECT trip_id, min_lat, max_lat FROM trip_bounds ORDER BY trip_id") as cursor:
+            assert [tuple(r) for r in await cursor.fetchall()] == [(trip.id, 0.5, 2.0), (other.id, 0.5, 2.0)]
+
+        near = await search_near(db, 1, 0.65, 0.5, 6000)
+        assert [s.pointCount for s in near[0].segments] == [2]
+        assert await search_near(db, 1, 10.0, 10.0, 1000) == []
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_matches_trigger_maintained_index(db_path):
+    db = await _setup()
+    try:
+        trip = await start_trip(db, 1, 40)
+        await add_points(db, trip.id, [(0.1 * i, 0.2, None) for i in range(10)])
+        await db.commit()
+        before = await search_bbox(db, 1, (0.0, 0.0, 1.0, 0.45))
+
+        await db.execute("DELETE FROM trip_bounds")
+        assert await search_bbox(db, 1, (0.0, 0.0, 1.0, 0.45)) == []
+        assert await rebuild_spatial_index(db) == 1
+        assert await search_bbox(db, 1, (0.0, 0.0, 1.0, 0.45)) == before
+        assert before[0].segments[0].pointCount == 5
+
+        # Deleting the trip takes its box with it
+        await db.execute("DELETE FROM trips WHERE id = ?", (trip.id,))
+        async with db.execute("SELECT COUNT(*) FROM trip_bounds") as cursor:
+            assert (await cursor.fetchone())[0] == 0
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_search_stops_at_points_budget(db_path):
+    """Older candidates are skipped once the scanned points exceed max_points, newest trip first."""
+    db = await _setup()
+    try:
+        trips = []
+        for _ in range(3):
+            trip = await start_trip(db, 1, 40)
+            await add_points(db, trip.id, [(0.5 + 0.01 * i, 0.5, None) for i in range(4)])
+            await stop_trip(db, trip.id, 38)
+            trips.append(trip.id)
+        await compact_trip(db, trips[0])
+        await db.commit()
+
+        bbox = (0.0, 0.0, 1.0, 1.0)
+        assert [r.tripId for r in await search_bbox(db, 1, bbox)] == trips[::-1]
+        assert [r.tripId for r in await search_bbox(db, 1, bbox, max_points=8)] == [trips[2], trips[1]]
+        # The first candidate is scanned even when it alone is over budget
+        assert [r.tripId for r in await search_bbox(db, 1, bbox, max_points=1)] == [trips[2]]
+    finally:
+        await db.close()
@@ -0,0 +1,89 @@
+import pytest
+from fastapi.testclient import TestClient
+from jose import ExpiredSignatureError
+from starlette.websockets import WebSocketDisconnect
+
+from app import auth
+from app.auth import create_access_token, token_cache
+from app.database import set_db_path
+from app.main import app
+from app.stream import stream_stats
+
+
+@pytest.fixture
+def client(tmp_path):
+    set_db_path(str(tmp_path / "stream.db"))
+    with TestClient(app) as client:
+        yield client
+
+
+def test_stream_acks_each_fix_in_order(client):
+    token = client.post("/auth/signup", json={"email": "s@example.com", "password": "secret1"}).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with client.websocket_connect(f"/trips/stream?token={token}") as ws:
+        ws.send_json({"seq": 1, "lat": 10.0, "lng": 10.0})
+        assert ws.receive_json() == {"type": "error", "error": "no_active_trip", "seq": 1}
+
+        client.post("/trips/start", json={"initialFuelLiters": 40}, headers=headers)
+        for seq, lat in enumerate((10.0, 10.01, 10.02), start=2):
+            ws.send_json({"seq": seq, "lat": lat, "lng": 10.0})
+        ws.send_text("not json")
+        ws.send_json({"seq": 9, "lat": 91, "lng": 0})
+
+        acks = [ws.receive_json() for _ in range(5)]
+        assert [a["seq"] for a in acks] == [2, 3, 4, None, 9]
+        assert [a["type"] for a in acks] == ["ack", "ack", "ack", "error", "error"]
+        assert acks[0]["distanceAdded"] == 0
+        assert acks[2]["total"] == pytest.approx(acks[1]["distanceAdded"] + acks[2]["distanceAdded"])
+        assert stream_stats.connections == 1
+
+    active = client.get("/trips/active", headers=headers).json()
+    assert len(active["points"]) == 3
+    assert active["active"]["total_distance_km"] == pytest.approx(acks[2]["total"])
+
+
+def test_stream_rejects_bad_token_and_excess_connections(client, monkeypatch):
+    with pytest.raises(WebSocketDisconnect) as rejected:
+        with client.websocket_connect("/trips/stream?token=nope") as ws:
+            ws.receive_json()
+    assert rejected.value.code == 1008
+
+    token = create_access_token(1, "s@example.com")
+    monkeypatch.setattr(stream_stats, "max_connections", 0)
+    with pytest.raises(WebSocketDisconnect) as full:
+        with client.websocket_connect(f"/trips/stream?token={token}") as ws:
+            ws.receive_json()
+    assert full.value.code == 1013
+
+
+def expired_decode(*args, **kwargs):
+    raise ExpiredSignatureError("Signature has expired.")
+
+
+def test_stream_closes_when_token_expires_or_is_revoked(client, monkeypatch):
+    token = client.post("/auth/signup", json={"email": "r@example.com", "password": "secret1"}).json()["token"]
+    client.post("/trips/start", json={"initialFuelLiters": 40}, headers={"Authorization": f"Bearer {token}"})
+
+    with pytest.raises(WebSocketDisconnect) as revoked:
+        with client.websocket_connect(f"/trips/stream?token={token}") as ws:
+            ws.send_json({"seq": 1, "lat": 10.0, "lng": 10.0})
+            assert ws.receive_json()["type"] == "ack"
+            token_cache.invalidate_user(1)
+            ws.send_json({"seq": 2, "lat": 10.01, "lng": 10.0})
+            ws.receive_json()
+    assert (revoked.value.code, revoked.value.reason) == (1008, "invalid_token")
+
+    token_cache.clear()
+    fresh = create_access_token(1, "r@example.com")
+    with pytest.raises(WebSocketDisconnect) as expired:
+        with client.websocket_connect(f"/trips/stream?token={fresh}") as ws:
+            ws.send_json({"seq": 1, "lat": 10.0, "lng": 10.0})
+            assert ws.receive_json()["type"] == "ack"
+            # Past exp, both for the cached entry and for the JWT itself
+            later = auth.time.time() + auth.JWT_EXPIRE_DAYS * 86400 + 60
+            monkeypatch.setattr(auth.time, "time", lambda: later)
+            monkeypatch.setattr(auth.jwt, "decode", expired_decode)
+            ws.send_json({"seq": 2, "lat": 10.01, "lng": 10.0})
+            ws.receive_json()
+    assert expired.value.code == 1008
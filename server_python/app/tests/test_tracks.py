@@ -0,0 +1,56 @@
+import pytest
+
+from app.database import connect
+from app.models import TripPoint
+from app.tracks import encode_track, decode_track, compact_trip
+from app.trips import start_trip, add_point, stop_trip, list_trip_points, load_trip_coordinates
+
+
+def test_track_round_trip():
+    """Encoding then decoding keeps ids and timestamps exactly and coordinates to 1e-7."""
+    points = [
+        TripPoint(id=10 + i, trip_id=3, timestamp=f"2026-05-01 12:00:{i * 5:02d}",
+                  lat=40.4168 + i * 0.00123456, lng=-3.7038 - i * 0.00098765)
+        for i in range(12)
+    ]
+    # Out-of-order ids and a southern/western hemisphere jump
+    points.append(TripPoint(id=5, trip_id=3, timestamp="2026-05-01 12:01:00", lat=-33.8688, lng=151.2093))
+
+    decoded = decode_track(encode_track(points), 3)
+
+    assert [(p.id, p.timestamp) for p in decoded] == [(p.id, p.timestamp) for p in points]
+    for a, b in zip(decoded, points):
+        assert a.lat == pytest.approx(b.lat, abs=1e-7)
+        assert a.lng == pytest.approx(b.lng, abs=1e-7)
+
+
+def test_track_rejects_unknown_timestamp_format():
+    """Points whose timestamps can't be stored exactly are not encoded."""
+    point = TripPoint(id=1, trip_id=1, timestamp="2026-05-01T12:00:00.250Z", lat=1.0, lng=2.0)
+    assert encode_track([point]) is None
+
+
+@pytest.mark.asyncio
+async def test_compacted_trip_reads_transparently(db_path):
+    """After compaction, the trip's points come from the track instead of rows."""
+    db = await connect()
+    try:
+        await db.execute("INSERT INTO users (email, password_hash) VALUES ('t@example.com', 'hash')")
+        trip = await start_trip(db, 1, 40)
+        for i in range(5):
+            await add_point(db, trip.id, 10.0 + i * 0.01, 20.0)
+        await stop_trip(db, trip.id, 38)
+        before = await list_trip_points(db, trip.id)
+
+        assert await compact_trip(db, trip.id) == 5
+        await db.commit()
+
+        async with db.execute("SELECT COUNT(*) FROM trip_points") as cursor:
+            assert (await cursor.fetchone())[0] == 0
+        after = await list_trip_points(db, trip.id)
+        assert [(p.id, p.timestamp, p.lat, p.lng) for p in after] == [(p.id, p.timestamp, p.lat, p.lng) for p in before]
+
+        lats, _ = await load_trip_coordinates(db, trip.id)
+        assert len(lats) == 5
+    finally:
+        await db.close()
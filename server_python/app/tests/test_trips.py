@@ -0,0 +1,154 @@
+import pytest
+
+from app.live import live_trips
+from app.calc import haversine_km
+from app.trips import (
+    start_trip, add_point, add_points, stop_trip, get_active_trip, list_trip_points,
+    get_all_trips, convert_trips_to_csv, iter_trips_csv, list_trips, recompute_trip_distance
+)
+
+
+@pytest.mark.asyncio
+async def test_add_point_returns_stored_row_and_running_total(db):
+    """Each call returns the stored point, its distance and the trip total, duplicates included."""
+    trip = await start_trip(db, 1, 40)
+    fixes = [(10.0, 10.0), (10.01, 10.0), (10.01, 10.0), (10.02, 10.01)]
+
+    expected_total = 0.0
+    previous = None
+    for lat, lng in fixes:
+        point, distance_added, total = await add_point(db, trip.id, lat, lng)
+        expected_added = haversine_km(*previous, lat, lng) if previous else 0.0
+        expected_total += expected_added
+        previous = (lat, lng)
+
+        assert (point.trip_id, point.lat, point.lng) == (trip.id, lat, lng)
+        assert point.timestamp
+        assert distance_added == pytest.approx(expected_added)
+        assert total == pytest.approx(expected_total)
+        assert not db.in_transaction
+
+    stored = await list_trip_points(db, trip.id)
+    assert [(p.lat, p.lng) for p in reversed(stored)] == fixes
+    async with db.execute("SELECT total_distance_km FROM trips WHERE id = ?", (trip.id,)) as cursor:
+        assert (await cursor.fetchone())[0] == pytest.approx(expected_total)
+
+
+@pytest.mark.asyncio
+async def test_add_points_batch_distance(db):
+    """A batch chains distance from the last stored point and updates the total once."""
+    trip = await start_trip(db, 1, 40)
+    await add_point(db, trip.id, 10.0, 10.0)
+
+    batch = [
+        (10.01, 10.0, "2026-01-01 10:00:05"),
+        (10.02, 10.0, "2026-01-01 10:00:10"),
+        (10.03, 10.0, None),
+    ]
+    added, distance_added, total = await add_points(db, trip.id, batch)
+
+    expected = haversine_km(10.0, 10.0, 10.03, 10.0)
+    assert added == 3
+    assert distance_added == pytest.approx(expected)
+    assert total == pytest.approx(expected)
+
+    points = await list_trip_points(db, trip.id)
+    assert len(points) == 4
+    assert not db.in_transaction
+
+
+@pytest.mark.asyncio
+async def test_live_cache_serves_active_trip_without_queries(db):
+    """Once a trip is started, the hot reads come from the cache and track writes."""
+    trip = await start_trip(db, 1, 40)
+    await add_point(db, trip.id, 10.0, 10.0)
+    await add_point(db, trip.id, 10.01, 10.0)
+
+    statements = []
+    await db.set_trace_callback(statements.append)
+    active = await get_active_trip(db, 1)
+    points = await list_trip_points(db, trip.id, 50)
+    await db.set_trace_callback(None)
+
+    assert statements == []
+    assert active.total_distance_km == pytest.approx(haversine_km(10.0, 10.0, 10.01, 10.0))
+    assert [p.lat for p in points] == [10.01, 10.0]
+
+    await stop_trip(db, trip.id, 38)
+    assert await get_active_trip(db, 1) is None
+
+
+@pytest.mark.asyncio
+async def test_live_cache_reloads_after_clear(db):
+    """A cold cache is filled from the database with the same answers."""
+    trip = await start_trip(db, 1, 40)
+    for i in range(3):
+        await add_point(db, trip.id, 10.0 + i * 0.01, 10.0)
+    warm = await list_trip_points(db, trip.id, 50)
+
+    live_trips.clear()
+    active = await get_active_trip(db, 1)
+    cold = await list_trip_points(db, trip.id, 50)
+
+    assert active.id == trip.id
+    assert [p.id for p in cold] == [p.id for p in warm]
+
+
+@pytest.mark.asyncio
+async def test_streamed_csv_matches_full_export(db):
+    """Paging through trips with keyset cursors yields the same CSV as the full export."""
+    for i in range(7):
+        await db.execute(
+            """INSERT INTO trips (user_id, started_at, ended_at, initial_fuel_liters, total_distance_km)
+               VALUES (1, ?, ?, ?, ?)""",
+            (f"2026-03-{i + 1:02d} 08:00:00", f"2026-03-{i + 1:02d} 09:00:00", 40 if i % 2 else None, i * 1.5)
+        )
+    await db.commit()
+
+    chunks = [chunk async for chunk in iter_trips_csv(1, page_size=3)]
+    assert len(chunks) == 3
+    assert "".join(chunks) == convert_trips_to_csv(await get_all_trips(db, 1))
+
+    filtered = "".join([c async for c in iter_trips_csv(1, start="2026-03-03", end="2026-03-05", page_size=3)])
+    assert [line.split(",")[0] for line in filtered.splitlines()[1:]] == ["4", "3"]
+
+
+@pytest.mark.asyncio
+async def test_list_trips_keyset_pages(db):
+    """Pages cover every trip exactly once, including trips sharing a start time."""
+    for i in range(9):
+        # Pairs of trips share started_at to exercise the id tie-breaker
+        await db.execute(
+            "INSERT INTO trips (user_id, started_at, total_distance_km) VALUES (1, ?, ?)",
+            (f"2026-04-{i // 2 + 1:02d} 08:00:00", float(i))
+        )
+    await db.commit()
+
+    seen, cursor = [], None
+    while True:
+        trips, cursor = await list_trips(db, 1, 4, cursor)
+        seen.extend(t.id for t in trips)
+        if cursor is None:
+            break
+    assert seen == [9, 8, 7, 6, 5, 4, 3, 2, 1]
+
+    long_trips, cursor = await list_trips(db, 1, 4, None, min_distance=3, max_distance=6)
+    assert [t.id for t in long_trips] == [7, 6, 5, 4]
+    assert cursor is None
+
+
+@pytest.mark.asyncio
+async def test_recompute_trip_distance_fixes_drifted_total(db):
+    """A stored total that disagrees with the points is rewritten."""
+    trip = await start_trip(db, 1, 40)
+    for i in range(4):
+        await add_point(db, trip.id, 10.0 + i * 0.01, 10.0)
+    await db.execute("UPDATE trips SET total_distance_km = 99 WHERE id = ?", (trip.id,))
+    await db.commit()
+
+    stored, computed = await recompute_trip_distance(db, trip.id)
+    await db.commit()
+
+    assert stored == 99
+    assert computed == pytest.approx(haversine_km(10.0, 10.0, 10.03, 10.0))
+    assert (await get_active_trip(db, 1)).total_distance_km == pytest.approx(computed)
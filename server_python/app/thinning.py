@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from .calc import bearing_deg, haversine_km
+from .config import (
+    POINT_FILTER_ENABLED, POINT_FILTER_MIN_DISTANCE_M, POINT_FILTER_MIN_HEADING_DEG, POINT_FILTER_MAX_GAP_S,
+)
+from .models import TripPoint
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    # SQLite's CURRENT_TIMESTAMP is naive UTC
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class PointFilter:
+    """Streaming dead-band filter deciding which incoming fixes get stored.
+
+    A fix is compared with the last stored ("kept") fix and the one before it:
+    - always kept when `max_gap_s` passed since the last kept fix (keepalive);
+    - dropped when it is within `min_distance_m` of the last kept fix (parked/jitter);
+    - dropped when it turns less than `min_heading_deg` from the previous heading
+      (straight line); its distance is counted when the next fix is kept.
+    """
+
+    def __init__(
+        self,
+        min_distance_m: float = POINT_FILTER_MIN_DISTANCE_M,
+        min_heading_deg: float = POINT_FILTER_MIN_HEADING_DEG,
+        max_gap_s: float = POINT_FILTER_MAX_GAP_S,
+    ):
+        self.min_distance_m = min_distance_m
+        self.min_heading_deg = min_heading_deg
+        self.max_gap_s = max_gap_s
+        self.kept = 0
+        self.dropped = 0
+
+    def should_keep(
+        self,
+        last_kept: Optional[TripPoint],
+        prev_kept: Optional[TripPoint],
+        lat: float,
+        lng: float,
+        timestamp: Optional[datetime] = None,
+    ) -> bool:
+        """Decide whether a fix is stored, and count the decision."""
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc)
+        elif timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        keep = self._decide(last_kept, prev_kept, lat, lng, timestamp)
+        if keep:
+            self.kept += 1
+        else:
+            self.dropped += 1
+        return keep
+
+    def _decide(self, last_kept, prev_kept, lat, lng, timestamp) -> bool:
+        if last_kept is None:
+            return True
+        
+        last_time = _parse_timestamp(last_kept.timestamp)
+        if last_time is None or (timestamp - last_time).total_seconds() >= self.max_gap_s:
+            return True
+        
+        if haversine_km(last_kept.lat, last_kept.lng, lat, lng) * 1000 < self.min_distance_m:
+            return False
+        
+        if prev_kept is None or self.min_heading_deg <= 0:
+            return True
+        heading = bearing_deg(prev_kept.lat, prev_kept.lng, last_kept.lat, last_kept.lng)
+        new_heading = bearing_deg(last_kept.lat, last_kept.lng, lat, lng)
+        turn = abs((new_heading - heading + 180) % 360 - 180)
+        return turn >= self.min_heading_deg
+
+    def stats(self) -> dict:
+        total = self.kept + self.dropped
+        return {
+            "kept": self.kept,
+            "dropped": self.dropped,
+            "dropRate": round(self.dropped / total, 4) if total else 0,
+        }
+
+
+# Global filter, None unless POINT_FILTER_ENABLED is set
+point_filter: Optional[PointFilter] = PointFilter() if POINT_FILTER_ENABLED else None
@@ -0,0 +1,212 @@
+"""
+Compact columnar storage for the points of finished trips.
+
+A finished trip's points move from one trip_points row each into a single
+trip_tracks blob. Each column (ids, timestamps, lats, lngs) is stored as
+fixed-width integer deltas and the whole payload is zlib-compressed, which
+squeezes the small deltas about as well as varints while decoding at C speed.
+Coordinates are kept to 1e-7 degrees (about 1 cm) and timestamps to the second,
+which is all SQLite's CURRENT_TIMESTAMP stores.
+"""
+
+import calendar
+import struct
+import sys
+import time
+import zlib
+from array import array
+from datetime import datetime
+from itertools import accumulate, chain
+from typing import List, Optional, Sequence, Tuple
+import aiosqlite
+
+from .metrics import timed
+from .models import TripPoint
+
+TRACK_FORMAT_VERSION = 1
+COORD_SCALE = 10_000_000
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _pack_deltas(values: Sequence[int], typecode: str) -> bytes:
+    """Delta-encode a column as little-endian fixed-width integers."""
+    deltas = array(typecode, [b - a for a, b in zip(chain((0,), values), values)])
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return deltas.tobytes()
+
+
+def _unpack_deltas(data: bytes, typecode: str) -> List[int]:
+    deltas = array(typecode)
+    deltas.frombytes(data)
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return list(accumulate(deltas))
+
+
+def encode_coordinates(lats: Sequence[float], lngs: Sequence[float]) -> bytes:
+    """Encode a bare (lats, lngs) polyline with the same column codec as tracks."""
+    payload = b"".join([
+        struct.pack("<I", len(lats)),
+        _pack_deltas([round(v * COORD_SCALE) for v in lats], "i"),
+        _pack_deltas([round(v * COORD_SCALE) for v in lngs], "i"),
+    ])
+    return bytes([TRACK_FORMAT_VERSION]) + zlib.compress(payload, 9)
+
+
+def decode_coordinates(data: bytes) -> Tuple[List[float], List[float]]:
+    """Decode a blob written by encode_coordinates into (lats, lngs)."""
+    if data[0] != TRACK_FORMAT_VERSION:
+        raise ValueError(f"unsupported track format {data[0]}")
+    payload = zlib.decompress(data[1:])
+    (count,) = struct.unpack_from("<I", payload)
+    lats = _unpack_deltas(payload[4:4 + count * 4], "i")
+    lngs = _unpack_deltas(payload[4 + count * 4:4 + count * 8], "i")
+    return [v / COORD_SCALE for v in lats], [v / COORD_SCALE for v in lngs]
+
+
+def encode_track(points: Sequence[TripPoint]) -> Optional[bytes]:
+    """Encode points (in travel order) into a track blob.
+
+    Returns None when a timestamp is not in SQLite's default format and so
+    cannot be stored exactly.
+    """
+    try:
+        seconds = [
+            calendar.timegm(datetime.strptime(p.timestamp, TIMESTAMP_FORMAT).timetuple())
+            for p in points
+        ]
+    except ValueError:
+        return None
+    
+    payload = b"".join([
+        struct.pack("<I", len(points)),
+        _pack_deltas([p.id for p in points], "q"),
+        _pack_deltas(seconds, "q"),
+        _pack_deltas([round(p.lat * COORD_SCALE) for p in points], "i"),
+        _pack_deltas([round(p.lng * COORD_SCALE) for p in points], "i"),
+    ])
+    return bytes([TRACK_FORMAT_VERSION]) + zlib.compress(payload, 9)
+
+
+def _decode_columns(data: bytes) -> List[List[int]]:
+    if data[0] != TRACK_FORMAT_VERSION:
+        raise ValueError(f"unsupported track format {data[0]}")
+    payload = zlib.decompress(data[1:])
+    
+    (count,) = struct.unpack_from("<I", payload)
+    pos = 4
+    columns = []
+    for typecode, width in (("q", 8), ("q", 8), ("i", 4), ("i", 4)):
+        end = pos + count * width
+        columns.append(_unpack_deltas(payload[pos:end], typecode))
+        pos = end
+    return columns
+
+
+def decode_track(data: bytes, trip_id: int) -> List[TripPoint]:
+    """Decode a track blob back into points, in travel order."""
+    ids, seconds, lats, lngs = _decode_columns(data)
+    
+    # Consecutive fixes share the minute, so format each minute only once
+    minutes = {}
+    timestamps = []
+    for sec in seconds:
+        minute, second = divmod(sec, 60)
+        prefix = minutes.get(minute)
+        if prefix is None:
+            prefix = minutes[minute] = time.strftime("%Y-%m-%d %H:%M:", time.gmtime(minute * 60))
+        timestamps.append(f"{prefix}{second:02d}")
+    
+    return [
+        TripPoint(
+            id=ids[i],
+            trip_id=trip_id,
+            timestamp=timestamps[i],
+            lat=lats[i] / COORD_SCALE,
+            lng=lngs[i] / COORD_SCALE,
+        )
+        for i in range(len(ids))
+    ]
+
+
+def decode_track_coordinates(data: bytes) -> Tuple[List[float], List[float]]:
+    """Decode only the (lats, lngs) columns of a track blob."""
+    _, _, lats, lngs = _decode_columns(data)
+    return [v / COORD_SCALE for v in lats], [v / COORD_SCALE for v in lngs]
+
+
+def decode_track_positions(data: bytes) -> Tuple[List[int], List[float], List[float]]:
+    """Decode the (ids, lats, lngs) columns of a track blob."""
+    ids, _, lats, lngs = _decode_columns(data)
+    return ids, [v / COORD_SCALE for v in lats], [v / COORD_SCALE for v in lngs]
+
+
+async def load_track(db: aiosqlite.Connection, trip_id: int) -> Optional[List[TripPoint]]:
+    """Load a compacted trip's points, or None if the trip has no track."""
+    async with db.execute(
+        "SELECT data FROM trip_tracks WHERE trip_id = ?",
+        (trip_id,)
+    ) as cursor:
+        row = await cursor.fetchone()
+    return decode_track(row[0], trip_id) if row else None
+
+
+async def load_track_coordinates(db: aiosqlite.Connection, trip_id: int) -> Optional[Tuple[List[float], List[float]]]:
+    """Load a compacted trip's (lats, lngs), or None if the trip has no track."""
+    async with db.execute(
+        "SELECT data FROM trip_tracks WHERE trip_id = ?",
+        (trip_id,)
+    ) as cursor:
+        row = await cursor.fetchone()
+    return decode_track_coordinates(row[0]) if row else None
+
+
+async def load_track_positions(
+    db: aiosqlite.Connection, trip_id: int
+) -> Optional[Tuple[List[int], List[float], List[float]]]:
+    """Load a compacted trip's (ids, lats, lngs), or None if the trip has no track."""
+    async with db.execute(
+        "SELECT data FROM trip_tracks WHERE trip_id = ?",
+        (trip_id,)
+    ) as cursor:
+        row = await cursor.fetchone()
+    return decode_track_positions(row[0]) if row else None
+
+
+@timed("compact_trip")
+async def compact_trip(db: aiosqlite.Connection, trip_id: int) -> int:
+    """Move a finished trip's point rows into a track blob (does not commit).
+
+    Returns the number of points compacted; active trips are left alone.
+    """
+    async with db.execute(
+        """SELECT p.* FROM trip_points p JOIN trips t ON t.id = p.trip_id
+           WHERE p.trip_id = ? AND t.ended_at IS NOT NULL
+           ORDER BY p.timestamp, p.id""",
+        (trip_id,)
+    ) as cursor:
+        rows = await cursor.fetchall()
+    if not rows:
+        return 0
+    
+    # Points may already be partly compacted (e.g. late batch uploads): merge them
+    points = [
+        TripPoint(id=r["id"], trip_id=r["trip_id"], timestamp=r["timestamp"], lat=r["lat"], lng=r["lng"])
+        for r in rows
+    ]
+    existing = await load_track(db, trip_id)
+    if existing:
+        points = sorted(existing + points, key=lambda p: (p.timestamp, p.id))
+    
+    data = encode_track(points)
+    if data is None:
+        return 0
+    
+    await db.execute(
+        """INSERT INTO trip_tracks (trip_id, point_count, data) VALUES (?, ?, ?)
+           ON CONFLICT(trip_id) DO UPDATE SET point_count = excluded.point_count, data = excluded.data""",
+        (trip_id, len(points), data)
+    )
+    await db.execute("DELETE FROM trip_points WHERE trip_id = ?", (trip_id,))
+    return len(rows)
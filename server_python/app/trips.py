@@ -1,7 +1,16 @@
-from typing import Optional, List, Tuple
+import base64
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional, List, Tuple
 import aiosqlite
+from .config import EXPORT_PAGE_SIZE
+from .database import db_connection
 from .models import Trip, TripPoint
-from .calc import haversine_km
+from .calc import haversine_km, apply_finished_trip, rebuild_fuel_stats, segment_distances_km
+from .events import trip_events
+from .live import live_trips
+from .metrics import timed
+from .tracks import load_track, load_track_coordinates
 
 
 def row_to_trip(row) -> Trip:
@@ -28,16 +37,68 @@ def row_to_trip_point(row) -> TripPoint:
     )
 
 
+def encode_trip_cursor(started_at: str, trip_id: int) -> str:
+    """Encode a (started_at, id) keyset as an opaque page cursor."""
+    raw = json.dumps([started_at, trip_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_trip_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """Decode a page cursor, returning None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        started_at, trip_id = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(started_at, str) or not isinstance(trip_id, int):
+        return None
+    return started_at, trip_id
+
+
+def format_timestamp(value: datetime) -> str:
+    """Format a datetime the way SQLite's CURRENT_TIMESTAMP stores it (UTC)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@timed("get_active_trip")
 async def get_active_trip(db: aiosqlite.Connection, user_id: int) -> Optional[Trip]:
     """Get the active trip for a user."""
+    if live_trips is not None:
+        found, state = live_trips.lookup(user_id)
+        if found:
+            return state.trip.model_copy() if state else None
+    
     async with db.execute(
         "SELECT * FROM trips WHERE user_id = ? AND ended_at IS NULL ORDER BY started_at DESC LIMIT 1",
         (user_id,)
     ) as cursor:
         row = await cursor.fetchone()
-        return row_to_trip(row) if row else None
+    trip = row_to_trip(row) if row else None
+    
+    if live_trips is not None:
+        if trip is None:
+            live_trips.set_inactive(user_id)
+        else:
+            limit = live_trips.recent_points
+            points = await _select_trip_points(db, trip.id, limit)
+            live_trips.set_active(trip.model_copy(), reversed(points), complete=len(points) < limit)
+    return trip
+
+
+@timed("get_trip")
+async def get_trip(db: aiosqlite.Connection, user_id: int, trip_id: int) -> Optional[Trip]:
+    """Get one of a user's trips by id."""
+    async with db.execute(
+        "SELECT * FROM trips WHERE id = ? AND user_id = ?",
+        (trip_id, user_id)
+    ) as cursor:
+        row = await cursor.fetchone()
+    return row_to_trip(row) if row else None
 
 
+@timed("start_trip")
 async def start_trip(db: aiosqlite.Connection, user_id: int, initial_fuel: Optional[float] = None) -> Trip:
     """Start a new trip for a user."""
     cursor = await db.execute(
@@ -51,88 +112,266 @@ async def start_trip(db: aiosqlite.Connection, user_id: int, initial_fuel: Optio
         (cursor.lastrowid,)
     ) as cursor:
         row = await cursor.fetchone()
-        return row_to_trip(row)
+    trip = row_to_trip(row)
+    
+    if live_trips is not None:
+        live_trips.set_active(trip.model_copy())
+    if trip_events is not None and trip_events.has_subscribers(user_id):
+        trip_events.publish(user_id, "start", {"trip": trip.model_dump()})
+    return trip
 
 
-async def add_point(
-    db: aiosqlite.Connection, 
-    trip_id: int, 
-    lat: float, 
-    lng: float
-) -> Tuple[TripPoint, float, float]:
-    """Add a point to a trip and return the point, distance added, and total distance."""
-    # Get last point
+@timed("get_last_point")
+async def get_last_point(db: aiosqlite.Connection, trip_id: int) -> Optional[TripPoint]:
+    """Get the most recent point of a trip."""
+    if live_trips is not None:
+        state = live_trips.for_trip(trip_id)
+        if state is not None:
+            return state.last_point
+    
     async with db.execute(
-        "SELECT * FROM trip_points WHERE trip_id = ? ORDER BY timestamp DESC LIMIT 1",
+        "SELECT * FROM trip_points WHERE trip_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1",
         (trip_id,)
     ) as cursor:
-        last_point_row = await cursor.fetchone()
+        row = await cursor.fetchone()
+        return row_to_trip_point(row) if row else None
+
+
+async def get_trip_total(db: aiosqlite.Connection, trip_id: int) -> float:
+    """Get a trip's stored total distance."""
+    if live_trips is not None:
+        state = live_trips.for_trip(trip_id)
+        if state is not None:
+            return state.trip.total_distance_km
     
+    async with db.execute(
+        "SELECT total_distance_km FROM trips WHERE id = ?",
+        (trip_id,)
+    ) as cursor:
+        row = await cursor.fetchone()
+        return (row[0] or 0) if row else 0
+
+
+async def insert_point(
+    db: aiosqlite.Connection,
+    trip_id: int,
+    lat: float,
+    lng: float,
+    last_point: Optional[TripPoint]
+) -> Tuple[TripPoint, float, float]:
+    """Insert a point after `last_point` and bump the trip total, without committing."""
     distance_added = 0.0
-    if last_point_row:
-        last_point = row_to_trip_point(last_point_row)
+    if last_point:
         distance_added = haversine_km(last_point.lat, last_point.lng, lat, lng)
     
-    # Insert new point
-    cursor = await db.execute(
-        "INSERT INTO trip_points (trip_id, lat, lng) VALUES (?, ?, ?)",
+    # Read the new row and the new total back via RETURNING
+    async with db.execute(
+        "INSERT INTO trip_points (trip_id, lat, lng) VALUES (?, ?, ?) RETURNING *",
         (trip_id, lat, lng)
-    )
+    ) as cursor:
+        point = row_to_trip_point(await cursor.fetchone())
+
+    # A zero-distance fix (first point, duplicate) leaves the total alone
+    if distance_added > 0:
+        sql = "UPDATE trips SET total_distance_km = total_distance_km + ? WHERE id = ? RETURNING total_distance_km"
+        params = (distance_added, trip_id)
+    else:
+        sql = "SELECT total_distance_km FROM trips WHERE id = ?"
+        params = (trip_id,)
+    async with db.execute(sql, params) as cursor:
+        trip_row = await cursor.fetchone()
+
+    total = (trip_row["total_distance_km"] or 0) if trip_row else 0
+    return point, distance_added, total
+
+
+@timed("add_point")
+async def add_point(
+    db: aiosqlite.Connection, 
+    trip_id: int, 
+    lat: float, 
+    lng: float
+) -> Tuple[TripPoint, float, float]:
+    """Add a point to a trip and return the point, distance added, and total distance."""
+    last_point = await get_last_point(db, trip_id)
+    point, distance_added, total = await insert_point(db, trip_id, lat, lng, last_point)
     await db.commit()
     
-    # Get the inserted point
-    async with db.execute(
-        "SELECT * FROM trip_points WHERE id = ?",
-        (cursor.lastrowid,)
-    ) as cursor:
-        point_row = await cursor.fetchone()
-        point = row_to_trip_point(point_row)
+    if live_trips is not None:
+        live_trips.record_point(trip_id, point, total)
+    return point, distance_added, total
+
+
+@timed("add_points")
+async def add_points(
+    db: aiosqlite.Connection,
+    trip_id: int,
+    points: List[Tuple[float, float, Optional[str]]]
+) -> Tuple[int, float, float]:
+    """Add a batch of (lat, lng, timestamp) points in one transaction.
+
+    Returns the number of points added, the distance they add and the new total.
+    A missing timestamp defaults to the insert time.
+    """
+    last_point = await get_last_point(db, trip_id)
     
-    # Update total distance if needed
-    if distance_added > 0:
-        await db.execute(
-            "UPDATE trips SET total_distance_km = total_distance_km + ? WHERE id = ?",
-            (distance_added, trip_id)
-        )
-        await db.commit()
+    # Distance across the whole batch, chained from the last stored point
+    distance_added = 0.0
+    prev = (last_point.lat, last_point.lng) if last_point else None
+    for lat, lng, _ in points:
+        if prev is not None:
+            distance_added += haversine_km(prev[0], prev[1], lat, lng)
+        prev = (lat, lng)
     
-    # Get updated trip
+    await db.executemany(
+        "INSERT INTO trip_points (trip_id, timestamp, lat, lng) VALUES (?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?)",
+        [(trip_id, timestamp, lat, lng) for lat, lng, timestamp in points]
+    )
     async with db.execute(
-        "SELECT * FROM trips WHERE id = ?",
-        (trip_id,)
+        "UPDATE trips SET total_distance_km = total_distance_km + ? WHERE id = ? RETURNING total_distance_km",
+        (distance_added, trip_id)
     ) as cursor:
         trip_row = await cursor.fetchone()
-        total = trip_row["total_distance_km"] or 0
+    await db.commit()
     
-    return point, distance_added, total
+    # Inserted rows are not read back, so reload the cached trip on next use
+    if live_trips is not None:
+        live_trips.invalidate(trip_id)
+    
+    total = (trip_row["total_distance_km"] or 0) if trip_row else 0
+    return len(points), distance_added, total
 
 
+@timed("stop_trip")
 async def stop_trip(db: aiosqlite.Connection, trip_id: int, final_fuel: Optional[float] = None) -> Trip:
     """Stop a trip and return the updated trip."""
-    await db.execute(
-        "UPDATE trips SET ended_at = CURRENT_TIMESTAMP, final_fuel_liters = ? WHERE id = ? AND ended_at IS NULL",
-        (final_fuel, trip_id)
-    )
-    await db.commit()
-    
     async with db.execute(
-        "SELECT * FROM trips WHERE id = ?",
-        (trip_id,)
+        "UPDATE trips SET ended_at = CURRENT_TIMESTAMP, final_fuel_liters = ? WHERE id = ? AND ended_at IS NULL RETURNING *",
+        (final_fuel, trip_id)
     ) as cursor:
         row = await cursor.fetchone()
-        return row_to_trip(row)
+    
+    if row is None:
+        # Already stopped
+        async with db.execute(
+            "SELECT * FROM trips WHERE id = ?",
+            (trip_id,)
+        ) as cursor:
+            return row_to_trip(await cursor.fetchone())
+    
+    trip = row_to_trip(row)
+    await apply_finished_trip(db, trip.user_id, trip.id)
+    await db.commit()
+    
+    if live_trips is not None:
+        live_trips.end(trip_id)
+    if trip_events is not None and trip_events.has_subscribers(trip.user_id):
+        trip_events.publish(trip.user_id, "stop", {"trip": trip.model_dump()})
+    return trip
 
 
+@timed("list_trip_points")
 async def list_trip_points(db: aiosqlite.Connection, trip_id: int, limit: int = 100) -> List[TripPoint]:
     """List points for a trip."""
+    if live_trips is not None:
+        state = live_trips.for_trip(trip_id)
+        if state is not None and (state.complete or len(state.recent) >= limit):
+            return list(reversed(state.recent))[:limit]
+    
+    points = await _select_trip_points(db, trip_id, limit)
+    if points:
+        return points
+    
+    # Finished trips may have been compacted into a track
+    track = await load_track(db, trip_id)
+    return list(reversed(track))[:limit] if track else []
+
+
+async def _select_trip_points(db: aiosqlite.Connection, trip_id: int, limit: int) -> List[TripPoint]:
     async with db.execute(
-        "SELECT * FROM trip_points WHERE trip_id = ? ORDER BY timestamp DESC LIMIT ?",
+        "SELECT * FROM trip_points WHERE trip_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
         (trip_id, limit)
     ) as cursor:
         rows = await cursor.fetchall()
         return [row_to_trip_point(row) for row in rows]
 
 
+@timed("load_trip_coordinates")
+async def load_trip_coordinates(db: aiosqlite.Connection, trip_id: int) -> Tuple[List[float], List[float]]:
+    """Load a trip's coordinates in travel order as (lats, lngs)."""
+    async with db.execute(
+        "SELECT lat, lng FROM trip_points WHERE trip_id = ? ORDER BY timestamp, id",
+        (trip_id,)
+    ) as cursor:
+        rows = await cursor.fetchall()
+    if not rows:
+        coordinates = await load_track_coordinates(db, trip_id)
+        if coordinates:
+            return coordinates
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+async def recompute_trip_distance(
+    db: aiosqlite.Connection,
+    trip_id: int,
+    tolerance_km: float = 1e-3,
+    dry_run: bool = False
+) -> Optional[Tuple[float, float]]:
+    """Recompute a trip's total distance from its points (does not commit).
+
+    Returns (stored, computed) totals, or None if the trip does not exist.
+    The stored total is only rewritten when it is off by more than `tolerance_km`.
+    """
+    async with db.execute(
+        "SELECT user_id, ended_at, total_distance_km FROM trips WHERE id = ?",
+        (trip_id,)
+    ) as cursor:
+        trip_row = await cursor.fetchone()
+    if trip_row is None:
+        return None
+    
+    lats, lngs = await load_trip_coordinates(db, trip_id)
+    computed = sum(segment_distances_km(lats, lngs))
+    stored = trip_row["total_distance_km"] or 0
+    
+    if not dry_run and abs(computed - stored) > tolerance_km:
+        await db.execute(
+            "UPDATE trips SET total_distance_km = ? WHERE id = ?",
+            (computed, trip_id)
+        )
+        if trip_row["ended_at"] is None:
+            if live_trips is not None:
+                live_trips.set_total(trip_id, computed)
+        else:
+            # Finished trips feed the consumption stats window
+            await rebuild_fuel_stats(db, trip_row["user_id"])
+    return stored, computed
+
+
+async def recompute_all_trip_distances(
+    db: aiosqlite.Connection,
+    tolerance_km: float = 1e-3,
+    dry_run: bool = False,
+    commit_every: int = 100
+) -> Tuple[int, int]:
+    """Reconcile every trip's stored total against its points.
+
+    Returns (trips checked, trips whose total was off).
+    """
+    async with db.execute("SELECT id FROM trips ORDER BY id") as cursor:
+        trip_ids = [row[0] for row in await cursor.fetchall()]
+    
+    mismatched = 0
+    for i, trip_id in enumerate(trip_ids, 1):
+        result = await recompute_trip_distance(db, trip_id, tolerance_km, dry_run)
+        if result is not None and abs(result[1] - result[0]) > tolerance_km:
+            mismatched += 1
+        if i % commit_every == 0:
+            await db.commit()
+    await db.commit()
+    return len(trip_ids), mismatched
+
+
 async def get_all_trips(db: aiosqlite.Connection, user_id: int) -> List[Trip]:
     """Get all trips for a user."""
     async with db.execute(
@@ -143,6 +382,17 @@ async def get_all_trips(db: aiosqlite.Connection, user_id: int) -> List[Trip]:
         return [row_to_trip(row) for row in rows]
 
 
+TRIP_CSV_HEADER = [
+    "id",
+    "user_id",
+    "started_at",
+    "ended_at",
+    "initial_fuel_liters",
+    "final_fuel_liters",
+    "total_distance_km"
+]
+
+
 def convert_trips_to_csv(trips: List[Trip]) -> str:
     """Convert a list of trips to CSV format."""
     import csv
@@ -152,15 +402,7 @@ def convert_trips_to_csv(trips: List[Trip]) -> str:
     writer = csv.writer(output)
     
     # Write headers
-    writer.writerow([
-        "id",
-        "user_id",
-        "started_at",
-        "ended_at",
-        "initial_fuel_liters",
-        "final_fuel_liters",
-        "total_distance_km"
-    ])
+    writer.writerow(TRIP_CSV_HEADER)
     
     # Write data rows
     for trip in trips:
@@ -175,3 +417,111 @@ def convert_trips_to_csv(trips: List[Trip]) -> str:
         ])
     
     return output.getvalue()
+
+
+@timed("list_trips_page")
+async def list_trips_page(
+    db: aiosqlite.Connection,
+    user_id: int,
+    limit: int,
+    before: Optional[Tuple[str, int]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    min_distance: Optional[float] = None,
+    max_distance: Optional[float] = None,
+) -> List[aiosqlite.Row]:
+    """Fetch one page of a user's trip rows, newest first.
+
+    `before` is the (started_at, id) keyset of the last row of the previous page;
+    `start`/`end` bound started_at (inclusive/exclusive) and
+    `min_distance`/`max_distance` bound total_distance_km (inclusive).
+    """
+    where = ["user_id = ?"]
+    params: list = [user_id]
+    if before is not None:
+        where.append("(started_at, id) < (?, ?)")
+        params.extend(before)
+    if start is not None:
+        where.append("started_at >= ?")
+        params.append(start)
+    if end is not None:
+        where.append("started_at < ?")
+        params.append(end)
+    if min_distance is not None:
+        where.append("total_distance_km >= ?")
+        params.append(min_distance)
+    if max_distance is not None:
+        where.append("total_distance_km <= ?")
+        params.append(max_distance)
+    params.append(limit)
+    
+    async with db.execute(
+        f"SELECT * FROM trips WHERE {' AND '.join(where)} ORDER BY started_at DESC, id DESC LIMIT ?",
+        params
+    ) as cursor:
+        return await cursor.fetchall()
+
+
+async def list_trips(
+    db: aiosqlite.Connection,
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    **filters
+) -> Tuple[List[Trip], Optional[str]]:
+    """List one page of trips and the cursor of the next page (None on the last page)."""
+    before = decode_trip_cursor(cursor) if cursor else None
+    rows = await list_trips_page(db, user_id, limit + 1, before, **filters)
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_trip_cursor(rows[-1]["started_at"], rows[-1]["id"])
+    return [row_to_trip(row) for row in rows], next_cursor
+
+
+async def iter_trips_csv(
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> AsyncIterator[str]:
+    """Yield a user's trips as CSV text, one chunk per keyset page.
+
+    Each page borrows its own connection so a slow client does not pin one
+    for the whole download.
+    """
+    import csv
+    import io
+    
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(TRIP_CSV_HEADER)
+    
+    before = None
+    while True:
+        async with db_connection() as db:
+            rows = await list_trips_page(db, user_id, page_size, before, start, end)
+        
+        for row in rows:
+            initial = row["initial_fuel_liters"]
+            final = row["final_fuel_liters"]
+            writer.writerow([
+                row["id"],
+                row["user_id"],
+                row["started_at"],
+                row["ended_at"] or "",
+                initial if initial is not None else "",
+                final if final is not None else "",
+                float(row["total_distance_km"] or 0)
+            ])
+        
+        chunk = output.getvalue()
+        if chunk:
+            yield chunk
+            output.seek(0)
+            output.truncate()
+        
+        if len(rows) < page_size:
+            return
+        before = (rows[-1]["started_at"], rows[-1]["id"])
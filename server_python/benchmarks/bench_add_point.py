@@ -0,0 +1,113 @@
+"""
+Per-point ingest benchmark: legacy add_point vs the single-transaction fast path.
+
+Reports latency per point and how many statements and commits each point costs.
+With journal_mode=WAL and synchronous=FULL every commit is one fsync of the WAL,
+so the commit count is the fsync count.
+
+    python -m benchmarks.bench_add_point --points 2000 --synchronous FULL
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import aiosqlite
+
+from app.calc import haversine_km
+from app.database import init_database, set_db_path
+from app.trips import add_point, row_to_trip_point, start_trip
+
+
+async def legacy_add_point(db: aiosqlite.Connection, trip_id: int, lat: float, lng: float):
+    """The original five-statement, two-commit add_point."""
+    async with db.execute(
+        "SELECT * FROM trip_points WHERE trip_id = ? ORDER BY timestamp DESC LIMIT 1",
+        (trip_id,)
+    ) as cursor:
+        last_point_row = await cursor.fetchone()
+
+    distance_added = 0.0
+    if last_point_row:
+        last_point = row_to_trip_point(last_point_row)
+        distance_added = haversine_km(last_point.lat, last_point.lng, lat, lng)
+
+    cursor = await db.execute(
+        "INSERT INTO trip_points (trip_id, lat, lng) VALUES (?, ?, ?)",
+        (trip_id, lat, lng)
+    )
+    await db.commit()
+
+    async with db.execute("SELECT * FROM trip_points WHERE id = ?", (cursor.lastrowid,)) as cursor:
+        point = row_to_trip_point(await cursor.fetchone())
+
+    if distance_added > 0:
+        await db.execute(
+            "UPDATE trips SET total_distance_km = total_distance_km + ? WHERE id = ?",
+            (distance_added, trip_id)
+        )
+        await db.commit()
+
+    async with db.execute("SELECT * FROM trips WHERE id = ?", (trip_id,)) as cursor:
+        total = (await cursor.fetchone())["total_distance_km"] or 0
+
+    return point, distance_added, total
+
+
+async def run(fn, points: int, synchronous: str) -> dict:
+    """Insert `points` fixes through `fn` into a fresh database and collect timings."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        set_db_path(db_path)
+        await init_database()
+
+        async with aiosqlite.connect(db_path) as db:
+            db.row_factory = aiosqlite.Row
+            await db.execute(f"PRAGMA synchronous = {synchronous};")
+            await db.execute("INSERT INTO users (email, password_hash) VALUES ('bench@example.com', 'x')")
+            await db.commit()
+            trip = await start_trip(db, 1, 50)
+
+            statements = []
+            await db.set_trace_callback(statements.append)
+
+            latencies = []
+            for i in range(points):
+                start = time.perf_counter()
+                await fn(db, trip.id, 40.0 + i * 1e-4, -3.0 + i * 1e-4)
+                latencies.append(time.perf_counter() - start)
+
+            await db.set_trace_callback(None)
+
+    latencies.sort()
+    commits = sum(1 for sql in statements if sql.strip().upper() == "COMMIT")
+    return {
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "statements_per_point": len(statements) / points,
+        "commits_per_point": commits / points,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--synchronous", default="FULL", choices=["OFF", "NORMAL", "FULL"])
+    args = parser.parse_args()
+
+    print(f"{args.points} points, synchronous={args.synchronous}")
+    print(f"{'variant':<10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'stmts/pt':>9} {'fsyncs/pt':>10}")
+    for name, fn in (("legacy", legacy_add_point), ("fast", add_point)):
+        r = await run(fn, args.points, args.synchronous)
+        print(
+            f"{name:<10} {r['mean_ms']:>9.3f} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f} "
+            f"{r['statements_per_point']:>9.1f} {r['commits_per_point']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
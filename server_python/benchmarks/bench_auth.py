@@ -0,0 +1,61 @@
+"""
+Auth overhead per request: jwt.decode on every call vs the verified-token cache.
+
+Times decode_token alone, then whole authenticated GET /auth/me requests
+through the ASGI app, with the cache off and on.
+
+    python -m benchmarks.bench_auth --calls 20000 --requests 2000
+"""
+
+import argparse
+import asyncio
+import timeit
+
+import httpx
+
+from app import auth
+from app.auth import TokenCache, create_access_token, decode_token
+from app.main import app
+
+
+async def time_requests(token: str, n: int) -> float:
+    """Mean seconds per authenticated request."""
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(min(n, 200)):
+            await client.get("/auth/me", headers=headers)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(n):
+            await client.get("/auth/me", headers=headers)
+        return (loop.time() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    token = create_access_token(1, "bench@example.com")
+    results = {}
+    cache = TokenCache()
+    # Alternate the two modes and keep each one's best round to even out warm-up
+    for _ in range(2):
+        for label, mode in (("uncached", None), ("cached", cache)):
+            auth.token_cache = mode
+            per_call = min(timeit.repeat(lambda: decode_token(token), number=args.calls, repeat=3)) / args.calls
+            per_request = asyncio.run(time_requests(token, args.requests))
+            best = results.get(label, (per_call, per_request))
+            results[label] = (min(best[0], per_call), min(best[1], per_request))
+    print(f"cache stats: {cache.stats()}")
+
+    print(f"{'':>9} {'decode us':>10} {'request us':>11}")
+    for label, (per_call, per_request) in results.items():
+        print(f"{label:>9} {per_call * 1e6:>10.1f} {per_request * 1e6:>11.1f}")
+    saved = results["uncached"][1] - results["cached"][1]
+    print(f"saved per request: {saved * 1e6:.1f} us ({saved / results['uncached'][1]:.0%})")
+
+
+if __name__ == "__main__":
+    main()
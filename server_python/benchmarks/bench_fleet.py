@@ -0,0 +1,185 @@
+"""
+Load test: how many concurrent drivers one instance sustains.
+
+Each simulated driver signs up, then drives trips back to back until the run
+ends: start a trip, post a fix every --interval seconds along a synthetic
+random-walk route, poll /trips/active every --poll fixes, snapshot fuel
+halfway through and stop. Drivers start spread over --ramp seconds.
+
+Reports throughput, per-route p50/p95/p99 and errors, how far drivers fell
+behind their fix schedule (the saturation signal) and database growth.
+
+By default the app runs in-process against a temp SQLite file. With --url it
+drives a local uvicorn instead (pass --db with that server's DB_PATH to also
+measure growth):
+
+    python -m benchmarks.bench_fleet --drivers 200 --seconds 60
+    python -m benchmarks.bench_fleet --url http://127.0.0.1:4000 --db ./data/gastracker.db
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def db_size(path: str) -> int:
+    """Bytes of the database file plus its WAL."""
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+class Recorder:
+    """Per-route latencies and status codes."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.slip = []
+
+    async def request(self, client, method: str, path: str, **kwargs):
+        route = f"{method} {path}"
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.statuses[route][type(e).__name__] += 1
+            return None
+        self.latencies[route].append(time.perf_counter() - start)
+        self.statuses[route][response.status_code] += 1
+        return response
+
+
+class Route:
+    """Random walk at road speeds from a start near the city centre."""
+
+    def __init__(self, rng: random.Random, interval: float):
+        self.rng = rng
+        self.interval = interval
+        self.lat = 40.4168 + rng.uniform(-0.2, 0.2)
+        self.lng = -3.7038 + rng.uniform(-0.2, 0.2)
+        self.heading = rng.uniform(0, 2 * math.pi)
+
+    def next(self):
+        self.heading += self.rng.gauss(0, math.radians(15))
+        km = self.rng.uniform(30, 90) * self.interval / 3600
+        self.lat += km / 111.32 * math.cos(self.heading)
+        self.lng += km / (111.32 * math.cos(math.radians(self.lat))) * math.sin(self.heading)
+        return {"lat": round(self.lat, 6), "lng": round(self.lng, 6)}
+
+
+async def driver(client, recorder: Recorder, index: int, run_id: str, args, delay: float, until: float):
+    rng = random.Random(args.seed * 100003 + index)
+    await asyncio.sleep(delay)
+    r = await recorder.request(
+        client, "POST", "/auth/signup",
+        json={"email": f"fleet{run_id}-{index}@example.com", "password": "secret1"},
+    )
+    if r is None or r.status_code >= 400:
+        return
+    headers = {"Authorization": f"Bearer {r.json()['token']}"}
+
+    while time.perf_counter() < until:
+        fuel = rng.uniform(20, 50)
+        r = await recorder.request(client, "POST", "/trips/start", json={"initialFuelLiters": round(fuel, 1)}, headers=headers)
+        if r is None or r.status_code >= 400:
+            await asyncio.sleep(args.interval)
+            continue
+        route = Route(rng, args.interval)
+        fixes = max(2, int(args.trip_seconds / args.interval))
+        next_fix = time.perf_counter()
+        for n in range(fixes):
+            if time.perf_counter() >= until:
+                break
+            await recorder.request(client, "POST", "/trips/point", json=route.next(), headers=headers)
+            if args.poll and n % args.poll == args.poll - 1:
+                await recorder.request(client, "GET", "/trips/active", headers=headers)
+            if n == fixes // 2:
+                fuel -= rng.uniform(0.5, 2)
+                await recorder.request(client, "POST", "/fuel/snapshot", json={"fuelLiters": round(fuel, 1)}, headers=headers)
+            next_fix += args.interval
+            # How late the driver is for its next fix; grows without bound once saturated
+            recorder.slip.append(max(0.0, time.perf_counter() - next_fix))
+            await asyncio.sleep(max(0.0, next_fix - time.perf_counter()))
+        await recorder.request(client, "POST", "/trips/stop", json={"finalFuelLiters": round(fuel - 1, 1)}, headers=headers)
+
+
+async def run(args):
+    run_id = f"{int(time.time())}{random.Random(args.seed).randrange(1000):03d}"
+    db_path = args.db
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30, limits=httpx.Limits(max_connections=None))
+        lifespan = None
+    else:
+        db_path = db_path or os.path.join(tempfile.mkdtemp(), "fleet.db")
+        os.environ["DB_PATH"] = db_path
+        # Signups would otherwise dominate short runs
+        os.environ.setdefault("BCRYPT_ROUNDS", "4")
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fleet", timeout=30)
+        lifespan = app.router.lifespan_context(app)
+
+    recorder = Recorder()
+    if lifespan is not None:
+        await lifespan.__aenter__()
+    try:
+        size_before = db_size(db_path) if db_path else None
+        target = f"{args.url}" if args.url else f"in-process app ({db_path})"
+        print(f"{args.drivers} drivers, a fix every {args.interval}s, trips of {args.trip_seconds}s, "
+              f"{args.seconds}s against {target}")
+        start = time.perf_counter()
+        until = start + args.seconds
+        async with client:
+            await asyncio.gather(*(
+                driver(client, recorder, i, run_id, args, args.ramp * i / max(1, args.drivers), until)
+                for i in range(args.drivers)
+            ))
+        elapsed = time.perf_counter() - start
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    total = sum(len(v) for v in recorder.latencies.values())
+    print(f"\n{total} requests in {elapsed:.1f}s = {total / elapsed:.1f} req/s")
+    print(f"{'route':<22} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for route in sorted(recorder.statuses):
+        ms = [v * 1000 for v in recorder.latencies[route]] or [0.0]
+        statuses = dict(recorder.statuses[route])
+        print(f"{route:<22} {len(recorder.latencies[route]):>7} {statistics.median(ms):>8.1f} "
+              f"{percentile(ms, 0.95):>8.1f} {percentile(ms, 0.99):>8.1f}  {statuses}")
+    if recorder.slip:
+        print(f"\nschedule slip: p50 {statistics.median(recorder.slip):.2f}s, "
+              f"p99 {percentile(recorder.slip, 0.99):.2f}s, max {max(recorder.slip):.2f}s")
+    if db_path:
+        size_after = db_size(db_path)
+        print(f"database: {size_before / 1e6:.2f} MB -> {size_after / 1e6:.2f} MB "
+              f"(+{(size_after - size_before) / 1e6:.2f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=60, help="length of the run")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between a driver's fixes")
+    parser.add_argument("--trip-seconds", type=float, default=300, help="length of each trip")
+    parser.add_argument("--poll", type=int, default=3, help="poll /trips/active every this many fixes (0: never)")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which drivers start")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="base URL of a running server instead of the in-process app")
+    parser.add_argument("--db", help="database file to measure (default: a temp file for the in-process app)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Micro-benchmark: scalar haversine_km loop vs the batch segment_distances_km kernel.
+
+    python -m benchmarks.bench_haversine --sizes 100 1000 10000 100000
+"""
+
+import argparse
+import random
+import timeit
+
+from app.calc import NUMPY_AVAILABLE, haversine_km, segment_distances_km
+
+
+def random_route(n: int, seed: int = 42):
+    """A random walk of n fixes around Madrid."""
+    rng = random.Random(seed)
+    lats, lngs = [40.4168], [-3.7038]
+    for _ in range(n - 1):
+        lats.append(lats[-1] + rng.uniform(-0.001, 0.001))
+        lngs.append(lngs[-1] + rng.uniform(-0.001, 0.001))
+    return lats, lngs
+
+
+def scalar_total(lats, lngs) -> float:
+    total = 0.0
+    for i in range(len(lats) - 1):
+        total += haversine_km(lats[i], lngs[i], lats[i + 1], lngs[i + 1])
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"numpy available: {NUMPY_AVAILABLE}")
+    print(f"{'points':>8} {'scalar ms':>10} {'batch ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        lats, lngs = random_route(n)
+        number = max(1, 100000 // n)
+        scalar = min(timeit.repeat(lambda: scalar_total(lats, lngs), number=number, repeat=args.repeat)) / number
+        batch = min(timeit.repeat(lambda: sum(segment_distances_km(lats, lngs)), number=number, repeat=args.repeat)) / number
+        print(f"{n:>8} {scalar * 1000:>10.3f} {batch * 1000:>10.3f} {scalar / batch:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
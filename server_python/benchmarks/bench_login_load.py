@@ -0,0 +1,115 @@
+"""
+Load test: write latency on /trips/point while logins are happening.
+
+Simulated drivers post a fix every --interval seconds while --logins clients
+log in back to back. It runs three phases: no logins, bcrypt inline on the
+event loop (the old behaviour), and bcrypt in the password executor. Each
+phase reports point write latency percentiles, how often and how long a
+request waited for a pooled connection, and login throughput/rejections.
+More login clients than DB_POOL_SIZE show whether logins keep connections
+busy while they hash.
+
+    python -m benchmarks.bench_login_load --drivers 20 --logins 8 --seconds 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "load.db"))
+# Drivers post far faster than the per-user ingest budget allows
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from app import auth, database  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def driver(client, token: str, interval: float, until: float, latencies: list):
+    headers = {"Authorization": f"Bearer {token}"}
+    await client.post("/trips/start", json={"initialFuelLiters": 40}, headers=headers)
+    lat = 40.0
+    while time.perf_counter() < until:
+        lat += 0.0001
+        start = time.perf_counter()
+        await client.post("/trips/point", json={"lat": lat, "lng": -3.7}, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    await client.post("/trips/stop", json={"finalFuelLiters": 39}, headers=headers)
+
+
+async def login_loop(client, until: float, counts: dict):
+    while time.perf_counter() < until:
+        r = await client.post("/auth/login", json={"email": "login@example.com", "password": "secret1"})
+        counts[r.status_code] = counts.get(r.status_code, 0) + 1
+        if r.status_code == 429:
+            await asyncio.sleep(0.05)
+
+
+def pool_counters() -> tuple:
+    pool = database.get_pool()
+    if pool is None:
+        return 0, 0.0
+    stats = pool.stats()
+    return stats["waits"], stats["waitTimeMaxMs"]
+
+
+async def phase(client, tokens, logins: int, args) -> tuple:
+    pool = database.get_pool()
+    if pool is not None:
+        # Per-phase maximum; the wait counter is diffed instead
+        pool.wait_time_max = 0.0
+    waits_before, _ = pool_counters()
+    until = time.perf_counter() + args.seconds
+    latencies: list = []
+    counts: dict = {}
+    await asyncio.gather(
+        *(driver(client, t, args.interval, until, latencies) for t in tokens),
+        *(login_loop(client, until, counts) for _ in range(logins)),
+    )
+    waits, wait_max = pool_counters()
+    return latencies, counts, waits - waits_before, wait_max
+
+
+async def run(args):
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load") as client:
+            tokens = []
+            for i in range(args.drivers):
+                r = await client.post("/auth/signup", json={"email": f"driver{i}@example.com", "password": "secret1"})
+                tokens.append(r.json()["token"])
+            await client.post("/auth/signup", json={"email": "login@example.com", "password": "secret1"})
+
+            workers = auth.PASSWORD_WORKERS
+            print(f"bcrypt rounds {auth.BCRYPT_ROUNDS}, {args.drivers} drivers every {args.interval}s, {args.logins} login clients")
+            print(f"{'phase':>10} {'writes':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+                  f"{'pool waits':>11} {'wait max ms':>12}  logins")
+            for label, logins, mode in (("no logins", 0, workers), ("inline", args.logins, 0), ("executor", args.logins, workers or 2)):
+                auth.PASSWORD_WORKERS = mode
+                latencies, counts, waits, wait_max = await phase(client, tokens, logins, args)
+                ms = [v * 1000 for v in latencies]
+                print(f"{label:>10} {len(ms):>7} {statistics.median(ms):>8.1f} {percentile(ms, 0.99):>8.1f} "
+                      f"{max(ms):>8.1f} {waits:>11} {wait_max:>12.1f}  {counts}")
+            auth.PASSWORD_WORKERS = workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=8, help="concurrent clients logging in back to back")
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between a driver's fixes")
+    parser.add_argument("--seconds", type=float, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Micro-benchmark: one Douglas-Peucker run per level vs the single-pass multi-level simplify.
+
+    python -m benchmarks.bench_simplify --sizes 1000 10000 50000
+"""
+
+import argparse
+import timeit
+
+from app.calc import NUMPY_AVAILABLE
+from app.config import SIMPLIFY_TOLERANCES_M
+from app.simplify import simplify, simplify_levels
+from benchmarks.bench_haversine import random_route
+
+
+def per_level(lats, lngs):
+    return {tol: simplify(lats, lngs, tol) for tol in SIMPLIFY_TOLERANCES_M}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"numpy available: {NUMPY_AVAILABLE}, tolerances: {SIMPLIFY_TOLERANCES_M}")
+    print(f"{'points':>8} {'per-level ms':>13} {'one-pass ms':>12} {'speedup':>8}  kept per level")
+    for n in args.sizes:
+        lats, lngs = random_route(n)
+        number = max(1, 20000 // n)
+        separate = min(timeit.repeat(lambda: per_level(lats, lngs), number=number, repeat=args.repeat)) / number
+        single = min(timeit.repeat(lambda: simplify_levels(lats, lngs), number=number, repeat=args.repeat)) / number
+        kept = [len(level[0]) for level in simplify_levels(lats, lngs).values()]
+        print(f"{n:>8} {separate * 1000:>13.2f} {single * 1000:>12.2f} {separate / single:>7.1f}x  {kept}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Location search benchmark: plain trip_points query vs the trip_bounds index.
+
+Seeds a multi-million point history shared by many users driving in the same
+area (the trip boxes are grown by their insert trigger), then times one user's
+bbox and radius searches of several sizes: a plain query over every point of
+the user's trips, the indexed search over point rows, and the indexed search
+again after every trip is compacted. The longest event loop stall seen during
+the compacted searches is reported too, and a last column times the compacted
+bbox search with the default SEARCH_MAX_POINTS budget (the others scan every
+candidate so their results can be checked against the plain query).
+
+    python -m benchmarks.bench_spatial --users 200 --trips 2000 --points 1000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from app.config import SEARCH_MAX_POINTS
+from app.database import connect, init_database, set_db_path
+from app.spatial import bbox_around, search_bbox, search_near
+from app.tracks import compact_trip
+
+CENTER = (40.4168, -3.7038)
+
+
+def seed(db_path: str, users: int, trips: int, points: int):
+    """Insert finished trips as 5 s random walks over ~100 km around Madrid, round-robin over users."""
+    rng = random.Random(11)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executemany(
+        "INSERT INTO users (email, password_hash) VALUES (?, 'x')",
+        [(f"bench{u}@example.com",) for u in range(users)]
+    )
+    for t in range(trips):
+        trip_id = conn.execute(
+            "INSERT INTO trips (user_id, ended_at, total_distance_km) VALUES (?, CURRENT_TIMESTAMP, 0)",
+            (t % users + 1,)
+        ).lastrowid
+        lat, lng = CENTER[0] + rng.uniform(-0.5, 0.5), CENTER[1] + rng.uniform(-0.5, 0.5)
+        rows = []
+        for _ in range(points):
+            lat += rng.uniform(-0.0005, 0.0005)
+            lng += rng.uniform(-0.0005, 0.0005)
+            rows.append((trip_id, lat, lng))
+        conn.executemany("INSERT INTO trip_points (trip_id, lat, lng) VALUES (?, ?, ?)", rows)
+        if t % 100 == 99:
+            conn.commit()
+    conn.commit()
+    conn.close()
+
+
+def scan_bbox(db_path: str, bbox) -> int:
+    """The query the search would need without the boxes: every point of the user's trips."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            """SELECT DISTINCT p.trip_id FROM trip_points p JOIN trips t ON t.id = p.trip_id
+               WHERE p.lat BETWEEN ? AND ? AND p.lng BETWEEN ? AND ? AND t.user_id = 1""",
+            (min_lat, max_lat, min_lng, max_lng)
+        ).fetchall()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+async def watch_loop(stalls: list):
+    """Record the longest gap between 1 ms ticks of the event loop."""
+    last = time.perf_counter()
+    while True:
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        stalls[0] = max(stalls[0], now - last)
+        last = now
+
+
+async def timed_searches(radii):
+    """Per radius: (bbox results, bbox s, near s, longest loop stall s, capped bbox s) for user 1."""
+    db = await connect()
+    try:
+        timings = []
+        for radius in radii:
+            bbox = bbox_around(CENTER[0], CENTER[1], radius)
+            stalls = [0.0]
+            watcher = asyncio.ensure_future(watch_loop(stalls))
+            start = time.perf_counter()
+            found = await search_bbox(db, 1, bbox, limit=10 ** 9, max_points=10 ** 12)
+            indexed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            await search_near(db, 1, CENTER[0], CENTER[1], radius, limit=10 ** 9, max_points=10 ** 12)
+            near = time.perf_counter() - start
+            watcher.cancel()
+
+            start = time.perf_counter()
+            await search_bbox(db, 1, bbox, limit=10 ** 9, max_points=SEARCH_MAX_POINTS)
+            capped = time.perf_counter() - start
+            timings.append((found, indexed, near, stalls[0], capped))
+        return timings
+    finally:
+        await db.close()
+
+
+async def compact_all(trips: int):
+    db = await connect()
+    try:
+        for trip_id in range(1, trips + 1):
+            await compact_trip(db, trip_id)
+        await db.commit()
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--trips", type=int, default=2000, help="trips over all users")
+    parser.add_argument("--points", type=int, default=1000, help="points per trip")
+    parser.add_argument("--radii", type=int, nargs="+", default=[500, 2000, 10000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        set_db_path(db_path)
+        asyncio.run(init_database())
+
+        start = time.perf_counter()
+        seed(db_path, args.users, args.trips, args.points)
+        total = args.trips * args.points
+        print(f"seeded {total} points for {args.users} users in {time.perf_counter() - start:.1f} s; "
+              f"searching as user 1 ({len(range(0, args.trips, args.users))} trips)")
+
+        scans = []
+        for radius in args.radii:
+            start = time.perf_counter()
+            scans.append((scan_bbox(db_path, bbox_around(CENTER[0], CENTER[1], radius)), time.perf_counter() - start))
+        rows = asyncio.run(timed_searches(args.radii))
+        asyncio.run(compact_all(args.trips))
+        tracks = asyncio.run(timed_searches(args.radii))
+
+    print(f"{'radius m':>9} {'trips':>6} {'scan ms':>9} {'rows bbox':>10} {'rows near':>10} "
+          f"{'track bbox':>11} {'track near':>11} {'speedup':>8} {'stall ms':>9} {'capped ms':>10}")
+    for radius, (scanned, scan), (found, indexed, near, _, _), (compacted, track_bbox, track_near, stall, capped) in zip(
+        args.radii, scans, rows, tracks
+    ):
+        assert len(found) == scanned
+        assert [r.tripId for r in compacted] == [r.tripId for r in found]
+        print(f"{radius:>9} {scanned:>6} {scan * 1000:>9.1f} {indexed * 1000:>10.1f} {near * 1000:>10.1f} "
+              f"{track_bbox * 1000:>11.1f} {track_near * 1000:>11.1f} {scan / indexed:>7.1f}x "
+              f"{stall * 1000:>9.1f} {capped * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Storage and read benchmark for compacted trip tracks.
+
+Seeds finished trips as trip_points rows, measures the database size and the
+time to read a whole trip, then compacts every trip into trip_tracks and
+measures again.
+
+    python -m benchmarks.bench_tracks --trips 200 --points 2000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from app.database import connect, init_database, set_db_path
+from app.tracks import compact_trip
+from app.trips import list_trip_points, load_trip_coordinates
+
+
+def seed(db_path: str, trips: int, points: int):
+    """Insert finished trips with 5 s random-walk fixes."""
+    rng = random.Random(7)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users (email, password_hash) VALUES ('bench@example.com', 'x')")
+    for t in range(trips):
+        cur = conn.execute(
+            """INSERT INTO trips (user_id, started_at, ended_at, initial_fuel_liters, final_fuel_liters, total_distance_km)
+               VALUES (1, datetime('2026-01-01', ?), datetime('2026-01-01', ?), 50, 45, 0)""",
+            (f"+{t} hour", f"+{t} hour")
+        )
+        trip_id = cur.lastrowid
+        lat, lng = 40.4168 + rng.uniform(-0.5, 0.5), -3.7038 + rng.uniform(-0.5, 0.5)
+        rows = []
+        for i in range(points):
+            lat += rng.uniform(-0.0005, 0.0005)
+            lng += rng.uniform(-0.0005, 0.0005)
+            rows.append((trip_id, f"+{t * 3600 + i * 5} second", lat, lng))
+        conn.executemany(
+            "INSERT INTO trip_points (trip_id, timestamp, lat, lng) VALUES (?, datetime('2026-01-01', ?), ?, ?)",
+            rows
+        )
+    conn.commit()
+    conn.close()
+
+
+def db_size(db_path: str) -> int:
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(db_path)
+
+
+async def read_all(trips: int, points: int):
+    """Average seconds to read one whole trip as TripPoints and as bare coordinates."""
+    db = await connect()
+    start = time.perf_counter()
+    for trip_id in range(1, trips + 1):
+        result = await list_trip_points(db, trip_id, points)
+        assert len(result) == points
+    models = (time.perf_counter() - start) / trips
+    
+    start = time.perf_counter()
+    for trip_id in range(1, trips + 1):
+        lats, _ = await load_trip_coordinates(db, trip_id)
+        assert len(lats) == points
+    coords = (time.perf_counter() - start) / trips
+    await db.close()
+    return models, coords
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trips", type=int, default=200)
+    parser.add_argument("--points", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        set_db_path(db_path)
+        await init_database()
+        seed(db_path, args.trips, args.points)
+
+        rows_size = db_size(db_path)
+        rows_read = await read_all(args.trips, args.points)
+
+        db = await connect()
+        for trip_id in range(1, args.trips + 1):
+            await compact_trip(db, trip_id)
+        await db.commit()
+        await db.close()
+
+        tracks_size = db_size(db_path)
+        tracks_read = await read_all(args.trips, args.points)
+
+    total = args.trips * args.points
+    print(f"{args.trips} trips x {args.points} points ({total} points)")
+    print(f"{'storage':<8} {'db bytes':>12} {'bytes/pt':>9} {'points ms/trip':>15} {'coords ms/trip':>15}")
+    for name, size, (models, coords) in (("rows", rows_size, rows_read), ("tracks", tracks_size, tracks_read)):
+        print(f"{name:<8} {size:>12} {size / total:>9.1f} {models * 1000:>15.2f} {coords * 1000:>15.2f}")
+    print(
+        f"size reduction: {rows_size / tracks_size:.1f}x, "
+        f"read speedup: {rows_read[0] / tracks_read[0]:.1f}x (points), {rows_read[1] / tracks_read[1]:.1f}x (coords)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,283 @@
+"""
+Micro-benchmark suite for the calc and trip functions, with stored baselines.
+
+Every case runs at a few data sizes ("name[size]") and reports the best mean
+seconds per call over --repeat rounds, each round long enough to time reliably.
+`save` writes the results to a JSON baseline; `compare` runs again and exits
+with status 1 if any case got slower than the baseline by more than
+--threshold (a fraction, 0.25 = 25%). Baselines are machine-specific: save
+and compare on the same machine.
+
+    python -m benchmarks.microbench run
+    python -m benchmarks.microbench save --baseline benchmarks/baseline.json
+    python -m benchmarks.microbench compare --threshold 0.25 --only add_point list_trip_points
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "microbench.db"))
+# Seeding statements would be reported as slow queries
+os.environ.setdefault("SLOW_QUERY_MS", "-1")
+
+from app.calc import NUMPY_AVAILABLE, compute_consumption_stats, haversine_km  # noqa: E402
+from app.database import connect, init_database  # noqa: E402
+from app.models import Trip  # noqa: E402
+from app.trips import (  # noqa: E402
+    add_point, convert_trips_to_csv, list_trip_points, row_to_trip, row_to_trip_point,
+)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# name -> (sizes, setup); setup(db, size) returns the function to time
+CASES: Dict[str, Tuple[List[int], Callable[..., Awaitable[Callable]]]] = {}
+
+
+def case(name: str, sizes: List[int]):
+    def register(setup):
+        CASES[name] = (sizes, setup)
+        return setup
+    return register
+
+
+def random_route(n: int, seed: int = 42) -> List[Tuple[float, float]]:
+    """A random walk of n fixes around Madrid."""
+    rng = random.Random(seed)
+    lat, lng = 40.4168, -3.7038
+    route = []
+    for _ in range(n):
+        lat += rng.uniform(-0.001, 0.001)
+        lng += rng.uniform(-0.001, 0.001)
+        route.append((lat, lng))
+    return route
+
+
+async def create_user(db) -> int:
+    cursor = await db.execute(
+        "INSERT INTO users (email, password_hash) VALUES (?, ?)", (f"bench{time.perf_counter_ns()}@example.com", "x")
+    )
+    return cursor.lastrowid
+
+
+async def create_trip(db, points: int) -> int:
+    """An active trip with `points` fixes, one second apart."""
+    user_id = await create_user(db)
+    cursor = await db.execute("INSERT INTO trips (user_id, initial_fuel_liters) VALUES (?, 40)", (user_id,))
+    trip_id = cursor.lastrowid
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    await db.executemany(
+        "INSERT INTO trip_points (trip_id, timestamp, lat, lng) VALUES (?, ?, ?, ?)",
+        [(trip_id, (start + timedelta(seconds=i)).isoformat(), lat, lng)
+         for i, (lat, lng) in enumerate(random_route(points))]
+    )
+    await db.commit()
+    return trip_id
+
+
+def make_trips(n: int) -> List[Trip]:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        Trip(id=i, user_id=1, started_at=(start + timedelta(hours=i)).isoformat(),
+             ended_at=(start + timedelta(hours=i, minutes=30)).isoformat(),
+             initial_fuel_liters=40.0, final_fuel_liters=38.5, total_distance_km=25.0)
+        for i in range(n)
+    ]
+
+
+@case("haversine_km", [1_000, 100_000])
+async def bench_haversine(db, size):
+    route = random_route(size)
+
+    def run():
+        total = 0.0
+        for (lat1, lng1), (lat2, lng2) in zip(route, route[1:]):
+            total += haversine_km(lat1, lng1, lat2, lng2)
+        return total
+    return run
+
+
+@case("compute_consumption_stats", [100, 10_000])
+async def bench_consumption_stats(db, size):
+    user_id = await create_user(db)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    await db.executemany(
+        """INSERT INTO trips (user_id, started_at, ended_at, initial_fuel_liters, final_fuel_liters, total_distance_km)
+           VALUES (?, ?, ?, 40, 38, 30)""",
+        [(user_id, (start + timedelta(hours=i)).isoformat(), (start + timedelta(hours=i, minutes=40)).isoformat())
+         for i in range(size)]
+    )
+    await db.commit()
+    return lambda: compute_consumption_stats(db, user_id)
+
+
+@case("add_point", [1_000, 100_000])
+async def bench_add_point(db, size):
+    trip_id = await create_trip(db, size)
+    route = itertools.cycle(random_route(1_000, seed=7))
+
+    async def run():
+        lat, lng = next(route)
+        await add_point(db, trip_id, lat, lng)
+    return run
+
+
+@case("list_trip_points", [1_000, 100_000])
+async def bench_list_trip_points(db, size):
+    trip_id = await create_trip(db, size)
+    return lambda: list_trip_points(db, trip_id, 100)
+
+
+@case("convert_trips_to_csv", [100, 10_000])
+async def bench_convert_trips_to_csv(db, size):
+    trips = make_trips(size)
+    return lambda: convert_trips_to_csv(trips)
+
+
+def _rows(sql: str, parameters) -> List[sqlite3.Row]:
+    """sqlite3.Row objects, like the ones aiosqlite hands the converters."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    return conn.execute(sql, parameters).fetchall()
+
+
+@case("row_to_trip", [100, 10_000])
+async def bench_row_to_trip(db, size):
+    rows = _rows(
+        """WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+           SELECT i AS id, 1 AS user_id, '2024-01-01T00:00:00+00:00' AS started_at,
+                  '2024-01-01T00:30:00+00:00' AS ended_at, 40.0 AS initial_fuel_liters,
+                  38.5 AS final_fuel_liters, 25.0 AS total_distance_km FROM n""",
+        (size,)
+    )
+    return lambda: [row_to_trip(row) for row in rows]
+
+
+@case("row_to_trip_point", [100, 10_000])
+async def bench_row_to_trip_point(db, size):
+    rows = _rows(
+        """WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+           SELECT i AS id, 1 AS trip_id, '2024-01-01T00:00:00+00:00' AS timestamp,
+                  40.4168 + i * 1e-5 AS lat, -3.7038 AS lng FROM n""",
+        (size,)
+    )
+    return lambda: [row_to_trip_point(row) for row in rows]
+
+
+async def time_call(func: Callable, repeat: int, min_round: float) -> float:
+    """Best mean seconds per call over `repeat` rounds of at least `min_round` seconds."""
+    is_async = asyncio.iscoroutine(result := func())
+    if is_async:
+        await result
+
+    async def round_(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            if is_async:
+                await func()
+            else:
+                func()
+        return time.perf_counter() - start
+
+    loops = 1
+    while (elapsed := await round_(loops)) < min_round:
+        loops = max(loops * 2, int(loops * min_round / max(elapsed, 1e-9)))
+    return min([elapsed / loops] + [await round_(loops) / loops for _ in range(repeat - 1)])
+
+
+async def run_cases(only: List[str], repeat: int, min_round: float) -> Dict[str, float]:
+    await init_database()
+    db = await connect()
+    results: Dict[str, float] = {}
+    try:
+        for name, (sizes, setup) in CASES.items():
+            if only and name not in only:
+                continue
+            for size in sizes:
+                key = f"{name}[{size}]"
+                func = await setup(db, size)
+                results[key] = await time_call(func, repeat, min_round)
+                print(f"{key:<36} {format_seconds(results[key]):>12}", flush=True)
+    finally:
+        await db.close()
+    return results
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """Print current vs baseline per case; returns the cases that regressed."""
+    regressed = []
+    print(f"\n{'case':<36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, current in results.items():
+        before = baseline.get(key)
+        if before is None:
+            print(f"{key:<36} {'-':>12} {format_seconds(current):>12} {'new':>8}")
+            continue
+        change = current / before - 1
+        flag = ""
+        if change > threshold:
+            regressed.append(key)
+            flag = "  REGRESSED"
+        print(f"{key:<36} {format_seconds(before):>12} {format_seconds(current):>12} {change:>+8.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", nargs="?", choices=["run", "save", "compare"], default="run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before compare fails")
+    parser.add_argument("--only", nargs="+", default=[], choices=list(CASES), metavar="CASE")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-round", type=float, default=0.1, help="minimum seconds per timing round")
+    args = parser.parse_args()
+
+    print(f"python {platform.python_version()}, numpy available: {NUMPY_AVAILABLE}")
+    results = asyncio.run(run_cases(args.only, args.repeat, args.min_round))
+
+    if args.mode == "save":
+        saved = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f).get("results", {})
+        # --only updates just those cases
+        saved.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "machine": platform.platform(),
+                "python": platform.python_version(),
+                "saved_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "results": saved,
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+    elif args.mode == "compare":
+        if not os.path.exists(args.baseline):
+            sys.exit(f"no baseline at {args.baseline}; run `save` first")
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} case(s) more than {args.threshold:.0%} slower than the baseline")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()